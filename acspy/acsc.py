@@ -2,34 +2,50 @@
 
 from __future__ import annotations, division, print_function
 
+import contextlib
 import ctypes
-import platform
+import enum
+import io
 import re
+import threading
+import time
 import warnings
 from ctypes import byref, create_string_buffer
 
-import numpy as np
+from acspy import backend
+
+# NumPy is imported inside the functions that use arrays, so that importing
+# this module stays fast for code that only needs constants or programs.
 
 
 class AcscError(Exception):
     pass
 
 
-# Import the ACS C library DLL
-if platform.architecture()[0] == "32bit":
-    acs = ctypes.windll.LoadLibrary("ACSCL_x86.dll")
-if platform.architecture()[0] == "64bit":
-    acs = ctypes.windll.LoadLibrary("ACSCL_x64.dll")
+class ProgramError(AcscError):
+    """A program buffer failed to compile.
+
+    ``line`` is the line of the program source the error was reported at and
+    ``code`` the controller's error code (``PERR``).
+    """
+
+    def __init__(self, buffno, line, code, message):
+        self.buffno = buffno
+        self.line = line
+        self.code = code
+        super(ProgramError, self).__init__(
+            "Buffer {}, line {}: {}".format(buffno, line, message)
+        )
+
 
-int32 = ctypes.c_long
+int32 = ctypes.c_int32
 int64 = ctypes.c_int64
-uInt32 = ctypes.c_ulong
+uInt32 = ctypes.c_uint32
 uInt64 = ctypes.c_ulonglong
 float_ = ctypes.c_float
 double = ctypes.c_double
 char = ctypes.c_char
 p = ctypes.pointer
-s = create_string_buffer(256)
 
 # Define motion flags and constants
 AMF_WAIT = 0x00000001
@@ -55,6 +71,65 @@ MST_INPOS = 0x00000010
 MST_MOVE = 0x00000020
 MST_ACC = 0x00000040
 
+# Program states
+PST_COMPILED = 0x00000001
+PST_RUN = 0x00000002
+PST_SUSPEND = 0x00000004
+PST_DEBUG = 0x00000020
+PST_AUTO = 0x00000080
+
+
+class MotorState(enum.IntFlag):
+    """Bits of the motor state word (``MST``)."""
+
+    ENABLE = MST_ENABLE
+    INPOS = MST_INPOS
+    MOVE = MST_MOVE
+    ACC = MST_ACC
+
+
+class AxisState(enum.IntFlag):
+    """Bits of the axis state word (``AST``)."""
+
+    LEAD = AST_LEAD
+    DC = AST_DC
+    PEG = AST_PEG
+    PEGREADY = AST_PEGREADY
+    MOVE = AST_MOVE
+    ACC = AST_ACC
+    SEGMENT = AST_SEGMENT
+    VELLOCK = AST_VELLOCK
+    POSLOCK = AST_POSLOCK
+
+
+# Keys of the dicts returned by getMotorState and getAxisState
+motor_state_keys = {
+    "enabled": MST_ENABLE,
+    "in position": MST_INPOS,
+    "moving": MST_MOVE,
+    "accelerating": MST_ACC,
+}
+
+axis_state_keys = {
+    "lead": AST_LEAD,
+    "DC": AST_DC,
+    "PEG": AST_PEG,
+    "PEGREADY": AST_PEGREADY,
+    "moving": AST_MOVE,
+    "accelerating": AST_ACC,
+    "segment": AST_SEGMENT,
+    "vel lock": AST_VELLOCK,
+    "pos lock": AST_POSLOCK,
+}
+
+
+class WaitBlock(ctypes.Structure):
+    """``ACSC_WAITBLOCK``. Passing a reference to one as ``wait`` issues a
+    call asynchronously; wait for it with ``waitForAsyncCall``."""
+
+    _fields_ = [("Event", ctypes.c_void_p), ("Ret", ctypes.c_int)]
+
+
 SYNCHRONOUS = None
 INVALID = -1
 IGNORE = -1
@@ -104,6 +179,115 @@ ax_mflags = {
     "USER2": 31,
 }
 
+# Prototypes of library functions, as (restype, argtypes), applied once when a
+# ctypes library function is first looked up. Handles are pointer-sized, so
+# functions taking one are declared with HANDLE rather than left to ctypes'
+# default int conversion, which truncates them on 64-bit platforms.
+HANDLE = ctypes.c_void_p
+# ACSC_WAITBLOCK*, also passed as SYNCHRONOUS (NULL) or ASYNCHRONOUS (-2)
+WAIT = ctypes.c_void_p
+
+prototypes = {
+    "acsc_GetLastError": (ctypes.c_int, []),
+    "acsc_GetErrorString": (
+        ctypes.c_int,
+        [
+            HANDLE,
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int),
+        ],
+    ),
+    "acsc_WaitForAsyncCall": (
+        ctypes.c_int,
+        [
+            HANDLE,
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(WaitBlock),
+            ctypes.c_int,
+        ],
+    ),
+}
+
+# Hot-path functions by their arguments between the handle and the wait block
+_RANGE = [ctypes.c_int, ctypes.c_char_p] + [ctypes.c_int] * 4
+for _args, _names in (
+    (
+        [ctypes.c_int, ctypes.POINTER(double)],
+        [
+            "acsc_GetRPosition",
+            "acsc_GetFPosition",
+            "acsc_GetRVelocity",
+            "acsc_GetFVelocity",
+            "acsc_GetVelocity",
+            "acsc_GetAcceleration",
+            "acsc_GetDeceleration",
+            "acsc_GetKillDeceleration",
+        ],
+    ),
+    (
+        [ctypes.c_int, double],
+        [
+            "acsc_SetRPosition",
+            "acsc_SetVelocity",
+            "acsc_SetAcceleration",
+            "acsc_SetDeceleration",
+            "acsc_SetKillDeceleration",
+            "acsc_SetJerk",
+        ],
+    ),
+    (
+        [ctypes.c_int, ctypes.POINTER(ctypes.c_int)],
+        [
+            "acsc_GetMotorState",
+            "acsc_GetAxisState",
+            "acsc_GetMotorError",
+            "acsc_GetProgramState",
+        ],
+    ),
+    (
+        [ctypes.c_int],
+        ["acsc_Enable", "acsc_Disable", "acsc_Halt", "acsc_Go"],
+    ),
+    ([ctypes.c_int, ctypes.c_int, double], ["acsc_ToPoint", "acsc_Jog"]),
+    (
+        [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int)],
+        ["acsc_GetOutput"],
+    ),
+    ([ctypes.c_int, ctypes.c_int, ctypes.c_int], ["acsc_SetOutput"]),
+    (_RANGE + [ctypes.POINTER(double)], ["acsc_ReadReal", "acsc_WriteReal"]),
+    (
+        _RANGE + [ctypes.POINTER(ctypes.c_int)],
+        ["acsc_ReadInteger", "acsc_WriteInteger"],
+    ),
+):
+    for _name in _names:
+        prototypes[_name] = (ctypes.c_int, [HANDLE] + _args + [WAIT])
+
+
+# The ACS C library, loaded on first use
+acs = backend.Library(prototypes=prototypes)
+
+
+def set_backend(lib):
+    """Binds the implementation of the ACS C library used by this module.
+
+    ``lib`` may be a loaded ctypes library, the name or path of a library to
+    load, any object providing the ``acsc_*`` functions, or ``None`` to load
+    the native library on next use.
+    """
+    if isinstance(lib, str):
+        lib = backend.load_native(lib)
+    acs.bind(lib)
+
+
+def get_backend():
+    """Returns the bound implementation of the ACS C library, or ``None`` if
+    it has not been loaded yet."""
+    return acs.lib
+
 
 def open_comm_direct() -> int:
     """Open simulator.
@@ -249,8 +433,7 @@ def getMotorEnabled(hcomm, axis: int, wait=SYNCHRONOUS):
     """Checks if motor is enabled."""
     state = ctypes.c_int()
     call_acsc(acs.acsc_GetMotorState, hcomm, axis, byref(state), wait)
-    state = state.value
-    return hex(state)[-1] == "1"
+    return bool(state.value & MST_ENABLE)
 
 
 def getMotorState(hcomm, axis: int, wait=SYNCHRONOUS):
@@ -263,13 +446,13 @@ def getMotorState(hcomm, axis: int, wait=SYNCHRONOUS):
     state = ctypes.c_int()
     call_acsc(acs.acsc_GetMotorState, hcomm, axis, byref(state), wait)
     state = state.value
-    mst = {
-        "enabled": hex(state)[-1] == "1",
-        "in position": hex(state)[-2] == "1",
-        "moving": hex(state)[-2] == "2",
-        "accelerating": hex(state)[-2] == "4",
+    # Spelled out, as this is about twice as fast as looping over the keys
+    return {
+        "enabled": state & MST_ENABLE != 0,
+        "in position": state & MST_INPOS != 0,
+        "moving": state & MST_MOVE != 0,
+        "accelerating": state & MST_ACC != 0,
     }
-    return mst
 
 
 def getMotorError(hcomm, axis: int, wait=SYNCHRONOUS):
@@ -313,18 +496,33 @@ def getAxisState(hcomm, axis: int, wait=SYNCHRONOUS):
     state = ctypes.c_int()
     call_acsc(acs.acsc_GetAxisState, hcomm, axis, byref(state), wait)
     state = state.value
-    ast = {
-        "lead": hex(state)[-1] == "1",
-        "DC": hex(state)[-1] == "2",
-        "PEG": hex(state)[-1] == "4",
-        "PEGREADY": hex(state)[-2] == "1",
-        "moving": hex(state)[-2] == "2",
-        "accelerating": hex(state)[-2] == "4",
-        "segment": hex(state)[-2] == "8",
-        "vel lock": hex(state)[-3] == "1",
-        "pos lock": hex(state)[-3] == "2",
-    }
-    return ast
+    return {key: bool(state & bit) for key, bit in axis_state_keys.items()}
+
+
+def decodeMotorStates(states):
+    """Decodes an array of raw motor state words, e.g., ``MST`` values logged
+    by data collection.
+
+    Returns a dictionary of boolean arrays with the same keys as
+    ``getMotorState``.
+    """
+    import numpy as np
+
+    states = np.asarray(states)
+    return {key: (states & bit) != 0 for key, bit in motor_state_keys.items()}
+
+
+def decodeAxisStates(states):
+    """Decodes an array of raw axis state words, e.g., ``AST`` values logged
+    by data collection.
+
+    Returns a dictionary of boolean arrays with the same keys as
+    ``getAxisState``.
+    """
+    import numpy as np
+
+    states = np.asarray(states)
+    return {key: (states & bit) != 0 for key, bit in axis_state_keys.items()}
 
 
 def getFPosition(hcomm, axis: int, wait=SYNCHRONOUS):
@@ -342,12 +540,12 @@ def registerEmergencyStop():
 
 def jog(hcomm, flags: int, axis: int, vel: float, wait=SYNCHRONOUS):
     """Initiates a single-axis jog motion."""
-    call_acsc(acs.acsc_Jog, hcomm, flags, axis, double(vel), wait)
+    call_acsc(acs.acsc_Jog, hcomm, flags or 0, axis, double(vel), wait)
 
 
 def toPoint(hcomm, flags: int, axis: int, target: float, wait=SYNCHRONOUS):
     """Point to point move."""
-    call_acsc(acs.acsc_ToPoint, hcomm, flags, axis, double(target), wait)
+    call_acsc(acs.acsc_ToPoint, hcomm, flags or 0, axis, double(target), wait)
 
 
 def toPointM(hcomm, flags: int, axes: tuple, target: tuple, wait=SYNCHRONOUS):
@@ -368,7 +566,7 @@ def toPointM(hcomm, flags: int, axes: tuple, target: tuple, wait=SYNCHRONOUS):
 
 def enable(hcomm, axis: int, wait=SYNCHRONOUS):
     """The function activates a motor."""
-    call_acsc(acs.acsc_Enable, hcomm, int32(axis), wait)
+    call_acsc(acs.acsc_Enable, hcomm, axis, wait)
 
 
 def enableMotors(hcomm, axes: list, wait=SYNCHRONOUS):
@@ -406,9 +604,77 @@ def waitCommutated(hcomm, axis: int, timeout=INFINITE):
     )
 
 
+def _wait_each(wait_func, hcomm, items, timeout):
+    """Calls ``wait_func(hcomm, item, timeout)`` for each item, sharing one
+    overall timeout in ms, so it returns once all waits are satisfied."""
+    if timeout == INFINITE:
+        for item in items:
+            wait_func(hcomm, item, INFINITE)
+        return
+    deadline = time.monotonic() + timeout / 1000.0
+    for item in items:
+        remaining = max(0.0, deadline - time.monotonic())
+        wait_func(hcomm, item, int(round(remaining * 1000.0)))
+
+
+def waitCommutatedM(hcomm, axes, timeout=INFINITE):
+    """Waits for commutation of several axes to finish, with one overall
+    timeout in ms."""
+    _wait_each(waitCommutated, hcomm, axes, timeout)
+
+
+def waitMotorEnabled(hcomm, axis: int, state=1, timeout=INFINITE):
+    """Waits for a motor to be enabled (``state=1``) or disabled (``0``)."""
+    call_acsc(
+        acs.acsc_WaitMotorEnabled,
+        hcomm,
+        int32(axis),
+        int32(state),
+        int32(timeout),
+    )
+
+
+def waitMotionEnd(hcomm, axis: int, timeout=INFINITE):
+    """Waits for the physical motion of an axis to end, i.e., until the motor
+    is in position. Timeout is in ms."""
+    call_acsc(acs.acsc_WaitMotionEnd, hcomm, int32(axis), int32(timeout))
+
+
+def waitMotionEndM(hcomm, axes, timeout=INFINITE):
+    """Waits for the physical motion of several axes to end, with one overall
+    timeout in ms."""
+    _wait_each(waitMotionEnd, hcomm, axes, timeout)
+
+
+def waitLogicalMotionEnd(hcomm, axis: int, timeout=INFINITE):
+    """Waits for the logical motion of an axis to end, i.e., until the motion
+    profile has been generated. Timeout is in ms."""
+    call_acsc(
+        acs.acsc_WaitLogicalMotionEnd, hcomm, int32(axis), int32(timeout)
+    )
+
+
+def waitLogicalMotionEndM(hcomm, axes, timeout=INFINITE):
+    """Waits for the logical motion of several axes to end, with one overall
+    timeout in ms."""
+    _wait_each(waitLogicalMotionEnd, hcomm, axes, timeout)
+
+
+def waitInput(hcomm, port: int, bit: int, state=1, timeout=INFINITE):
+    """Waits for a digital input to reach the specified state."""
+    call_acsc(
+        acs.acsc_WaitInput,
+        hcomm,
+        int32(port),
+        int32(bit),
+        int32(state),
+        int32(timeout),
+    )
+
+
 def disable(hcomm, axis: int, wait=SYNCHRONOUS):
     """The function shuts off a motor."""
-    call_acsc(acs.acsc_Disable, hcomm, int32(axis), wait)
+    call_acsc(acs.acsc_Disable, hcomm, axis, wait)
 
 
 def disableAllMotors(hcomm, wait=SYNCHRONOUS):
@@ -424,7 +690,7 @@ def disableMotors(hcomm, axes: list, wait=SYNCHRONOUS):
 
 def getRPosition(hcomm, axis: int, wait=SYNCHRONOUS):
     pos = double()
-    call_acsc(acs.acsc_GetRPosition, hcomm, axis, p(pos), wait)
+    call_acsc(acs.acsc_GetRPosition, hcomm, axis, byref(pos), wait)
     return pos.value
 
 
@@ -477,6 +743,7 @@ def getKillDeceleration(hcomm, axis: int, wait=SYNCHRONOUS):
 def closeComm(hcomm):
     """Closes communication with the controller."""
     call_acsc(acs.acsc_CloseComm, hcomm)
+    _handle_locks.pop(hcomm, None)
 
 
 def unregisterEmergencyStop():
@@ -521,31 +788,130 @@ def declareVariable(hcomm, vartype, varname, wait=SYNCHRONOUS):
     call_acsc(acs.acsc_DeclareVariable, hcomm, vartype, varname.encode(), wait)
 
 
+def _range_args(from1, to1, from2, to2):
+    """Returns index range arguments with ``None`` replaced by ``NONE``."""
+    return tuple(NONE if i is None else i for i in (from1, to1, from2, to2))
+
+
+def _range_shape(from1, to1, from2, to2):
+    """Returns the array shape addressed by an index range, or ``None`` if the
+    range addresses a scalar."""
+    from1, to1, from2, to2 = _range_args(from1, to1, from2, to2)
+    if from1 == NONE:
+        return None
+    if from2 == NONE:
+        return (to1 - from1 + 1,)
+    return (to1 - from1 + 1, to2 - from2 + 1)
+
+
+def _prepare_out(out, shape, dtype):
+    """Allocates an array for ``shape`` or validates a caller-provided one."""
+    import numpy as np
+
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if not isinstance(out, np.ndarray):
+        raise AcscError("out must be a NumPy array")
+    if out.dtype != dtype:
+        raise AcscError(
+            "out has dtype {}, expected {}".format(out.dtype, np.dtype(dtype))
+        )
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise AcscError("out must be a writeable, C-contiguous array")
+    if shape is None:
+        if out.size != 1:
+            raise AcscError("out must have a single element for a scalar")
+    elif out.shape != shape:
+        raise AcscError(
+            "out has shape {}, index range has shape {}".format(
+                out.shape, shape
+            )
+        )
+    return out
+
+
+def _as_carray(values, ctype):
+    """Returns a ctypes array sharing memory with a contiguous NumPy array."""
+    return (ctype * values.size).from_buffer(values)
+
+
 def readInteger(
     hcomm,
     buffno,
     varname,
-    from1=None,
-    to1=None,
-    from2=None,
-    to2=None,
+    from1=NONE,
+    to1=NONE,
+    from2=NONE,
+    to2=NONE,
     wait=SYNCHRONOUS,
+    out=None,
 ):
-    """Reads an integer(s) in the controller."""
-    intread = ctypes.c_int()
+    """Reads an integer variable (scalar or array) from the controller.
+
+    Scalars are returned as an ``int``, index ranges as an int32 array, even
+    of a single element. If ``out`` is given it must be a C-contiguous int32
+    array matching the range, and is filled in place and returned.
+    """
+    shape = _range_shape(from1, to1, from2, to2)
+    if shape is None and out is None:
+        values = ctypes.c_int()
+        pointer = byref(values)
+    else:
+        values = _prepare_out(out, shape, "int32")
+        pointer = _as_carray(values, ctypes.c_int)
     call_acsc(
         acs.acsc_ReadInteger,
         hcomm,
         buffno,
         varname.encode(),
-        from1,
-        to1,
-        from2,
-        to2,
-        p(intread),
+        *_range_args(from1, to1, from2, to2),
+        pointer,
         wait,
     )
-    return intread.value
+    if isinstance(values, ctypes.c_int):
+        return values.value
+    return values
+
+
+def _prepare_values(values, shape, dtype, ctype):
+    """Returns a pointer to ``values`` laid out for an index range.
+
+    Python scalars that fit ``ctype`` are wrapped directly for a scalar or
+    single-element range. Anything else is viewed as a NumPy array
+    (buffer-protocol objects are wrapped without copying) and checked against
+    the range; a single value is repeated over the range. C-contiguous arrays
+    of ``dtype`` are passed without copying, others are converted first.
+    """
+    if (
+        isinstance(values, int)
+        or (isinstance(values, float) and ctype is double)
+    ) and (shape is None or shape in ((1,), (1, 1))):
+        return byref(ctype(values))
+    import numpy as np
+
+    array = np.asarray(values)
+    if not np.can_cast(array.dtype, dtype, "same_kind"):
+        raise AcscError(
+            "Cannot write {} values to a {} variable".format(
+                array.dtype, np.dtype(dtype)
+            )
+        )
+    if shape is None:
+        if array.size != 1:
+            raise AcscError("A scalar variable takes a single value")
+    elif array.ndim == 0:
+        array = np.full(shape, array, dtype=dtype)
+    elif array.shape != shape and not (
+        array.ndim == 1 and 1 in shape and array.size == shape[0] * shape[-1]
+    ):
+        raise AcscError(
+            "Values have shape {}, index range has shape {}".format(
+                array.shape, shape
+            )
+        )
+    array = np.ascontiguousarray(array, dtype=dtype)
+    # The pointer keeps a reference to the array
+    return array.ctypes.data_as(ctypes.POINTER(ctype))
 
 
 def writeInteger(
@@ -559,40 +925,126 @@ def writeInteger(
     to2=NONE,
     wait=SYNCHRONOUS,
 ):
-    """Writes an integer variable to the controller."""
-    val = ctypes.c_int(val_to_write)
+    """Writes an integer variable (scalar or array) to the controller.
+
+    For an index range, ``val_to_write`` may be an array (or buffer-protocol
+    object) of the range's shape, or a single value written to every element.
+    C-contiguous int32 arrays are passed without copying.
+    """
     call_acsc(
         acs.acsc_WriteInteger,
         hcomm,
         nbuff,
         variable.encode(),
-        from1,
-        to1,
-        from2,
-        to2,
-        p(val),
+        *_range_args(from1, to1, from2, to2),
+        _prepare_values(
+            val_to_write,
+            _range_shape(from1, to1, from2, to2),
+            "int32",
+            ctypes.c_int,
+        ),
         wait,
     )
 
 
+def _mflags_mask(flags):
+    """Returns the bit mask of named MFLAGS bits, see ``ax_mflags``."""
+    mask = 0
+    for flag in flags:
+        mask |= 1 << ax_mflags[flag]
+    return mask
+
+
+def _to_int32(value):
+    """Converts an unsigned 32-bit word to the signed value ACSPL+ stores."""
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
 def readMflag(hcomm, axis: int, flag_nm):
     """read a Mflag. For definition refer to ax_mflags at the top"""
-    allFlags = readInteger(hcomm, None, "MFLAGS", axis, axis + 1)
+    allFlags = int(readInteger(hcomm, NONE, "MFLAGS", axis, axis)[0])
     return bool(((1 << ax_mflags[flag_nm]) & allFlags))
 
 
 def setMflag(hcomm, axis: int, flag_nm):
     """Set a Mflag. For definition refer to ax_mflags at the top"""
-    allFlags = readInteger(hcomm, None, "MFLAGS", axis, axis + 1)
-    allFlags |= 2 ** (ax_mflags[flag_nm])
-    writeInteger(hcomm, "MFLAGS", allFlags)
+    with _locked(hcomm):
+        allFlags = int(readInteger(hcomm, NONE, "MFLAGS", axis, axis)[0])
+        allFlags |= 2 ** (ax_mflags[flag_nm])
+        writeInteger(hcomm, "MFLAGS", _to_int32(allFlags), NONE, axis, axis)
 
 
 def clearMflag(hcomm, axis: int, flag_nm):
     """Clear a Mflag. For definition refer to ax_mflags at the top"""
-    allFlags = readInteger(hcomm, None, "MFLAGS", axis, axis + 1)
-    allFlags &= ~(2 ** (ax_mflags[flag_nm]))
-    writeInteger(hcomm, "MFLAGS", allFlags)
+    with _locked(hcomm):
+        allFlags = int(readInteger(hcomm, NONE, "MFLAGS", axis, axis)[0])
+        allFlags &= ~(2 ** (ax_mflags[flag_nm]))
+        writeInteger(hcomm, "MFLAGS", _to_int32(allFlags), NONE, axis, axis)
+
+
+class MflagsTransaction(object):
+    """Read-modify-write of the ``MFLAGS`` of several axes.
+
+    ``read`` fetches ``MFLAGS`` for all axes with one range read. Flags named
+    in ``ax_mflags`` are then set and cleared locally, and ``write`` writes
+    back only the axes whose flags changed, each with an indexed write. Used
+    as a context manager, it reads on entry and writes on exit::
+
+        with MflagsTransaction(hcomm, range(8)) as mflags:
+            mflags.set(0, "OPEN", "MICRO")
+            mflags.clear(1, "HOME")
+    """
+
+    def __init__(self, hcomm, axes):
+        self.hcomm = hcomm
+        self.axes = sorted(set(int(a) for a in axes))
+        self.flags = {}
+        self._written = {}
+
+    def read(self):
+        """Reads ``MFLAGS`` of all axes of the transaction."""
+        first, last = self.axes[0], self.axes[-1]
+        words = readInteger(self.hcomm, NONE, "MFLAGS", first, last)
+        self.flags = {a: int(words[a - first]) & 0xFFFFFFFF for a in self.axes}
+        self._written = dict(self.flags)
+
+    def get(self, axis, flag):
+        """Returns whether a flag of an axis is set."""
+        return bool(self.flags[axis] & _mflags_mask([flag]))
+
+    def set(self, axis, *flags):
+        """Sets flags of an axis."""
+        self.flags[axis] |= _mflags_mask(flags)
+
+    def clear(self, axis, *flags):
+        """Clears flags of an axis."""
+        self.flags[axis] &= ~_mflags_mask(flags)
+
+    def changed(self):
+        """Returns the axes whose flags differ from the controller's."""
+        return [a for a in self.axes if self.flags[a] != self._written[a]]
+
+    def write(self):
+        """Writes the flags of the changed axes to the controller."""
+        for axis in self.changed():
+            writeInteger(
+                self.hcomm,
+                "MFLAGS",
+                _to_int32(self.flags[axis]),
+                NONE,
+                axis,
+                axis,
+            )
+            self._written[axis] = self.flags[axis]
+
+    def __enter__(self):
+        self.read()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.write()
 
 
 def readReal(
@@ -604,33 +1056,34 @@ def readReal(
     from2=NONE,
     to2=NONE,
     wait=SYNCHRONOUS,
+    out=None,
 ):
-    """Read real variable (scalar or array) from the controller."""
-    if from2 == NONE and to2 == NONE and from1 != NONE:
-        values = np.zeros((to1 - from1 + 1), dtype=np.float64)
-        pointer = values.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
-    elif from2 != NONE:
-        values = np.zeros((to1 - from1 + 1, to2 - from2 + 1), dtype=np.float64)
-        pointer = values.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
-    else:
+    """Read real variable (scalar or array) from the controller.
+
+    Scalars are returned as a ``float``, index ranges as a float64 array. If
+    ``out`` is given it must be a C-contiguous float64 array matching the
+    range (a contiguous slice of a larger array is fine), and is filled in
+    place and returned.
+    """
+    shape = _range_shape(from1, to1, from2, to2)
+    if shape is None and out is None:
         values = double()
         pointer = byref(values)
+    else:
+        values = _prepare_out(out, shape, "float64")
+        pointer = _as_carray(values, double)
     call_acsc(
         acs.acsc_ReadReal,
         hcomm,
         buffno,
         varname.encode(),
-        from1,
-        to1,
-        from2,
-        to2,
+        *_range_args(from1, to1, from2, to2),
         pointer,
         wait,
     )
-    if from1 != NONE:
-        return values
-    else:
+    if isinstance(values, double):
         return values.value
+    return values
 
 
 def writeReal(
@@ -644,18 +1097,24 @@ def writeReal(
     to2=NONE,
     wait=SYNCHRONOUS,
 ):
-    """Writes a real value to the controller."""
-    val = ctypes.c_double(val_to_write)
+    """Writes a real variable (scalar or array) to the controller.
+
+    For an index range, ``val_to_write`` may be an array (or buffer-protocol
+    object) of the range's shape, or a single value written to every element.
+    C-contiguous float64 arrays are passed without copying.
+    """
     call_acsc(
         acs.acsc_WriteReal,
         hcomm,
         nbuff,
         varname.encode(),
-        from1,
-        to1,
-        from2,
-        to2,
-        p(val),
+        *_range_args(from1, to1, from2, to2),
+        _prepare_values(
+            val_to_write,
+            _range_shape(from1, to1, from2, to2),
+            "float64",
+            double,
+        ),
         wait,
     )
 
@@ -691,44 +1150,169 @@ def uploadDataFromController(
     )
 
 
-def loadBuffer(hcomm, buffnumber, program, count=512, wait=SYNCHRONOUS):
-    """Load a buffer into the ACS controller."""
-    prgbuff = ctypes.create_string_buffer(str(program).encode(), count)
+# Bytes sent per library call by ``uploadBuffer``
+UPLOAD_CHUNK_SIZE = 4096
+
+
+def loadBuffer(hcomm, buffnumber, program, count=None, wait=SYNCHRONOUS):
+    """Load a buffer into the ACS controller, replacing its program.
+
+    ``count`` defaults to the length of the encoded program.
+    """
+    text = str(program).encode()
+    if count is None:
+        count = len(text)
+    prgbuff = ctypes.create_string_buffer(text, max(count, 1))
     call_acsc(
         acs.acsc_LoadBuffer, hcomm, buffnumber, byref(prgbuff), count, wait
     )
 
 
-def loadBuffersFromFile(hcomm, filename, wait=SYNCHRONOUS):
-    # acs.acsc_LoadBuffersFromFile seems to be broken
-    # So we mimic it and revert to loadBuffer
+def appendBuffer(hcomm, buffnumber, program, count=None, wait=SYNCHRONOUS):
+    """Appends text to the program of a buffer.
+
+    ``count`` defaults to the length of the encoded program.
+    """
+    text = str(program).encode()
+    if count is None:
+        count = len(text)
+    prgbuff = ctypes.create_string_buffer(text, max(count, 1))
+    call_acsc(
+        acs.acsc_AppendBuffer, hcomm, buffnumber, byref(prgbuff), count, wait
+    )
+
+
+def _program_chunks(program, chunk_size):
+    """Yields ``(text, n_lines)`` chunks of whole lines of up to
+    ``chunk_size`` bytes, or one line if it is longer.
+
+    Items of ``program`` may split lines anywhere; a partial line is carried
+    over to the next item.
+    """
+    if isinstance(program, str):
+        program = io.StringIO(program)
+    elif hasattr(program, "iter_chunks"):  # prgs.ACSPLplusPrg
+        program = program.iter_chunks()
+    pending = []
+    size = 0
+    partial = ""
+    for item in program:
+        text = partial + item
+        end = text.rfind("\n") + 1
+        partial = text[end:]
+        text = text[:end]
+        while text:
+            if size + len(text) <= chunk_size:
+                pending.append(text)
+                size += len(text)
+                break
+            # Whole lines that fit, or one line if none fits an empty chunk
+            cut = text.rfind("\n", 0, chunk_size - size) + 1
+            if cut == 0 and not pending:
+                cut = text.find("\n") + 1
+            if cut:
+                pending.append(text[:cut])
+                text = text[cut:]
+            chunk = "".join(pending)
+            yield chunk, chunk.count("\n")
+            pending = []
+            size = 0
+    if partial:
+        pending.append(partial + "\n")
+    if pending:
+        chunk = "".join(pending)
+        yield chunk, chunk.count("\n")
+
+
+def uploadBuffer(
+    hcomm,
+    buffnumber,
+    program,
+    compile=True,
+    first_line=1,
+    chunk_size=UPLOAD_CHUNK_SIZE,
+):
+    """Uploads a program of any length to a buffer and compiles it.
+
+    ``program`` is a string, a file object, an iterable of lines or text
+    chunks, or a ``prgs.ACSPLplusPrg``. It is sent in chunks of whole lines of
+    at most ``chunk_size`` bytes (unless a single line is longer), the first
+    replacing the buffer's program and the rest appended, so the program is
+    never joined into one string.
+
+    If compilation fails, ``ProgramError`` is raised with the line of the
+    source the controller reported; ``first_line`` is the source line number
+    of the program's first line, e.g., its position in a ``.prg`` file.
+    Returns the number of lines uploaded.
+    """
+    n_lines = 0
+    for text, n in _program_chunks(program, chunk_size):
+        if n_lines == 0:
+            loadBuffer(hcomm, buffnumber, text)
+        else:
+            appendBuffer(hcomm, buffnumber, text)
+        n_lines += n
+    if n_lines == 0:
+        loadBuffer(hcomm, buffnumber, "")
+    if compile:
+        try:
+            compileBuffer(hcomm, buffnumber)
+        except AcscError as e:
+            perr = readInteger(hcomm, NONE, "PERR", buffnumber, buffnumber)
+            perl = readInteger(hcomm, NONE, "PERL", buffnumber, buffnumber)
+            line = int(perl[0]) + first_line - 1
+            raise ProgramError(buffnumber, line, int(perr[0]), e)
+    return n_lines
+
+
+def readBuffersFile(filename, first_lines=None):
+    """Parses a ``.prg`` file into a dict of program text by buffer number.
+
+    Each ``#BUF`` line starts the program of the numbered buffer; a leading
+    ``#HEADER`` section is skipped. If a dict is given as ``first_lines``, the
+    line number in the file of each buffer's first program line is stored in
+    it by buffer number.
+    """
     progs = {}
     currbuffer = None
-    currprg = ""
+    currprg = []
     with open(filename) as file:
-        rawline = file.readline()
-        line = rawline.replace(" ", "").upper()  # strip all spaces, cnv. upper
-        if line[:7] == "#HEADER":  # skip the header
-            rawline = file.readline()
-
-        while rawline:  # read lines until end of file
-            line = rawline.replace(" ", "").upper()
-            matchres = re.match("#BUF([0-9]*)", line)  # match #BUF & fol. nums
+        for n, rawline in enumerate(file, 1):
+            line = rawline.replace(" ", "").upper()  # strip spaces, to upper
+            matchres = re.match("#BUF([0-9]+)", line)  # match #BUF & nums
             if matchres:
-                if currbuffer:  # if buffer is not empty
-                    progs[currbuffer] = currprg.encode("ascii")
-                    currprg = ""
+                if currbuffer is not None:
+                    progs[currbuffer] = "".join(currprg)
                 currbuffer = int(matchres.groups()[0])  # assign buffer
-                rawline = file.readline()
-            else:
-                currprg += rawline
-                rawline = file.readline()
-
-    if currbuffer:  # do not forget to add lasf prog
-        progs[currbuffer] = currprg
-
+                currprg = []
+                if first_lines is not None:
+                    first_lines[currbuffer] = n + 1
+            elif currbuffer is not None:
+                currprg.append(rawline)
+    if currbuffer is not None:  # do not forget to add last prog
+        progs[currbuffer] = "".join(currprg)
+    return progs
+
+
+def loadBuffersFromFile(hcomm, filename, compile=False, wait=SYNCHRONOUS):
+    """Loads the buffers of a ``.prg`` file, like the library's
+    ``acsc_LoadBuffersFromFile``, without compiling them unless ``compile``.
+
+    A compilation error is raised as ``ProgramError`` with its line in the
+    file.
+    """
+    # acs.acsc_LoadBuffersFromFile seems to be broken
+    # So we mimic it and revert to loadBuffer
+    first_lines = {}
+    progs = readBuffersFile(filename, first_lines)
     for key in progs:  # load all buffers
-        loadBuffer(hcomm, key, progs[key])
+        uploadBuffer(
+            hcomm,
+            key,
+            progs[key],
+            compile=compile,
+            first_line=first_lines[key],
+        )
 
 
 def compileBuffer(hcomm, buffnumber, wait=SYNCHRONOUS):
@@ -761,6 +1345,83 @@ def addPVTPoint(
     )
 
 
+def splineM(hcomm, flags: int, axes, period: float, wait=SYNCHRONOUS):
+    """Initiates a multi-axis spline motion."""
+    call_acsc(
+        acs.acsc_SplineM, hcomm, flags, _axes_array(axes), double(period), wait
+    )
+
+
+def _axes_array(axes):
+    """Returns a C array of axis numbers terminated by -1."""
+    return (ctypes.c_int * (len(axes) + 1))(*axes, -1)
+
+
+def _points_array(values, n_axes, name):
+    """Converts points for ``n_axes`` axes to a C-contiguous float64 array of
+    shape ``(n_points, n_axes)``."""
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1 and n_axes == 1:
+        values = values.reshape(-1, 1)
+    if values.ndim != 2 or values.shape[1] != n_axes:
+        raise AcscError(
+            "{} must have shape (n_points, {}), not {}".format(
+                name, n_axes, values.shape
+            )
+        )
+    return np.require(values, requirements=["C", "W"])
+
+
+def _point_rows(values):
+    """Returns a ctypes view of a ``(n_points, n_axes)`` array whose items are
+    the points, as arrays to pass to the library."""
+    n_points, n_axes = values.shape
+    return (double * n_axes * n_points).from_buffer(values)
+
+
+def add_pv_points(
+    hcomm, axes, positions, velocities, times=None, wait=SYNCHRONOUS
+):
+    """Adds PV or PVT spline points for one or several axes from arrays.
+
+    ``axes`` is an axis number or a sequence of them. ``positions`` and
+    ``velocities`` have shape ``(n_points,)`` for one axis, or
+    ``(n_points, n_axes)``. If ``times`` is given, as one time interval or an
+    array of ``n_points`` of them, PVT points are added, otherwise PV points.
+
+    The arrays are converted once, after which each point costs one call of
+    ``acsc_AddPVPointM`` or ``acsc_AddPVTPointM``.
+    """
+    import numpy as np
+
+    axes = [int(a) for a in np.atleast_1d(axes)]
+    positions = _points_array(positions, len(axes), "positions")
+    velocities = _points_array(velocities, len(axes), "velocities")
+    if velocities.shape != positions.shape:
+        raise AcscError("Number of positions and velocities don't match!")
+    n_points = len(positions)
+    axes_c = _axes_array(axes)
+    pos_rows = _point_rows(positions)
+    vel_rows = _point_rows(velocities)
+    if times is None:
+        func = acs.acsc_AddPVPointM
+        for n in range(n_points):
+            call_acsc(func, hcomm, axes_c, pos_rows[n], vel_rows[n], wait)
+        return
+    times = np.asarray(times, dtype=np.float64)
+    if times.ndim == 0:
+        times = np.full(n_points, times)
+    if times.shape != (n_points,):
+        raise AcscError("Number of points and time intervals don't match!")
+    func = acs.acsc_AddPVTPointM
+    for n, dt in enumerate(times.tolist()):
+        call_acsc(
+            func, hcomm, axes_c, pos_rows[n], vel_rows[n], double(dt), wait
+        )
+
+
 def multiPoint(hcomm, flags: int, axis: int, dwell: float, wait=SYNCHRONOUS):
     call_acsc(acs.acsc_MultiPoint, hcomm, flags, axis, double(dwell), wait)
 
@@ -775,10 +1436,110 @@ def extAddPoint(hcomm, axis: int, point: float, rate: float, wait=SYNCHRONOUS):
     )
 
 
+def multiPointM(hcomm, flags: int, axes, dwell: float, wait=SYNCHRONOUS):
+    """Initiates a multi-axis multipoint motion."""
+    call_acsc(
+        acs.acsc_MultiPointM,
+        hcomm,
+        flags,
+        _axes_array(axes),
+        double(dwell),
+        wait,
+    )
+
+
+def addPointM(hcomm, axes, point, wait=SYNCHRONOUS):
+    """Adds a point to a multi-axis multipoint or spline motion."""
+    if len(axes) != len(point):
+        raise AcscError("Number of axes and coordinates don't match!")
+    point_c = (double * len(point))(*point)
+    call_acsc(acs.acsc_AddPointM, hcomm, _axes_array(axes), point_c, wait)
+
+
+def extAddPointM(hcomm, axes, point, rate: float, wait=SYNCHRONOUS):
+    """Adds a point with a specified velocity to a multi-axis multipoint
+    motion."""
+    if len(axes) != len(point):
+        raise AcscError("Number of axes and coordinates don't match!")
+    point_c = (double * len(point))(*point)
+    call_acsc(
+        acs.acsc_ExtAddPointM,
+        hcomm,
+        _axes_array(axes),
+        point_c,
+        double(rate),
+        wait,
+    )
+
+
+def add_points(hcomm, axes, points, rates=None, wait=SYNCHRONOUS):
+    """Adds the points of a multipoint or spline motion from an array.
+
+    ``axes`` is an axis number or a sequence of them and ``points`` has shape
+    ``(n_points,)`` for one axis, or ``(n_points, n_axes)``. If ``rates`` is
+    given, one velocity or an array of ``n_points`` of them, the points are
+    added with ``acsc_ExtAddPointM``, otherwise with ``acsc_AddPointM``.
+
+    The arrays are validated and converted once, after which each point costs
+    one library call.
+    """
+    import numpy as np
+
+    axes = [int(a) for a in np.atleast_1d(axes)]
+    points = _points_array(points, len(axes), "points")
+    n_points = len(points)
+    axes_c = _axes_array(axes)
+    rows = _point_rows(points)
+    if rates is None:
+        func = acs.acsc_AddPointM
+        for n in range(n_points):
+            call_acsc(func, hcomm, axes_c, rows[n], wait)
+        return
+    rates = np.asarray(rates, dtype=np.float64)
+    if rates.ndim == 0:
+        rates = np.full(n_points, rates)
+    if rates.shape != (n_points,):
+        raise AcscError("Number of points and rates don't match!")
+    func = acs.acsc_ExtAddPointM
+    for n, rate in enumerate(rates.tolist()):
+        call_acsc(func, hcomm, axes_c, rows[n], double(rate), wait)
+
+
+def multipoint_path(
+    hcomm, flags, axes, points, dwell=0.0, rates=None, wait=SYNCHRONOUS
+):
+    """Uploads a complete multi-axis multipoint motion from an array.
+
+    Starts the motion with ``multiPointM``, adds ``points`` (and optionally
+    ``rates``) as in ``add_points`` and ends the sequence. ``points`` is
+    validated before anything is sent to the controller.
+    """
+    import numpy as np
+
+    axes = [int(a) for a in np.atleast_1d(axes)]
+    points = _points_array(points, len(axes), "points")
+    if rates is not None:
+        rates = np.asarray(rates, dtype=np.float64)
+        if rates.ndim and rates.shape != (len(points),):
+            raise AcscError("Number of points and rates don't match!")
+        if flags is None:
+            flags = AMF_VELOCITY
+        else:
+            flags |= AMF_VELOCITY
+    multiPointM(hcomm, flags, axes, dwell, wait)
+    add_points(hcomm, axes, points, rates, wait)
+    endSequenceM(hcomm, axes, wait)
+
+
 def endSequence(hcomm, axis: int, wait=SYNCHRONOUS):
     call_acsc(acs.acsc_EndSequence, hcomm, axis, wait)
 
 
+def endSequenceM(hcomm, axes, wait=SYNCHRONOUS):
+    """Terminates a multi-axis motion sequence."""
+    call_acsc(acs.acsc_EndSequenceM, hcomm, _axes_array(axes), wait)
+
+
 def go(hcomm, axis: int, wait=SYNCHRONOUS):
     call_acsc(acs.acsc_Go, hcomm, axis, wait)
 
@@ -803,28 +1564,117 @@ def command(hcomm, command: str, wait=SYNCHRONOUS):
     return call_acsc(acs.acsc_Command, hcomm, cmd_buffer, cmd_len, wait)
 
 
-def call_acsc(func, *args, **kwargs):
+# Library calls release the GIL, so threads can call into the library
+# concurrently. Calls on a handle that has a lock (see ``handle_lock``) are
+# serialized by it.
+_handle_locks = {}
+_handle_locks_lock = threading.Lock()
+_no_lock = contextlib.nullcontext()
+
+# Records the latency of every library call when set, see ``acspy.profiling``
+_profiler = None
+
+
+def handle_lock(hcomm):
+    """Returns the lock serializing library calls on a handle.
+
+    The lock is created on first use; from then on every library call on the
+    handle from any thread holds it, except the blocking ``acsc_Wait*`` calls,
+    so that a thread waiting for motion does not stall the others. The lock is
+    reentrant, and holding it with ``with`` makes a sequence of calls atomic,
+    e.g., a read-modify-write of a variable. Handles without a lock are not
+    serialized and add no locking overhead.
+    """
+    try:
+        return _handle_locks[hcomm]
+    except KeyError:
+        with _handle_locks_lock:
+            return _handle_locks.setdefault(hcomm, threading.RLock())
+
+
+def _locked(hcomm):
+    """Returns the lock of a handle, or a no-op context if it has none."""
+    lock = _handle_locks.get(hcomm)
+    return lock if lock is not None else _no_lock
+
+
+def set_profiler(profiler):
+    """Sets the object whose ``record(hcomm, func, ns, failed)`` is called
+    after every library call, or ``None``. Returns the previous one."""
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    return previous
+
+
+def _call_slow(func, args):
+    """Calls ``func`` holding the lock of its handle, if any, and records its
+    latency if a profiler is set."""
+    hcomm = args[0] if args else None
+    lock = _handle_locks.get(hcomm) if args else None
+    name = getattr(func, "__name__", None) or ""
+    if lock is not None and name.startswith("acsc_Wait"):
+        lock = None
+    with lock if lock is not None else _no_lock:
+        profiler = _profiler
+        if profiler is None:
+            rv = func(*args)
+        else:
+            start = time.perf_counter_ns()
+            rv = func(*args)
+            profiler.record(
+                hcomm, func, time.perf_counter_ns() - start, rv == 0
+            )
+        if rv == 0:
+            _raise_last_error(hcomm)
+        return rv
+
+
+def call_acsc(func, *args):
     """Wraps ACS library to handle errors."""
-    rv = func(*args, **kwargs)
+    if _handle_locks or _profiler is not None:
+        return _call_slow(func, args)
+    rv = func(*args)
     if rv == 0:  # There was an error
-        err = acs.acsc_GetLastError()  # Retrieve error code
-        err_lng = int32()
-        s = create_string_buffer(256)
-        hc = args[0]
-        if (
-            acs.acsc_GetErrorString(
-                hc, int32(err), s, int32(ctypes.sizeof(s)), byref(err_lng)
-            )
-            != 0
-        ):
-            s[err_lng.value] = b"\x00"
-            err_str = s.value.decode("ascii")
-            raise AcscError(str(err) + ": " + err_str)
-        else:
-            raise AcscError(err)
+        _raise_last_error(args[0] if args else None)
     return rv
 
 
+def _raise_last_error(hcomm):
+    """Raises an ``AcscError`` for the last error of the library."""
+    err = acs.acsc_GetLastError()  # Retrieve error code
+    err_lng = int32()
+    s = create_string_buffer(256)
+    if (
+        acs.acsc_GetErrorString(
+            hcomm, int32(err), s, int32(ctypes.sizeof(s)), byref(err_lng)
+        )
+        != 0
+    ):
+        s[err_lng.value] = b"\x00"
+        err_str = s.value.decode("ascii")
+        raise AcscError(str(err) + ": " + err_str)
+    else:
+        raise AcscError(err)
+
+
+def waitForAsyncCall(hcomm, wait_block, timeout=INFINITE):
+    """Waits for the asynchronous call issued with ``wait_block`` to complete.
+
+    Raises ``AcscError`` if the call failed. Returns the number of reply bytes
+    received.
+    """
+    received = int32()
+    call_acsc(
+        acs.acsc_WaitForAsyncCall,
+        hcomm,
+        None,
+        byref(received),
+        byref(wait_block),
+        int32(timeout),
+    )
+    return received.value
+
+
 def cancelOperation(hcomm, wait=SYNCHRONOUS):
     """Cancels all of the waiting and non-waiting calls."""
     call_acsc(acs.acsc_CancelOperation, hcomm, wait)
@@ -0,0 +1,394 @@
+"""Coroutine versions of the core ``acsc`` functions.
+
+Calls are issued in the library's asynchronous mode and return immediately,
+so many requests can be outstanding on one event loop. The completions of
+each communication handle are awaited in issue order by a single background
+thread, which resolves the corresponding futures on the event loop. The
+completion timeout of a handle is set with ``setCompletionTimeout``.
+"""
+
+from __future__ import division, print_function
+
+import asyncio
+import ctypes
+import queue
+import threading
+from ctypes import byref
+
+from acspy import acsc
+from acspy.acsc import INFINITE, NONE, double, int32
+
+
+def _resolve(future, error):
+    if future.cancelled():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class _Completer(object):
+    """Waits for the asynchronous calls issued on one handle, in order.
+
+    ``timeout`` is in ms for the completion of each call.
+    """
+
+    def __init__(self, hcomm, timeout=INFINITE):
+        self.hcomm = hcomm
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="acspy.aio-{}".format(hcomm), daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            # ``buffers`` keeps the call's output memory alive until completion
+            wait_block, future, buffers = item
+            try:
+                acsc.waitForAsyncCall(self.hcomm, wait_block, self.timeout)
+                error = None
+            except Exception as e:
+                error = e
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve, future, error)
+            except RuntimeError:
+                # The event loop was closed, nothing awaits the future
+                pass
+
+    def stop(self):
+        self.pending.put(None)
+        self.thread.join()
+
+
+_completers = {}
+_completers_lock = threading.Lock()
+
+
+def _completer(hcomm):
+    try:
+        return _completers[hcomm]
+    except KeyError:
+        with _completers_lock:
+            if hcomm not in _completers:
+                _completers[hcomm] = _Completer(hcomm)
+            return _completers[hcomm]
+
+
+def setCompletionTimeout(hcomm, timeout):
+    """Sets the timeout in ms for the completion of each call on a handle.
+
+    A call not completed in time raises ``acsc.AcscError`` when awaited.
+    """
+    _completer(hcomm).timeout = timeout
+
+
+def _submit(hcomm, call, *buffers):
+    """Issues ``call(wait)`` asynchronously and returns a future for its
+    completion. ``buffers`` are kept alive until the call completes."""
+    wait_block = acsc.WaitBlock()
+    future = asyncio.get_running_loop().create_future()
+    call(byref(wait_block))
+    _completer(hcomm).pending.put((wait_block, future, buffers))
+    return future
+
+
+async def _get(hcomm, func, ctype, *args):
+    """Calls a library getter with an output argument of type ``ctype``."""
+    value = ctype()
+    await _submit(
+        hcomm,
+        lambda wait: acsc.call_acsc(func, hcomm, *args, byref(value), wait),
+        value,
+    )
+    return value.value
+
+
+async def closeComm(hcomm):
+    """Waits for outstanding calls and closes communication."""
+    with _completers_lock:
+        completer = _completers.pop(hcomm, None)
+    if completer is not None:
+        await asyncio.get_running_loop().run_in_executor(None, completer.stop)
+    acsc.closeComm(hcomm)
+
+
+# Motion
+async def enable(hcomm, axis: int):
+    await _submit(hcomm, lambda wait: acsc.enable(hcomm, axis, wait))
+
+
+async def disable(hcomm, axis: int):
+    await _submit(hcomm, lambda wait: acsc.disable(hcomm, axis, wait))
+
+
+async def disableAllMotors(hcomm):
+    await _submit(hcomm, lambda wait: acsc.disableAllMotors(hcomm, wait))
+
+
+async def toPoint(hcomm, flags: int, axis: int, target: float):
+    await _submit(
+        hcomm, lambda wait: acsc.toPoint(hcomm, flags, axis, target, wait)
+    )
+
+
+async def toPointM(hcomm, flags: int, axes: tuple, target: tuple):
+    await _submit(
+        hcomm, lambda wait: acsc.toPointM(hcomm, flags, axes, target, wait)
+    )
+
+
+async def jog(hcomm, flags: int, axis: int, vel: float):
+    await _submit(hcomm, lambda wait: acsc.jog(hcomm, flags, axis, vel, wait))
+
+
+async def halt(hcomm, axis: int):
+    await _submit(hcomm, lambda wait: acsc.halt(hcomm, axis, wait))
+
+
+# Parameters
+async def setVelocity(hcomm, axis: int, vel: float):
+    await _submit(hcomm, lambda wait: acsc.setVelocity(hcomm, axis, vel, wait))
+
+
+async def setAcceleration(hcomm, axis: int, acc: float):
+    await _submit(
+        hcomm, lambda wait: acsc.setAcceleration(hcomm, axis, acc, wait)
+    )
+
+
+async def setDeceleration(hcomm, axis: int, dec: float):
+    await _submit(
+        hcomm, lambda wait: acsc.setDeceleration(hcomm, axis, dec, wait)
+    )
+
+
+async def setKillDeceleration(hcomm, axis: int, dec: float):
+    await _submit(
+        hcomm, lambda wait: acsc.setKillDeceleration(hcomm, axis, dec, wait)
+    )
+
+
+async def setJerk(hcomm, axis: int, jerk: float):
+    await _submit(hcomm, lambda wait: acsc.setJerk(hcomm, axis, jerk, wait))
+
+
+async def setRPosition(hcomm, axis: int, rpos: float):
+    await _submit(
+        hcomm, lambda wait: acsc.setRPosition(hcomm, axis, rpos, wait)
+    )
+
+
+async def getRPosition(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetRPosition, double, axis)
+
+
+async def getFPosition(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetFPosition, double, axis)
+
+
+async def getRVelocity(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetRVelocity, double, axis)
+
+
+async def getFVelocity(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetFVelocity, double, axis)
+
+
+async def getVelocity(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetVelocity, double, axis)
+
+
+async def getAcceleration(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetAcceleration, double, axis)
+
+
+async def getDeceleration(hcomm, axis: int):
+    return await _get(hcomm, acsc.acs.acsc_GetDeceleration, double, axis)
+
+
+async def getMotorState(hcomm, axis: int):
+    """Returns the motor state dict, see ``acsc.getMotorState``."""
+    state = await _get(hcomm, acsc.acs.acsc_GetMotorState, ctypes.c_int, axis)
+    return {k: bool(state & b) for k, b in acsc.motor_state_keys.items()}
+
+
+async def getAxisState(hcomm, axis: int):
+    """Returns the axis state dict, see ``acsc.getAxisState``."""
+    state = await _get(hcomm, acsc.acs.acsc_GetAxisState, ctypes.c_int, axis)
+    return {k: bool(state & b) for k, b in acsc.axis_state_keys.items()}
+
+
+async def getOutput(hcomm, port: int, bit: int):
+    return await _get(hcomm, acsc.acs.acsc_GetOutput, int32, port, bit)
+
+
+async def setOutput(hcomm, port: int, bit: int, val: int):
+    await _submit(
+        hcomm, lambda wait: acsc.setOutput(hcomm, port, bit, val, wait)
+    )
+
+
+# Variables
+async def _read(hcomm, func, ctype, dtype, buffno, varname, ranges, out):
+    shape = acsc._range_shape(*ranges)
+    if shape is None and out is None:
+        values = ctype()
+        pointer = byref(values)
+    else:
+        values = acsc._prepare_out(out, shape, dtype)
+        pointer = acsc._as_carray(values, ctype)
+    await _submit(
+        hcomm,
+        lambda wait: acsc.call_acsc(
+            func,
+            hcomm,
+            buffno,
+            varname.encode(),
+            *acsc._range_args(*ranges),
+            pointer,
+            wait,
+        ),
+        values,
+        pointer,
+    )
+    if isinstance(values, ctype):
+        return values.value
+    return values
+
+
+async def readReal(
+    hcomm,
+    buffno,
+    varname,
+    from1=NONE,
+    to1=NONE,
+    from2=NONE,
+    to2=NONE,
+    out=None,
+):
+    """Reads a real variable, see ``acsc.readReal``."""
+    return await _read(
+        hcomm,
+        acsc.acs.acsc_ReadReal,
+        double,
+        "float64",
+        buffno,
+        varname,
+        (from1, to1, from2, to2),
+        out,
+    )
+
+
+async def readInteger(
+    hcomm,
+    buffno,
+    varname,
+    from1=NONE,
+    to1=NONE,
+    from2=NONE,
+    to2=NONE,
+    out=None,
+):
+    """Reads an integer variable, see ``acsc.readInteger``."""
+    return await _read(
+        hcomm,
+        acsc.acs.acsc_ReadInteger,
+        ctypes.c_int,
+        "int32",
+        buffno,
+        varname,
+        (from1, to1, from2, to2),
+        out,
+    )
+
+
+async def _write(hcomm, func, ctype, dtype, nbuff, varname, values, ranges):
+    pointer = acsc._prepare_values(
+        values, acsc._range_shape(*ranges), dtype, ctype
+    )
+    await _submit(
+        hcomm,
+        lambda wait: acsc.call_acsc(
+            func,
+            hcomm,
+            nbuff,
+            varname.encode(),
+            *acsc._range_args(*ranges),
+            pointer,
+            wait,
+        ),
+        pointer,
+    )
+
+
+async def writeReal(
+    hcomm,
+    varname,
+    val_to_write,
+    nbuff=NONE,
+    from1=NONE,
+    to1=NONE,
+    from2=NONE,
+    to2=NONE,
+):
+    """Writes a real variable, see ``acsc.writeReal``."""
+    await _write(
+        hcomm,
+        acsc.acs.acsc_WriteReal,
+        double,
+        "float64",
+        nbuff,
+        varname,
+        val_to_write,
+        (from1, to1, from2, to2),
+    )
+
+
+async def writeInteger(
+    hcomm,
+    varname,
+    val_to_write,
+    nbuff=NONE,
+    from1=NONE,
+    to1=NONE,
+    from2=NONE,
+    to2=NONE,
+):
+    """Writes an integer variable, see ``acsc.writeInteger``."""
+    await _write(
+        hcomm,
+        acsc.acs.acsc_WriteInteger,
+        ctypes.c_int,
+        "int32",
+        nbuff,
+        varname,
+        val_to_write,
+        (from1, to1, from2, to2),
+    )
+
+
+# Buffers
+async def runBuffer(hcomm, buffno, label=None):
+    await _submit(
+        hcomm, lambda wait: acsc.runBuffer(hcomm, buffno, label, wait)
+    )
+
+
+async def stopBuffer(hcomm, buffno):
+    await _submit(hcomm, lambda wait: acsc.stopBuffer(hcomm, buffno, wait))
+
+
+async def compileBuffer(hcomm, buffno):
+    await _submit(hcomm, lambda wait: acsc.compileBuffer(hcomm, buffno, wait))
+
+
+async def getProgramState(hcomm, buffno):
+    return await _get(
+        hcomm, acsc.acs.acsc_GetProgramState, ctypes.c_int, buffno
+    )
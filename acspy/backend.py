@@ -0,0 +1,90 @@
+"""Binding of the ACS C library used by ``acsc``.
+
+The native library is not loaded when ``acsc`` is imported, but on the first
+call into it. Any object providing the ``acsc_*`` functions can be bound in
+its place, e.g., a ``ctypes.CDLL`` on Linux or an in-process stand-in.
+"""
+
+from __future__ import division, print_function
+
+import ctypes
+import os
+import platform
+import threading
+
+# Environment variable overriding the name or path of the native library
+LIBRARY_ENV = "ACSPY_LIBRARY"
+
+
+def library_name():
+    """Returns the name of the native library for this platform."""
+    name = os.environ.get(LIBRARY_ENV)
+    if name:
+        return name
+    arch = "x64" if platform.architecture()[0] == "64bit" else "x86"
+    if platform.system() == "Windows":
+        return "ACSCL_{}.dll".format(arch)
+    return "libACSCL_{}.so".format(arch)
+
+
+def load_native(name=None):
+    """Loads the native ACS C library."""
+    if name is None:
+        name = library_name()
+    # Unlike PyDLL, CDLL and WinDLL release the GIL for the duration of calls
+    try:
+        if platform.system() == "Windows":
+            return ctypes.windll.LoadLibrary(name)
+        return ctypes.CDLL(name)
+    except OSError as e:
+        raise OSError(
+            "Could not load the ACS C library {!r} ({}). Set {} or bind "
+            "another backend with acsc.set_backend().".format(
+                name, e, LIBRARY_ENV
+            )
+        )
+
+
+class Library(object):
+    """Proxy for the ACS C library that binds it on first use.
+
+    Functions are cached as attributes of the proxy after their first lookup,
+    so later calls cost a plain attribute access. ``prototypes`` maps function
+    names to ``(restype, argtypes)``, which are set on ctypes functions when
+    they are first looked up; ``argtypes`` of ``None`` is left unset.
+    """
+
+    def __init__(self, loader=load_native, prototypes=None):
+        self._loader = loader
+        self._prototypes = prototypes if prototypes is not None else {}
+        self._lib = None
+        self._lock = threading.Lock()
+
+    def bind(self, lib):
+        """Binds an implementation of the library, or ``None`` to load the
+        native library again on next use."""
+        for name in list(vars(self)):
+            if not name.startswith("_"):
+                delattr(self, name)
+        self._lib = lib
+
+    @property
+    def lib(self):
+        """Returns the bound implementation, or ``None`` if not yet loaded."""
+        return self._lib
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._lib is None:
+            with self._lock:
+                if self._lib is None:
+                    self._lib = self._loader()
+        func = getattr(self._lib, name)
+        prototype = self._prototypes.get(name)
+        if prototype is not None and isinstance(func, ctypes._CFuncPtr):
+            func.restype = prototype[0]
+            if prototype[1] is not None:
+                func.argtypes = prototype[1]
+        setattr(self, name, func)
+        return func
@@ -3,13 +3,40 @@
 This module contains an [incomplete] object for communicating with an ACS controller.
 
 """
+
 from __future__ import division, print_function
+import concurrent.futures
+import ctypes
+import inspect
+import numbers
+import operator
+import time
+from ctypes import byref
+
 from acspy import acsc
 
+# Per-axis standard variables read by ``Controller.snapshot``
+SNAPSHOT_REAL_VARS = ("RPOS", "FPOS", "RVEL", "FVEL")
+SNAPSHOT_INT_VARS = ("MST", "AST", "MERR")
+
 
 class Controller(object):
-    def __init__(self, contype="simulator", n_axes=8):
+    """Object-oriented interface to an ACS controller.
+
+    With ``state_ttl`` greater than 0, the motor and axis state words
+    (``MST`` and ``AST``) behind the ``Axis`` state properties are cached per
+    axis for ``state_ttl`` seconds, so several properties checked together,
+    e.g., ``ax.enabled and not ax.moving``, cost one read. The cache is
+    invalidated by motion and enable/disable commands issued through this
+    object; call ``refresh`` to fetch the state words explicitly, e.g., after
+    commanding the controller by other means. Caching is off by default, so
+    each property reads the controller.
+    """
+
+    def __init__(self, contype="simulator", n_axes=8, state_ttl=0):
         self.contype = contype
+        self.state_ttl = state_ttl
+        self._state_words = {}
         self.axes = []
         for n in range(n_axes):
             self.axes.append(Axis(self, n))
@@ -20,6 +47,33 @@ class Controller(object):
         elif self.contype == "ethernet":
             self.hc = acsc.openCommEthernetTCP(address=address, port=port)
 
+    def state_word(self, var, axis):
+        """Returns the ``MST`` or ``AST`` word of an axis, from the cache if
+        fetched less than ``state_ttl`` seconds ago."""
+        cached = self._state_words.get((var, axis))
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.state_ttl:
+            return cached[1]
+        word = int(acsc.readInteger(self.hc, acsc.NONE, var, axis, axis)[0])
+        if self.state_ttl > 0:
+            self._state_words[var, axis] = (now, word)
+        return word
+
+    def invalidate(self):
+        """Discards the cached state words."""
+        self._state_words.clear()
+
+    def refresh(self, axes=None):
+        """Fetches the state words of ``axes`` now, by default those of the
+        axes in the cache."""
+        if axes is None:
+            axes = set(axis for var, axis in self._state_words)
+        self.invalidate()
+        for axis in axes:
+            axis = axis.axisno if isinstance(axis, Axis) else axis
+            self.state_word("MST", axis)
+            self.state_word("AST", axis)
+
     def enable_all(self, wait=acsc.SYNCHRONOUS):
         """Enables all axes."""
         for a in self.axes:
@@ -30,11 +84,320 @@ class Controller(object):
         for a in self.axes:
             a.disable()
 
+    def wait_all(self, axes=None, timeout=acsc.INFINITE):
+        """Waits until the motion of all ``axes`` (default all) has ended.
+
+        ``axes`` may be ``Axis`` objects or axis numbers. The timeout in ms
+        applies to the whole wait; ``acsc.AcscError`` is raised if it expires.
+        """
+        if axes is None:
+            axes = self.axes
+        axes = [a.axisno if isinstance(a, Axis) else a for a in axes]
+        try:
+            acsc.waitMotionEndM(self.hc, axes, timeout)
+        finally:
+            self.invalidate()
+
+    def snapshot(self, out=None):
+        """Reads the state of all axes.
+
+        Each of ``SNAPSHOT_REAL_VARS`` and ``SNAPSHOT_INT_VARS`` is fetched
+        with a single range read covering every axis, so a snapshot costs one
+        library call per variable regardless of the number of axes. Returns a
+        dict of arrays indexed by axis number. Passing a previous snapshot as
+        ``out`` refills its arrays in place.
+        """
+        last = len(self.axes) - 1
+        snap = {} if out is None else out
+        for var in SNAPSHOT_REAL_VARS:
+            snap[var] = acsc.readReal(
+                self.hc, acsc.NONE, var, 0, last, out=snap.get(var)
+            )
+        for var in SNAPSHOT_INT_VARS:
+            snap[var] = acsc.readInteger(
+                self.hc, acsc.NONE, var, 0, last, out=snap.get(var)
+            )
+        return snap
+
+    def mflags(self, axes=None):
+        """Returns an ``acsc.MflagsTransaction`` for ``axes`` (default all),
+        to be used as a context manager."""
+        if axes is None:
+            axes = self.axes
+        axes = [a.axisno if isinstance(a, Axis) else a for a in axes]
+        return acsc.MflagsTransaction(self.hc, axes)
+
+    def var(self, name, buffer=None, shape=None, dtype=float):
+        """Returns a ``Variable`` handle for reading and writing ``name``.
+
+        ``buffer`` is the program buffer of a local variable, ``shape`` the
+        dimensions of an array variable and ``dtype`` ``float`` for a real or
+        ``int`` for an integer variable.
+        """
+        return Variable(self, name, buffer=buffer, shape=shape, dtype=dtype)
+
+    def batch(self, timeout=acsc.INFINITE):
+        """Returns a ``Batch`` for queueing calls to run in one round trip."""
+        return Batch(self, timeout=timeout)
+
     def disconnect(self):
         acsc.closeComm(self.hc)
 
 
+class BatchError(acsc.AcscError):
+    """Raised when operations of a ``Batch`` fail."""
+
+    def __init__(self, failed):
+        self.failed = failed
+        super(BatchError, self).__init__(
+            "; ".join("{}: {}".format(op, op.error) for op in failed)
+        )
+
+
+class Operation(object):
+    """A call queued in a ``Batch``."""
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.error = None
+        self._wait_block = None
+
+    def __repr__(self):
+        args = [repr(a) for a in self.args]
+        args += ["{}={!r}".format(k, v) for k, v in self.kwargs.items()]
+        return "{}({})".format(self.func.__name__, ", ".join(args))
+
+
+class Batch(object):
+    """Queues ``acsc`` calls and issues them without waiting for each reply.
+
+    Functions of ``acsc`` are queued by calling them as methods of the batch,
+    without the communication handle, e.g., ``batch.setVelocity(0, 100.0)``.
+    ``run``, called when leaving a ``with`` block, issues all calls in the
+    library's asynchronous mode and then waits once for their completions, so
+    the batch costs about one controller round trip. Calls with output values
+    (getters and reads), and functions without a ``wait`` argument, cannot be
+    batched.
+
+    Errors are recorded on each ``Operation`` and raised together as a
+    ``BatchError``, once every issued call has completed.
+    """
+
+    def __init__(self, controller, timeout=acsc.INFINITE):
+        self.controller = controller
+        self.timeout = timeout
+        self.operations = []
+
+    def __getattr__(self, name):
+        if name.startswith(("_", "get", "read", "open", "wait")):
+            raise AttributeError("{} cannot be batched".format(name))
+        func = getattr(acsc, name)
+        try:
+            parameters = inspect.signature(func).parameters
+        except (TypeError, ValueError):
+            parameters = {}
+        if "wait" not in parameters:
+            raise AttributeError("{} cannot be batched".format(name))
+
+        def queue(*args, **kwargs):
+            op = Operation(func, args, kwargs)
+            self.operations.append(op)
+            return op
+
+        return queue
+
+    def run(self):
+        """Issues all queued operations and waits for their completion."""
+        hc = self.controller.hc
+        operations, self.operations = self.operations, []
+        self.controller.invalidate()
+        try:
+            for op in operations:
+                op._wait_block = acsc.WaitBlock()
+                try:
+                    op.func(
+                        hc, *op.args, wait=byref(op._wait_block), **op.kwargs
+                    )
+                except Exception as e:
+                    op.error = e
+                    op._wait_block = None
+        finally:
+            # The library writes to the wait blocks of issued calls, so they
+            # must all complete before leaving, whatever happened
+            for op in operations:
+                if op._wait_block is not None:
+                    try:
+                        acsc.waitForAsyncCall(hc, op._wait_block, self.timeout)
+                    except Exception as e:
+                        op.error = e
+                    op._wait_block = None
+            self.controller.invalidate()
+        failed = [op for op in operations if op.error is not None]
+        if failed:
+            raise BatchError(failed)
+        return operations
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+
+
+class Result(object):
+    """Outcome of a ``ControllerPool`` operation on one controller."""
+
+    def __init__(self, name, value=None, error=None):
+        self.name = name
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def get(self):
+        """Returns the value, or raises the error of a failed operation."""
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __repr__(self):
+        if self.error is not None:
+            return "Result({!r}, error={!r})".format(self.name, self.error)
+        return "Result({!r}, value={!r})".format(self.name, self.value)
+
+
+class ControllerPool(object):
+    """Runs operations on several controllers concurrently.
+
+    ``controllers`` maps names to ``Controller`` objects, or is a sequence of
+    them named by index; ``ControllerPool.ethernet`` creates them from
+    addresses. Operations are run on a thread pool, one task per controller,
+    and library calls release the GIL, so sweeping N controllers costs about
+    one controller's time. Every operation returns a dict of ``Result`` by
+    controller name; errors are recorded there rather than raised.
+    """
+
+    def __init__(self, controllers, max_workers=None):
+        if not isinstance(controllers, dict):
+            controllers = dict(enumerate(controllers))
+        self.controllers = controllers
+        self.addresses = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or max(len(controllers), 1),
+            thread_name_prefix="acspy.pool",
+        )
+
+    @classmethod
+    def ethernet(cls, addresses, port=701, n_axes=8, max_workers=None):
+        """Creates a pool of Ethernet controllers from a dict of addresses by
+        name, or a sequence of addresses named by index."""
+        if not isinstance(addresses, dict):
+            addresses = dict(enumerate(addresses))
+        pool = cls(
+            {n: Controller("ethernet", n_axes=n_axes) for n in addresses},
+            max_workers=max_workers,
+        )
+        pool.addresses = {n: (a, port) for n, a in addresses.items()}
+        return pool
+
+    def _run(self, func):
+        """Calls ``func(name, controller)`` for every controller concurrently
+        and returns the results by name."""
+        futures = {
+            name: self._executor.submit(func, name, controller)
+            for name, controller in self.controllers.items()
+        }
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = Result(name, future.result())
+            except Exception as e:
+                results[name] = Result(name, error=e)
+        return results
+
+    def map(self, func, *args, **kwargs):
+        """Calls ``func(controller, *args, **kwargs)`` for every controller
+        concurrently and returns the results by name."""
+        return self._run(lambda name, c: func(c, *args, **kwargs))
+
+    def broadcast(self, func, *args, **kwargs):
+        """Calls an ``acsc`` function, given by itself or its name, with each
+        controller's handle followed by ``args``, e.g.,
+        ``pool.broadcast("runBuffer", 1)``."""
+        if isinstance(func, str):
+            func = getattr(acsc, func)
+        return self._run(lambda name, c: func(c.hc, *args, **kwargs))
+
+    def connect(self):
+        """Connects all controllers."""
+
+        def connect(name, controller):
+            if name in self.addresses:
+                address, port = self.addresses[name]
+                controller.connect(address=address, port=port)
+            else:
+                controller.connect()
+
+        return self._run(connect)
+
+    def snapshot(self):
+        """Gathers ``Controller.snapshot`` from all controllers."""
+        return self._run(lambda name, c: c.snapshot())
+
+    def deploy(self, programs=None, per_controller=None, **kwargs):
+        """Deploys programs to all controllers with ``deploy.deploy``.
+
+        ``programs`` is deployed to every controller, except those given
+        their own programs by ``per_controller``: a dict of programs by
+        controller name, or a function of the name returning them. A
+        ``manifest`` file name may contain ``{name}``, which is replaced by
+        each controller's name.
+        """
+        from acspy import deploy
+
+        def run(name, controller):
+            progs = programs
+            if callable(per_controller):
+                progs = per_controller(name)
+            elif per_controller is not None and name in per_controller:
+                progs = per_controller[name]
+            if progs is None:
+                raise ValueError(
+                    "No programs for controller {!r}".format(name)
+                )
+            kw = dict(kwargs)
+            if kw.get("manifest") is not None:
+                kw["manifest"] = kw["manifest"].format(name=name)
+            return deploy.deploy(controller.hc, progs, **kw)
+
+        return self._run(run)
+
+    def disconnect(self):
+        """Disconnects all controllers and shuts down the thread pool."""
+        results = self._run(lambda name, c: c.disconnect())
+        self._executor.shutdown()
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+
+
 class Axis(object):
+    """An axis of a ``Controller``.
+
+    Each state property, e.g., ``enabled`` or ``moving``, reads the ``MST``
+    or ``AST`` word of the axis from the controller, unless the controller
+    was created with a ``state_ttl`` to cache them; caching is opt-in.
+    """
+
     def __init__(self, controller, axisno, name=None):
         if isinstance(controller, Controller):
             self.controller = controller
@@ -45,9 +408,11 @@ class Axis(object):
             controller.axisdefs[name] = axisno
 
     def enable(self, wait=acsc.SYNCHRONOUS):
+        self.controller.invalidate()
         acsc.enable(self.controller.hc, self.axisno, wait)
 
     def disable(self, wait=acsc.SYNCHRONOUS):
+        self.controller.invalidate()
         acsc.disable(self.controller.hc, self.axisno, wait)
 
     def ptp(self, target, coordinates="absolute", wait=acsc.SYNCHRONOUS):
@@ -57,29 +422,47 @@ class Axis(object):
             flags = acsc.AMF_RELATIVE
         else:
             flags = None
+        self.controller.invalidate()
         acsc.toPoint(self.controller.hc, flags, self.axisno, target, wait)
 
     def ptpr(self, distance, wait=acsc.SYNCHRONOUS):
         """Performance a point to point move in relative coordinates."""
         self.ptp(distance, coordinates="relative", wait=wait)
 
+    def wait_done(self, timeout=acsc.INFINITE):
+        """Waits until the motion of the axis has ended. Timeout is in ms."""
+        try:
+            acsc.waitMotionEnd(self.controller.hc, self.axisno, timeout)
+        finally:
+            self.controller.invalidate()
+
+    def refresh(self):
+        """Fetches the state words of the axis now."""
+        self.controller.refresh([self.axisno])
+
+    @property
+    def _mst(self):
+        return self.controller.state_word("MST", self.axisno)
+
     @property
     def axis_state(self):
         """Returns axis state dict."""
-        return acsc.getAxisState(self.controller.hc, self.axisno)
+        state = self.controller.state_word("AST", self.axisno)
+        return {k: bool(state & b) for k, b in acsc.axis_state_keys.items()}
 
     @property
     def motor_state(self):
         """Returns motor state dict."""
-        return acsc.getMotorState(self.controller.hc, self.axisno)
+        state = self._mst
+        return {k: bool(state & b) for k, b in acsc.motor_state_keys.items()}
 
     @property
     def moving(self):
-        return self.motor_state["moving"]
+        return bool(self._mst & acsc.MST_MOVE)
 
     @property
     def enabled(self):
-        return self.motor_state["enabled"]
+        return bool(self._mst & acsc.MST_ENABLE)
 
     @enabled.setter
     def enabled(self, choice):
@@ -90,11 +473,11 @@ class Axis(object):
 
     @property
     def in_position(self):
-        return self.motor_state["in position"]
+        return bool(self._mst & acsc.MST_INPOS)
 
     @property
     def accelerating(self):
-        return self.motor_state["accelerating"]
+        return bool(self._mst & acsc.MST_ACC)
 
     @property
     def rpos(self):
@@ -138,3 +521,141 @@ class Axis(object):
     def dec(self, decel):
         """Sets axis velocity."""
         acsc.setDeceleration(self.controller.hc, self.axisno, decel)
+
+
+class Variable(object):
+    """Handle for a controller variable with its call setup done once.
+
+    The encoded name, the index range covering the whole variable and the
+    output buffer are prepared when the handle is created, so ``read`` costs
+    only the library call. The C library cannot report the dimensions of a
+    variable, so array variables need their ``shape`` declared. Slicing reads
+    or writes part of an array with a single range call, e.g.,
+    ``var[2:5] = [1, 2, 3]``; steps other than 1 are not supported.
+    """
+
+    def __init__(self, controller, name, buffer=None, shape=None, dtype=float):
+        import numpy as np
+
+        self.controller = controller
+        self.name = name
+        self.buffno = acsc.NONE if buffer is None else buffer
+        if shape is not None:
+            if isinstance(shape, numbers.Integral):
+                shape = (shape,)
+            shape = tuple(int(n) for n in shape)
+            if not 1 <= len(shape) <= 2:
+                raise acsc.AcscError("Variables have one or two dimensions")
+        self.shape = shape
+        if np.dtype(dtype).kind == "f":
+            self.dtype = np.dtype("float64")
+            self._ctype = acsc.double
+            self._read_name = "acsc_ReadReal"
+            self._write_name = "acsc_WriteReal"
+        elif np.dtype(dtype).kind in "iub":
+            self.dtype = np.dtype("int32")
+            self._ctype = ctypes.c_int
+            self._read_name = "acsc_ReadInteger"
+            self._write_name = "acsc_WriteInteger"
+        else:
+            raise acsc.AcscError("dtype must be float or int")
+        self._encoded = name.encode()
+        if shape is None:
+            self._ranges = (acsc.NONE,) * 4
+            self._value = self._ctype()
+            self._pointer = byref(self._value)
+        else:
+            self._ranges = (0, shape[0] - 1) + (
+                (0, shape[1] - 1) if len(shape) == 2 else (acsc.NONE,) * 2
+            )
+            self._value = np.empty(shape, dtype=self.dtype)
+            self._pointer = acsc._as_carray(self._value, self._ctype)
+
+    def _call(self, name, ranges, pointer):
+        acsc.call_acsc(
+            getattr(acsc.acs, name),
+            self.controller.hc,
+            self.buffno,
+            self._encoded,
+            *ranges,
+            pointer,
+            acsc.SYNCHRONOUS,
+        )
+
+    def read(self):
+        """Reads the variable. Arrays are read into the handle's buffer, which
+        is returned and overwritten by the next ``read``."""
+        self._call(self._read_name, self._ranges, self._pointer)
+        if self.shape is None:
+            return self._value.value
+        return self._value
+
+    def read_into(self, out):
+        """Reads an array variable into ``out``, a C-contiguous array of the
+        variable's shape and dtype, and returns it."""
+        out = acsc._prepare_out(out, self.shape, self.dtype)
+        self._call(
+            self._read_name, self._ranges, acsc._as_carray(out, self._ctype)
+        )
+        return out
+
+    def write(self, values):
+        """Writes the whole variable, see ``acsc.writeReal``."""
+        pointer = acsc._prepare_values(
+            values, self.shape, self.dtype, self._ctype
+        )
+        self._call(self._write_name, self._ranges, pointer)
+
+    def _index(self, index):
+        """Returns the index range and result selection for ``index``."""
+        if self.shape is None:
+            raise acsc.AcscError("{} is not an array".format(self.name))
+        if not isinstance(index, tuple):
+            index = (index,)
+        if len(index) > len(self.shape):
+            raise IndexError("Too many indices for {}".format(self.name))
+        index += (slice(None),) * (len(self.shape) - len(index))
+        ranges = []
+        select = []
+        for i, n in zip(index, self.shape):
+            if isinstance(i, slice):
+                start, stop, step = i.indices(n)
+                if step != 1 or stop <= start:
+                    raise acsc.AcscError(
+                        "Only non-empty slices with step 1 are supported"
+                    )
+                ranges += [start, stop - 1]
+                select.append(slice(None))
+            else:
+                i = operator.index(i)
+                if i < 0:
+                    i += n
+                if not 0 <= i < n:
+                    raise IndexError("Index out of range for " + self.name)
+                ranges += [i, i]
+                select.append(0)
+        ranges += [acsc.NONE] * (4 - len(ranges))
+        return ranges, tuple(select)
+
+    def __getitem__(self, index):
+        ranges, select = self._index(index)
+        values = acsc._prepare_out(
+            None, acsc._range_shape(*ranges), self.dtype
+        )
+        self._call(
+            self._read_name, ranges, acsc._as_carray(values, self._ctype)
+        )
+        values = values[select]
+        return values.item() if values.ndim == 0 else values
+
+    def __setitem__(self, index, values):
+        ranges, select = self._index(index)
+        pointer = acsc._prepare_values(
+            values, acsc._range_shape(*ranges), self.dtype, self._ctype
+        )
+        self._call(self._write_name, ranges, pointer)
+
+    def __repr__(self):
+        return "Variable({!r}, shape={}, dtype={})".format(
+            self.name, self.shape, self.dtype
+        )
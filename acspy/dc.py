@@ -0,0 +1,409 @@
+"""Functionality for reading data collection (``DC``) arrays."""
+
+from __future__ import division, print_function
+
+import io
+import json
+import os
+import re
+import time
+import warnings
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+from acspy import acsc
+
+
+class DCOverrunWarning(RuntimeWarning):
+    """Samples were overwritten in the controller before they were read."""
+
+    pass
+
+
+class ColumnStore(object):
+    """Growable in-memory store for columnar samples.
+
+    Samples are kept in a ``(n_vars, capacity)`` array whose capacity doubles
+    when full, so appending ``n`` samples costs amortized O(n).
+    """
+
+    def __init__(self, n_vars, capacity=1024):
+        self._data = np.empty((n_vars, max(int(capacity), 1)))
+        self._n = 0
+
+    def append(self, block):
+        """Appends a ``(n_vars, n)`` block of samples."""
+        n = block.shape[1]
+        if self._n + n > self._data.shape[1]:
+            capacity = max(2 * self._data.shape[1], self._n + n)
+            data = np.empty((self._data.shape[0], capacity))
+            data[:, : self._n] = self._data[:, : self._n]
+            self._data = data
+        self._data[:, self._n : self._n + n] = block
+        self._n += n
+
+    @property
+    def data(self):
+        """Returns a ``(n_vars, n)`` view of the samples stored so far."""
+        return self._data[:, : self._n]
+
+    def column(self, i):
+        """Returns a view of the samples of variable ``i``."""
+        return self._data[i, : self._n]
+
+    def __len__(self):
+        return self._n
+
+
+class _NpyColumn(object):
+    """A ``.npy`` file of rows written through a memory map, whose capacity
+    doubles when full.
+
+    The file is resized in place: NumPy pads ``.npy`` headers so the length
+    of the first axis can grow without moving the data. This is checked when
+    the file is created, as the padding depends on the NumPy version.
+    """
+
+    def __init__(self, path, dtype, capacity):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._map = npy_format.open_memmap(
+            path, mode="w+", dtype=self.dtype, shape=(max(int(capacity), 1),)
+        )
+        self._offset = self._map.offset
+        for n in (0, np.iinfo(np.intp).max):
+            if len(self._header(n)) != self._offset:
+                self._map = None
+                raise IOError(
+                    "Cannot resize {} in place with NumPy {}".format(
+                        path, np.__version__
+                    )
+                )
+        self.n = 0
+
+    @property
+    def capacity(self):
+        return len(self._map)
+
+    def _header(self, capacity):
+        header = io.BytesIO()
+        npy_format.write_array_header_1_0(
+            header,
+            {
+                "descr": npy_format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (capacity,),
+            },
+        )
+        return header.getvalue()
+
+    def _truncate(self, capacity):
+        """Rewrites the header for ``capacity`` rows and sizes the file to
+        match, with the memory map closed."""
+        self._map.flush()
+        self._map = None
+        with open(self.path, "r+b") as f:
+            f.write(self._header(capacity))
+            f.truncate(self._offset + capacity * self.dtype.itemsize)
+
+    def _open(self, capacity, mode):
+        if capacity == 0:  # Empty files cannot be mapped
+            self._map = np.empty(0, dtype=self.dtype)
+            return
+        self._map = np.memmap(
+            self.path,
+            dtype=self.dtype,
+            mode=mode,
+            offset=self._offset,
+            shape=(capacity,),
+        )
+
+    def _resize(self, capacity):
+        self._truncate(capacity)
+        self._open(capacity, "r+")
+
+    def append(self, rows):
+        n = len(rows)
+        if self.n + n > self.capacity:
+            self._resize(max(2 * self.capacity, self.n + n))
+        self._map[self.n : self.n + n] = rows
+        self.n += n
+
+    def view(self):
+        return self._map[: self.n]
+
+    def flush(self):
+        if isinstance(self._map, np.memmap):
+            self._map.flush()
+
+    def close(self):
+        """Trims the file to the rows written and maps it read-only."""
+        self._truncate(self.n)
+        self._open(self.n, "r")
+
+
+_INDEX_DTYPE = np.dtype([("time", "f8"), ("start", "i8"), ("n", "i8")])
+
+
+def _write_json(path, obj):
+    """Writes JSON atomically, so readers never see a partial file."""
+    with open(path + ".tmp", "w") as f:
+        json.dump(obj, f)
+    os.replace(path + ".tmp", path)
+
+
+class MemmapStore(object):
+    """Store for columnar samples streamed to memory-mapped files on disk.
+
+    Each variable is written to its own ``<name>.npy`` file in
+    ``directory``, preallocated for ``capacity`` samples and doubled in size
+    when full. Every appended block adds a row ``(time, start, n)`` to
+    ``index.npy``, with the host time it arrived and its position in the
+    columns. ``meta.json`` records the names and counts, and is rewritten on
+    each flush, i.e., every ``flush_every`` samples, so a capture that is
+    cut short can still be opened up to its last flush. ``close`` trims the
+    files to the samples written, after which ``column`` and ``data`` read
+    them read-only.
+
+    Resizing a file while it is mapped fails on Windows, so drop the views
+    returned by ``column`` before appending more samples or closing.
+
+    Memory use does not grow with the capture: samples go straight to the
+    page cache, which the OS writes back as it flushes. Open a capture for
+    analysis with ``Capture``. A typical use, with ``DCReader``::
+
+        with dc.MemmapStore("run1", 2, names=["time", "fvel"]) as store:
+            reader = dc.DCReader(hc, "data", 2, dblen, store=store)
+            while collecting:
+                reader.poll()
+    """
+
+    def __init__(
+        self, directory, n_vars, names=None, capacity=65536, flush_every=65536
+    ):
+        if names is None:
+            names = ["var{}".format(i) for i in range(n_vars)]
+        names = list(names)
+        if len(names) != n_vars:
+            raise ValueError("Number of names does not match n_vars")
+        for name in names:
+            if not re.match(r"^\w+$", name) or name in ("index", "meta"):
+                raise ValueError("Invalid column name {!r}".format(name))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.names = names
+        self.flush_every = flush_every
+        self._columns = [
+            _NpyColumn(os.path.join(directory, name + ".npy"), "f8", capacity)
+            for name in names
+        ]
+        self._index = _NpyColumn(
+            os.path.join(directory, "index.npy"), _INDEX_DTYPE, 1024
+        )
+        self._n = 0
+        self._unflushed = 0
+        self.closed = False
+        self.flush()
+
+    def append(self, block):
+        """Appends a ``(n_vars, n)`` block of samples."""
+        n = block.shape[1]
+        for column, values in zip(self._columns, block):
+            column.append(values)
+        self._index.append(
+            np.array([(time.time(), self._n, n)], dtype=_INDEX_DTYPE)
+        )
+        self._n += n
+        self._unflushed += n
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Writes the samples and ``meta.json`` to disk."""
+        for column in self._columns + [self._index]:
+            column.flush()
+        self._write_meta()
+        self._unflushed = 0
+
+    def _write_meta(self):
+        _write_json(
+            os.path.join(self.directory, "meta.json"),
+            {
+                "names": self.names,
+                "count": self._n,
+                "blocks": self._index.n,
+                "complete": self.closed,
+            },
+        )
+
+    def close(self):
+        """Trims the files to the samples written and marks the capture
+        complete."""
+        if self.closed:
+            return
+        for column in self._columns + [self._index]:
+            column.close()
+        self.closed = True
+        self._write_meta()
+
+    def column(self, i):
+        """Returns a memory-mapped view of the samples of variable ``i``.
+
+        Drop it before the next ``append`` or ``close``, which may resize
+        the file.
+        """
+        return self._columns[i].view()
+
+    @property
+    def data(self):
+        """Returns a ``(n_vars, n)`` array of all samples, read into
+        memory."""
+        return np.stack([column.view() for column in self._columns])
+
+    def __len__(self):
+        return self._n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Capture(object):
+    """A capture written by ``MemmapStore``, opened lazily as read-only
+    memory maps.
+
+    ``capture[name]`` returns the samples of a variable, and ``index`` the
+    blocks as a structured array with fields ``time``, ``start`` and ``n``.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.names = meta["names"]
+        self.count = meta["count"]
+        self.complete = meta["complete"]
+        self._blocks = meta["blocks"]
+        self._maps = {}
+
+    def _load(self, name, n):
+        if name not in self._maps:
+            path = os.path.join(self.directory, name + ".npy")
+            self._maps[name] = np.load(path, mmap_mode="r")[:n]
+        return self._maps[name]
+
+    @property
+    def index(self):
+        return self._load("index", self._blocks)
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return self._load(name, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return "Capture({!r}, names={}, count={})".format(
+            self.directory, self.names, self.count
+        )
+
+
+class DCReader(object):
+    """Incrementally reads a cyclic (``DC/c``) data collection array.
+
+    The collection array is expected to hold one variable per row, as created
+    by ``prgs.ACSPLplusPrg.add_dc``. Each call to ``poll`` reads the sample
+    counter and then only the samples added since the previous poll, with at
+    most two range reads when the new samples wrap around the end of the
+    array. If more samples arrived than the array holds, the oldest were
+    overwritten; they are counted in ``lost`` and a ``DCOverrunWarning`` is
+    issued.
+
+    The counter variable (``S_DCN`` by default) must count the total number of
+    samples collected since ``DC`` started.
+    """
+
+    def __init__(
+        self,
+        hcomm,
+        array_name,
+        n_vars,
+        length,
+        names=None,
+        buffno=acsc.NONE,
+        counter="S_DCN",
+        store=None,
+    ):
+        self.hcomm = hcomm
+        self.array_name = array_name
+        self.n_vars = n_vars
+        self.length = length
+        if names is None:
+            names = getattr(store, "names", None)
+        self.names = list(names) if names is not None else None
+        if self.names is not None and len(self.names) != n_vars:
+            raise ValueError("Number of names does not match n_vars")
+        self.buffno = buffno
+        self.counter = counter
+        self.store = store if store is not None else ColumnStore(n_vars)
+        self._scratch = np.empty(n_vars * length)
+        self.count = 0
+        self.lost = 0
+
+    def _read(self, start, n):
+        """Reads ``n`` samples starting at array index ``start``."""
+        block = self._scratch[: self.n_vars * n].reshape(self.n_vars, n)
+        acsc.readReal(
+            self.hcomm,
+            self.buffno,
+            self.array_name,
+            0,
+            self.n_vars - 1,
+            start,
+            start + n - 1,
+            out=block,
+        )
+        self.store.append(block)
+
+    def poll(self):
+        """Reads any new samples into the store and returns how many."""
+        total = acsc.readInteger(self.hcomm, acsc.NONE, self.counter)
+        if total < self.count:  # Data collection was restarted
+            self.count = 0
+        n = total - self.count
+        if n > self.length:
+            lost = n - self.length
+            self.lost += lost
+            warnings.warn(
+                "{} samples of {} were overwritten before being "
+                "read".format(lost, self.array_name),
+                category=DCOverrunWarning,
+            )
+            n = self.length
+        if n > 0:
+            start = (total - n) % self.length
+            first = min(n, self.length - start)
+            self._read(start, first)
+            if first < n:
+                self._read(0, n - first)
+        self.count = total
+        return n
+
+    @property
+    def data(self):
+        """Returns a ``(n_vars, n)`` view of all samples read so far."""
+        return self.store.data
+
+    def __getitem__(self, name):
+        if self.names is None or name not in self.names:
+            raise KeyError(name)
+        return self.store.column(self.names.index(name))
+
+    def __len__(self):
+        return len(self.store)
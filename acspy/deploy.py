@@ -0,0 +1,123 @@
+"""Deployment of program buffers that reloads only what changed.
+
+The normalized text of each buffer is hashed and compared with a manifest of
+the hashes last deployed. The manifest can be kept in a local JSON file, in an
+integer array in the controller, or both; a buffer is skipped only if every
+manifest in use matches. Keeping it in the controller catches programs changed
+by other means, as well as a controller that lost its globals on restart. The
+array must be declared in the controller, e.g., in the D-buffer::
+
+    GLOBAL INT ACSPY_HASH(64)
+"""
+
+from __future__ import division, print_function
+
+import hashlib
+import json
+import os
+
+from acspy import acsc
+
+
+def normalize(text):
+    """Returns program text with line endings unified, trailing whitespace
+    stripped and blank lines removed."""
+    lines = (line.rstrip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+def buffer_hash(text):
+    """Returns the SHA-256 hex digest of normalized program text."""
+    return hashlib.sha256(normalize(text).encode()).hexdigest()
+
+
+def _int32_hash(digest):
+    """Folds a hex digest into the signed 32-bit value stored in the
+    controller."""
+    return acsc._to_int32(int(digest[:8], 16))
+
+
+class DeployReport(object):
+    """Buffers loaded and skipped by ``deploy``."""
+
+    def __init__(self):
+        self.loaded = []
+        self.skipped = []
+
+    def __repr__(self):
+        return "DeployReport(loaded={}, skipped={})".format(
+            self.loaded, self.skipped
+        )
+
+
+def deploy(
+    hcomm,
+    programs,
+    manifest=None,
+    variable=None,
+    compile=True,
+    force=False,
+):
+    """Loads and compiles the buffers whose programs changed.
+
+    ``programs`` is a ``.prg`` file name or a dict of program text by buffer
+    number. Compilation errors in a file are reported with their line in the
+    file. ``manifest`` is the path of a local JSON manifest and ``variable``
+    the name of an integer array in the controller indexed by buffer number;
+    with neither, or with ``force``, every buffer is loaded. Manifests are
+    updated as buffers are deployed; buffers loaded without ``compile`` are
+    removed from them, so they are loaded again by the next deploy. Returns a
+    ``DeployReport``.
+    """
+    first_lines = {}
+    if not isinstance(programs, dict):
+        programs = acsc.readBuffersFile(programs, first_lines)
+    hashes = {b: buffer_hash(text) for b, text in programs.items()}
+    local = {}
+    if manifest is not None and os.path.exists(manifest):
+        with open(manifest) as f:
+            local = {int(b): h for b, h in json.load(f).items()}
+    remote = None
+    if variable is not None and programs:
+        remote = acsc.readInteger(
+            hcomm, acsc.NONE, variable, 0, max(programs)
+        ).tolist()
+    report = DeployReport()
+    try:
+        for buffno in sorted(programs):
+            digest = hashes[buffno]
+            unchanged = not force and (manifest, variable) != (None, None)
+            if manifest is not None:
+                unchanged = unchanged and local.get(buffno) == digest
+            if remote is not None:
+                unchanged = unchanged and remote[buffno] == _int32_hash(digest)
+            if unchanged:
+                report.skipped.append(buffno)
+                continue
+            acsc.uploadBuffer(
+                hcomm,
+                buffno,
+                programs[buffno],
+                compile,
+                first_line=first_lines.get(buffno, 1),
+            )
+            # Only compiled buffers count as deployed
+            if remote is not None:
+                acsc.writeInteger(
+                    hcomm,
+                    variable,
+                    _int32_hash(digest) if compile else 0,
+                    acsc.NONE,
+                    buffno,
+                    buffno,
+                )
+            if compile:
+                local[buffno] = digest
+            else:
+                local.pop(buffno, None)
+            report.loaded.append(buffno)
+    finally:
+        if manifest is not None and report.loaded:
+            with open(manifest, "w") as f:
+                json.dump({str(b): h for b, h in sorted(local.items())}, f)
+    return report
@@ -2,39 +2,156 @@
 
 from __future__ import division, print_function
 
+import numbers
+
+# Number of lines joined into each chunk by the ``iter_*`` generators
+CHUNK_LINES = 1024
+
+
+def _ptp_prefix(axes, switch):
+    """Returns the start of a ``PTP`` line for one axis or a tuple of axes."""
+    if isinstance(axes, numbers.Integral):
+        return "PTP" + switch + " " + str(axes) + ", "
+    return "PTP" + switch + " (" + ",".join(str(a) for a in axes) + "), "
+
+
+def iter_ptp(axes, targets, switch="", chunk_lines=CHUNK_LINES):
+    """Yields ``PTP`` lines moving ``axes`` to each target, as text chunks of
+    up to ``chunk_lines`` lines.
+
+    ``axes`` is an axis number with a 1D array of targets, or a sequence of
+    axes with a ``(n, len(axes))`` array holding one target point per row.
+    """
+    import numpy as np
+
+    targets = np.asarray(targets)
+    single = isinstance(axes, numbers.Integral)
+    n_axes = 1 if single else len(axes)
+    if targets.ndim != (1 if single else 2) or (
+        targets.ndim == 2 and targets.shape[1] != n_axes
+    ):
+        raise ValueError(
+            "targets of shape {} do not match {} axes".format(
+                targets.shape, n_axes
+            )
+        )
+    line = _ptp_prefix(axes, switch) + ", ".join(["{}"] * n_axes) + "\n"
+    for start in range(0, len(targets), chunk_lines):
+        rows = targets[start : start + chunk_lines].tolist()
+        if n_axes == 1 and targets.ndim == 1:
+            yield "".join([line.format(t) for t in rows])
+        else:
+            yield "".join([line.format(*row) for row in rows])
+
+
+def iter_array_init(name, values, chunk_lines=CHUNK_LINES):
+    """Yields assignments initializing the array ``name`` from a 1D or 2D
+    array, as text chunks of up to ``chunk_lines`` lines."""
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.ndim == 1:
+        line = name + "({}) = {}\n"
+        rows = ((i, v) for i, v in enumerate(values.tolist()))
+    elif values.ndim == 2:
+        line = name + "({})({}) = {}\n"
+        rows = (
+            (i, j, v)
+            for i, row in enumerate(values.tolist())
+            for j, v in enumerate(row)
+        )
+    else:
+        raise ValueError("ACSPL+ arrays have one or two dimensions")
+    lines = []
+    for row in rows:
+        lines.append(line.format(*row))
+        if len(lines) == chunk_lines:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
 
 class ACSPLplusPrg(object):
+    """Builder for ACSPL+ program text.
+
+    Text is kept as a list of chunks and joined only when rendered, so
+    building a program costs time linear in its length. ``prg += text``
+    appends a chunk. ``iter_chunks`` and ``save`` stream the program without
+    joining it into one string.
+
+    ``prg.txt += text`` still works, but copies the whole program text on
+    every append, as ``txt`` is a string; use ``prg += text`` instead.
+    """
+
     def __init__(self):
-        self.txt = ""
+        self.chunks = []
+
+    @property
+    def txt(self):
+        """Returns the program text."""
+        return "".join(self.chunks)
+
+    @txt.setter
+    def txt(self, txt):
+        self.chunks = [txt]
+
+    def __iadd__(self, text):
+        self.chunks.append(text)
+        return self
 
     def declare_array(self, scope, arraytype, name, length):
         """Declares an array."""
-        self.txt += scope + " " + arraytype + " " + name
-        self.txt += "(" + str(length) + ")\n"
+        self.chunks.append(
+            scope + " " + arraytype + " " + name + "(" + str(length) + ")\n"
+        )
 
     def declare_2darray(self, scope, arraytype, name, rows, cols):
         """Declares a 2D array."""
-        self.txt += scope + " " + arraytype + " " + name
-        self.txt += "(" + str(rows) + ")(" + str(cols) + ")\n"
+        line = scope + " " + arraytype + " " + name
+        self.chunks.append(line + "(" + str(rows) + ")(" + str(cols) + ")\n")
 
     def addline(self, linestring):
-        self.txt += linestring + "\n"
+        self.chunks.append(linestring + "\n")
+
+    def addlines(self, lines):
+        """Adds an iterable of lines, e.g., one of the ``iter_*`` generators.
+        Items already ending in a newline are added as they are."""
+        for line in lines:
+            self.chunks.append(line if line.endswith("\n") else line + "\n")
 
     def addptp(self, axis, target, switch="", vel=None):
         """Adds a point to point move to the program."""
-        self.txt += "PTP" + switch + " " + str(axis) + ", " + str(target)
-        self.txt += "\n"
+        self.chunks.append(
+            "PTP" + switch + " " + str(axis) + ", " + str(target) + "\n"
+        )
+
+    def addptps(self, axes, targets, switch=""):
+        """Adds a point to point move to each target, see ``iter_ptp``."""
+        self.chunks.extend(iter_ptp(axes, targets, switch))
+
+    def add_array_init(self, name, values):
+        """Adds assignments initializing an array from a 1D or 2D array."""
+        self.chunks.extend(iter_array_init(name, values))
 
     def add_dc(self, array_name, length, sr, varname, switch=""):
         """Adds a data collection line to the program."""
-        self.txt += "DC" + switch + " " + array_name + ", " + str(length)
-        self.txt += ", " + str(1 / sr * 1000) + ", " + varname + "\n"
+        line = "DC" + switch + " " + array_name + ", " + str(length)
+        self.chunks.append(
+            line + ", " + str(1 / sr * 1000) + ", " + varname + "\n"
+        )
 
     def addstopline(self):
-        self.txt += "STOP"
+        self.chunks.append("STOP")
+
+    def iter_chunks(self):
+        """Yields the program text in chunks."""
+        return iter(self.chunks)
 
     def save(self, filename):
-        pass
+        """Writes the program to a file."""
+        with open(filename, "w") as f:
+            f.writelines(self.chunks)
 
     def __str__(self):
         return self.txt
@@ -0,0 +1,211 @@
+"""Latency instrumentation of library calls.
+
+While a ``Profiler`` is installed, every call made through ``acsc.call_acsc``
+is timed and counted per communication handle and library function::
+
+    with profiling.profile() as profiler:
+        run_cycle(hcomm)
+    print(profiler.report())
+
+Latencies are kept in histograms with four logarithmic buckets per octave
+from 1 us, so percentiles are estimated to within about 19%. When no profiler
+is installed, calls pay only a check of one module variable.
+"""
+
+from __future__ import division, print_function
+
+import contextlib
+import math
+import threading
+
+from acspy import acsc
+
+# Upper bounds of the histogram buckets in ns; the last bucket is unbounded
+BUCKETS_PER_OCTAVE = 4
+BOUNDS = [1000 * 2 ** ((i + 1) / BUCKETS_PER_OCTAVE) for i in range(96)]
+
+
+def _bucket(ns):
+    if ns <= 1000:
+        return 0
+    i = int(math.log2(ns / 1000) * BUCKETS_PER_OCTAVE)
+    return min(i, len(BOUNDS) - 1)
+
+
+def _name(func):
+    return getattr(func, "__name__", None) or repr(func)
+
+
+class CallStats(object):
+    """Count, errors and latency histogram of one function on one handle."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * len(BOUNDS)
+
+    def record(self, ns, failed):
+        self.count += 1
+        self.errors += failed
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self.buckets[_bucket(ns)] += 1
+
+    def percentile(self, q):
+        """Returns an estimate of the ``q``-th percentile latency in ns."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(BOUNDS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """Returns a dict of the statistics, with latencies in us."""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max_ns / 1e3,
+        }
+
+
+class Profiler(object):
+    """Collects ``CallStats`` by ``(hcomm, function name)``."""
+
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, hcomm, func, ns, failed):
+        """Records one call; called by ``acsc.call_acsc``."""
+        key = (hcomm, _name(func))
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = CallStats()
+            stats.record(ns, failed)
+
+    def reset(self):
+        """Discards all statistics."""
+        with self._lock:
+            self.stats.clear()
+
+    def snapshot(self):
+        """Returns ``{(hcomm, name): summary}``, see ``CallStats.summary``."""
+        with self._lock:
+            return {key: s.summary() for key, s in self.stats.items()}
+
+    def report(self):
+        """Returns a table of the statistics, slowest total time first."""
+        with self._lock:
+            items = sorted(
+                self.stats.items(), key=lambda item: -item[1].total_ns
+            )
+            lines = [
+                "{:<8}{:<28}{:>9}{:>7}{:>10}{:>10}{:>10}".format(
+                    "hcomm",
+                    "function",
+                    "calls",
+                    "errors",
+                    "p50 us",
+                    "p99 us",
+                    "max us",
+                )
+            ]
+            for (hcomm, name), s in items:
+                lines.append(
+                    "{:<8}{:<28}{:>9}{:>7}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                        str(hcomm),
+                        name,
+                        s.count,
+                        s.errors,
+                        s.percentile(50) / 1e3,
+                        s.percentile(99) / 1e3,
+                        s.max_ns / 1e3,
+                    )
+                )
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Returns the statistics in the Prometheus text exposition format.
+
+        Latencies are exported as the histogram
+        ``acspy_call_duration_seconds`` with one bucket per octave, and errors
+        as the counter ``acspy_call_errors_total``.
+        """
+        lines = [
+            "# HELP acspy_call_duration_seconds Latency of ACS library calls.",
+            "# TYPE acspy_call_duration_seconds histogram",
+        ]
+        errors = [
+            "# HELP acspy_call_errors_total Failed ACS library calls.",
+            "# TYPE acspy_call_errors_total counter",
+        ]
+        with self._lock:
+            for (hcomm, name), s in sorted(
+                self.stats.items(), key=lambda item: str(item[0])
+            ):
+                labels = 'hcomm="{}",function="{}"'.format(hcomm, name)
+                seen = 0
+                for i, n in enumerate(s.buckets[:-1]):
+                    seen += n
+                    if (i + 1) % BUCKETS_PER_OCTAVE == 0:
+                        lines.append(
+                            "acspy_call_duration_seconds_bucket"
+                            '{{{},le="{:g}"}} {}'.format(
+                                labels, BOUNDS[i] / 1e9, seen
+                            )
+                        )
+                lines.append(
+                    "acspy_call_duration_seconds_bucket"
+                    '{{{},le="+Inf"}} {}'.format(labels, s.count)
+                )
+                lines.append(
+                    "acspy_call_duration_seconds_sum{{{}}} {:g}".format(
+                        labels, s.total_ns / 1e9
+                    )
+                )
+                lines.append(
+                    "acspy_call_duration_seconds_count{{{}}} {}".format(
+                        labels, s.count
+                    )
+                )
+                errors.append(
+                    "acspy_call_errors_total{{{}}} {}".format(labels, s.errors)
+                )
+        return "\n".join(lines + errors) + "\n"
+
+
+def enable(profiler=None):
+    """Installs a profiler, a new one by default, and returns it."""
+    if profiler is None:
+        profiler = Profiler()
+    acsc.set_profiler(profiler)
+    return profiler
+
+
+def disable():
+    """Uninstalls the profiler and returns it."""
+    return acsc.set_profiler(None)
+
+
+@contextlib.contextmanager
+def profile(profiler=None):
+    """Profiles the library calls made inside a ``with`` block, yielding the
+    ``Profiler``."""
+    if profiler is None:
+        profiler = Profiler()
+    previous = acsc.set_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        acsc.set_profiler(previous)
@@ -0,0 +1,353 @@
+"""Recording of library calls and their offline replay.
+
+A ``Recorder`` wraps a library implementation, normally the native one, and
+logs every ``acsc_*`` call with its arguments, the contents of its output
+buffers, its return code and its timing to a compact binary file. A
+``ReplayLibrary`` serves a recording back in place of the library, so host
+code can be run, benchmarked and profiled without the library or a
+controller::
+
+    recorder = replay.record("session.acsrec")
+    run_session()
+    recorder.close()
+
+    replay.replay("session.acsrec")
+    run_session()  # Same calls, same results
+
+A recorder bound with ``record`` restores the previous backend when closed.
+Replay is strictly sequential: each call must match the name of the next
+recorded call, otherwise ``ReplayError`` is raised. Outputs of asynchronous
+calls are captured when ``acsc_WaitForAsyncCall`` completes them, and are
+written to the output buffers already when the call is replayed.
+
+File format, little-endian: the magic ``ACSREC1\\n``, then records starting
+with a type byte. ``N`` defines a function name (``u16`` id, ``u16`` length,
+bytes). ``C`` is a call (``u16`` name id, ``i64`` return code, ``i64`` start
+and ``i64`` duration in ns, ``u8`` argument count, arguments). ``U`` updates
+the buffers of the ``u32``-indexed call after an asynchronous completion
+(``u8`` count of ``u8`` argument index and ``u32``-length bytes). Each
+argument is a tag byte followed by its payload: none, ``i64``, ``f64``,
+``u32``-length bytes, ``u32``-length buffer contents, an opaque pointer, or
+``u32``-length contents of the array a pointer from NumPy's ``data_as``
+points to. Array contents are inputs, e.g., the values of ``writeReal``, and
+are not written back on replay.
+"""
+
+from __future__ import division, print_function
+
+import ctypes
+import struct
+import threading
+import time
+
+from acspy import acsc, backend
+
+MAGIC = b"ACSREC1\n"
+
+# Argument tags
+NONE, INT, FLOAT, BYTES, BUFFER, POINTER, ARRAY = range(7)
+
+_name_def = struct.Struct("<HH")
+_call = struct.Struct("<HqqqB")
+_update = struct.Struct("<IB")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+_u32 = struct.Struct("<I")
+_u8 = struct.Struct("<B")
+
+
+class ReplayError(acsc.AcscError):
+    """A call does not match the recording being replayed."""
+
+    pass
+
+
+_CArgObject = type(ctypes.byref(ctypes.c_int()))
+
+
+def _buffer_of(arg):
+    """Returns the ctypes object whose memory ``arg`` passes, or ``None``."""
+    if isinstance(arg, ctypes.Array):
+        return arg
+    if isinstance(arg, _CArgObject):  # byref
+        return arg._obj
+    return None
+
+
+def _contents(obj):
+    return ctypes.string_at(ctypes.addressof(obj), ctypes.sizeof(obj))
+
+
+def _encode(arg):
+    """Returns the tag and encoded payload of an argument."""
+    if arg is None:
+        return NONE, b""
+    if isinstance(arg, ctypes._SimpleCData):
+        arg = arg.value
+        if arg is None:
+            return NONE, b""
+    if isinstance(arg, bool):
+        arg = int(arg)
+    if isinstance(arg, int):
+        return INT, _i64.pack(arg)
+    if isinstance(arg, float):
+        return FLOAT, _f64.pack(arg)
+    if isinstance(arg, bytes):
+        return BYTES, _u32.pack(len(arg)) + arg
+    obj = _buffer_of(arg)
+    if obj is not None:
+        data = _contents(obj)
+        return BUFFER, _u32.pack(len(data)) + data
+    array = getattr(arg, "_arr", None)  # Kept by NumPy's data_as
+    if isinstance(arg, ctypes._Pointer) and hasattr(array, "nbytes"):
+        address = ctypes.cast(arg, ctypes.c_void_p).value
+        data = ctypes.string_at(address, array.nbytes)
+        return ARRAY, _u32.pack(len(data)) + data
+    return POINTER, b""
+
+
+class Recorder(object):
+    """Wraps a library implementation and records every ``acsc_*`` call."""
+
+    def __init__(self, filename, lib=None):
+        if lib is None:
+            lib = backend.load_native()
+        self.lib = lib
+        self.previous = lib  # Backend bound again on close, see ``record``
+        self._file = open(filename, "wb")
+        self._file.write(MAGIC)
+        self._names = {}
+        self._n_calls = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter_ns()
+
+    def _name_id(self, name):
+        name_id = self._names.get(name)
+        if name_id is None:
+            name_id = self._names[name] = len(self._names)
+            data = name.encode()
+            self._file.write(b"N" + _name_def.pack(name_id, len(data)) + data)
+        return name_id
+
+    def _record(self, name, args, rv, start, duration):
+        encoded = [_encode(arg) for arg in args]
+        with self._lock:
+            if self._file.closed:
+                return
+            index = self._n_calls
+            self._n_calls += 1
+            parts = [
+                b"C",
+                _call.pack(
+                    self._name_id(name),
+                    rv if isinstance(rv, int) else 0,
+                    start - self._t0,
+                    duration,
+                    len(args),
+                ),
+            ]
+            for tag, payload in encoded:
+                parts += [_u8.pack(tag), payload]
+            self._file.write(b"".join(parts))
+            if args and isinstance(_buffer_of(args[-1]), acsc.WaitBlock):
+                # Asynchronous call, outputs are filled on completion
+                buffers = [
+                    (i, _buffer_of(a))
+                    for i, a in enumerate(args)
+                    if _buffer_of(a) is not None
+                ]
+                self._pending[ctypes.addressof(args[-1]._obj)] = (
+                    index,
+                    buffers,
+                )
+
+    def _complete(self, wait_block):
+        """Records the outputs of the asynchronous call of ``wait_block``."""
+        with self._lock:
+            pending = self._pending.pop(ctypes.addressof(wait_block), None)
+            if pending is None or self._file.closed:
+                return
+            index, buffers = pending
+            parts = [b"U", _update.pack(index, len(buffers))]
+            for i, obj in buffers:
+                data = _contents(obj)
+                parts += [_u8.pack(i), _u32.pack(len(data)), data]
+            self._file.write(b"".join(parts))
+
+    def __getattr__(self, name):
+        if not name.startswith("acsc_"):
+            raise AttributeError(name)
+        func = getattr(self.lib, name)
+        prototype = acsc.prototypes.get(name)
+        if prototype is not None and isinstance(func, ctypes._CFuncPtr):
+            func.restype = prototype[0]
+            if prototype[1] is not None:
+                func.argtypes = prototype[1]
+
+        def call(*args):
+            start = time.perf_counter_ns()
+            rv = func(*args)
+            duration = time.perf_counter_ns() - start
+            self._record(name, args, rv, start, duration)
+            if name == "acsc_WaitForAsyncCall" and len(args) > 3:
+                obj = _buffer_of(args[3])
+                if obj is not None:
+                    self._complete(obj)
+            return rv
+
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+    def close(self):
+        """Finishes the recording and, if the recorder is the bound backend,
+        binds ``previous`` in its place."""
+        with self._lock:
+            self._file.close()
+        if acsc.get_backend() is self:
+            acsc.set_backend(self.previous)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Call(object):
+    """A recorded call."""
+
+    __slots__ = ("name", "rv", "start", "duration", "args")
+
+    def __init__(self, name, rv, start, duration, args):
+        self.name = name
+        self.rv = rv
+        self.start = start
+        self.duration = duration
+        self.args = args
+
+    def __repr__(self):
+        return "Call({}, rv={})".format(self.name, self.rv)
+
+
+def read_recording(filename):
+    """Returns the list of ``Call`` in a recording, with the outputs of
+    asynchronous calls updated to their completed contents."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ReplayError("{} is not an acspy recording".format(filename))
+    names = {}
+    calls = []
+    pos = len(MAGIC)
+
+    def take(n):
+        nonlocal pos
+        pos += n
+        return data[pos - n : pos]
+
+    while pos < len(data):
+        kind = take(1)
+        if kind == b"N":
+            name_id, length = _name_def.unpack(take(_name_def.size))
+            names[name_id] = take(length).decode()
+        elif kind == b"C":
+            name_id, rv, start, duration, n_args = _call.unpack(
+                take(_call.size)
+            )
+            args = []
+            for n in range(n_args):
+                tag = take(1)[0]
+                if tag == INT:
+                    args.append((tag, _i64.unpack(take(8))[0]))
+                elif tag == FLOAT:
+                    args.append((tag, _f64.unpack(take(8))[0]))
+                elif tag in (BYTES, BUFFER, ARRAY):
+                    (length,) = _u32.unpack(take(4))
+                    args.append((tag, take(length)))
+                else:
+                    args.append((tag, None))
+            calls.append(Call(names[name_id], rv, start, duration, args))
+        elif kind == b"U":
+            index, count = _update.unpack(take(_update.size))
+            for n in range(count):
+                i = take(1)[0]
+                (length,) = _u32.unpack(take(4))
+                calls[index].args[i] = (BUFFER, take(length))
+        else:
+            raise ReplayError("Corrupt recording {}".format(filename))
+    return calls
+
+
+class ReplayLibrary(object):
+    """Serves the calls of a recording in order in place of the library.
+
+    Recorded output buffers are copied into the buffers passed to each call,
+    and the recorded return code is returned. With ``timing``, each call
+    takes as long as it did when recorded.
+    """
+
+    def __init__(self, filename, timing=False):
+        self.calls = read_recording(filename)
+        self.timing = timing
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def _next(self, name):
+        with self._lock:
+            if self.position >= len(self.calls):
+                raise ReplayError(
+                    "{} called after the end of the recording".format(name)
+                )
+            call = self.calls[self.position]
+            if call.name != name:
+                raise ReplayError(
+                    "{} called, but call {} of the recording is {}".format(
+                        name, self.position, call.name
+                    )
+                )
+            self.position += 1
+            return call
+
+    def __getattr__(self, name):
+        if not name.startswith("acsc_"):
+            raise AttributeError(name)
+
+        def replay(*args):
+            call = self._next(name)
+            if self.timing:
+                time.sleep(call.duration / 1e9)
+            for arg, (tag, value) in zip(args, call.args):
+                if tag == BUFFER:
+                    obj = _buffer_of(arg)
+                    if obj is not None:
+                        ctypes.memmove(
+                            ctypes.addressof(obj),
+                            value,
+                            min(len(value), ctypes.sizeof(obj)),
+                        )
+            return call.rv
+
+        replay.__name__ = name
+        setattr(self, name, replay)
+        return replay
+
+
+def record(filename, lib=None):
+    """Binds a ``Recorder`` of ``lib`` (default the native library) as the
+    ``acsc`` backend and returns it. Closing the recorder binds the previous
+    backend again."""
+    previous = acsc.get_backend()
+    recorder = Recorder(filename, lib)
+    recorder.previous = previous
+    acsc.set_backend(recorder)
+    return recorder
+
+
+def replay(filename, timing=False):
+    """Binds a ``ReplayLibrary`` of a recording as the ``acsc`` backend and
+    returns it."""
+    library = ReplayLibrary(filename, timing=timing)
+    acsc.set_backend(library)
+    return library
@@ -0,0 +1,1829 @@
+"""In-process simulator of an ACS controller.
+
+``Simulator`` implements the ``acsc_*`` functions of the library in Python,
+so ``acsc`` and everything built on it run without the library or a
+controller::
+
+    simulator.simulate(n_axes=64)
+    hc = acsc.open_comm_simulator()
+
+It models point-to-point and jog motion with trapezoidal or jerk-limited
+(S-curve) profiles, the motor and axis state bits, ``MFLAGS``, digital
+outputs, global and local variables and arrays, program buffers running a
+subset of ACSPL+, and cyclic data collection. The motion of each axis is kept
+as a table of constant-jerk segments, which is evaluated for all axes at once
+when read, so nothing runs between calls and hundreds of axes cost little.
+Programs and data collection catch up to the current time on each call.
+
+Simplifications: feedback equals reference (``FPOS`` is ``RPOS``), the axes
+of a multi-axis move follow independent profiles, motion commands are queued
+to start from rest after the current motion of the axis, and every backward
+jump of a program takes one controller cycle while other statements take no
+time. All handles share one simulated controller. Calls with a wait block
+complete immediately. Library functions the simulator does not implement
+fail with an error.
+"""
+
+from __future__ import division, print_function
+
+import ctypes
+import functools
+import math
+import operator
+import re
+import threading
+import time
+
+import numpy as np
+
+from acspy import acsc
+
+N_BUFFERS = 64
+N_PORTS = 8
+CYCLE = 1e-3  # Controller cycle, s
+POLL_INTERVAL = 1e-3  # Polling period of blocking waits, s
+SERIAL_NUMBER = "SIMULATOR"
+VERSION = 1
+
+# Axis parameters and their defaults
+PARAMETERS = {
+    "VEL": 10000.0,
+    "ACC": 100000.0,
+    "DEC": 100000.0,
+    "KDEC": 1000000.0,
+    "JERK": 1000000.0,
+    "SLLIMIT": 0.0,
+    "SRLIMIT": 0.0,
+}
+
+# Error codes
+INVALID_HANDLE = 100
+TIMEOUT = 101
+NOT_SUPPORTED = 102
+INVALID_AXIS = 1000
+UNDEFINED_VARIABLE = 1001
+INDEX_OUT_OF_RANGE = 1002
+READ_ONLY = 1003
+MOTOR_DISABLED = 1004
+INVALID_BUFFER = 1005
+SYNTAX_ERROR = 1006
+PROGRAM_RUNNING = 1007
+INVALID_PARAMETER = 1008
+RUNTIME_ERROR = 1009
+
+ERRORS = {
+    INVALID_HANDLE: "Invalid communication handle",
+    TIMEOUT: "Timeout",
+    NOT_SUPPORTED: "Not supported by the simulator",
+    INVALID_AXIS: "Invalid axis",
+    UNDEFINED_VARIABLE: "Undefined variable",
+    INDEX_OUT_OF_RANGE: "Index out of range",
+    READ_ONLY: "Read-only variable",
+    MOTOR_DISABLED: "Motor is disabled",
+    INVALID_BUFFER: "Invalid buffer",
+    SYNTAX_ERROR: "Syntax error",
+    PROGRAM_RUNNING: "Program is running",
+    INVALID_PARAMETER: "Invalid motion parameter",
+    RUNTIME_ERROR: "Runtime error",
+}
+
+
+class SimulatorError(Exception):
+    """An error the simulated library or controller reports; ``line`` is
+    the program line for compilation errors."""
+
+    def __init__(self, code, detail=None, line=0):
+        message = ERRORS[code]
+        if detail is not None:
+            message += ": {}".format(detail)
+        super(SimulatorError, self).__init__(message)
+        self.code = code
+        self.detail = detail
+        self.message = message
+        self.line = line
+
+
+# Motion profiles
+
+
+def _ramp(dv, acc, jerk):
+    """Returns the phases ``(duration, acc0, jerk)`` changing velocity by
+    ``dv`` at up to ``acc``, limited by ``jerk`` unless it is 0 or inf."""
+    s = math.copysign(1.0, dv)
+    dv = abs(dv)
+    if dv == 0:
+        return []
+    if not 0 < jerk < math.inf:
+        return [(dv / acc, s * acc, 0.0)]
+    if dv >= acc * acc / jerk:
+        tj = acc / jerk
+        return [
+            (tj, 0.0, s * jerk),
+            (dv / acc - tj, s * acc, 0.0),
+            (tj, s * acc, -s * jerk),
+        ]
+    tj = math.sqrt(dv / jerk)
+    return [(tj, 0.0, s * jerk), (tj, s * jerk * tj, -s * jerk)]
+
+
+def _ramp_time(dv, acc, jerk):
+    return sum(phase[0] for phase in _ramp(dv, acc, jerk))
+
+
+def _ptp_phases(distance, vel, acc, dec, jerk):
+    """Returns the phases of a rest-to-rest move over ``distance``."""
+    if min(vel, acc, dec) <= 0:
+        raise SimulatorError(INVALID_PARAMETER, "VEL, ACC and DEC must be > 0")
+    s = math.copysign(1.0, distance)
+    d = abs(distance)
+    if d == 0:
+        return []
+
+    def length(v):
+        return v * (_ramp_time(v, acc, jerk) + _ramp_time(v, dec, jerk)) / 2
+
+    peak = vel
+    if length(vel) > d:
+        # Too short to reach vel, bisect for the peak velocity
+        lo, hi = 0.0, vel
+        for n in range(60):
+            mid = (lo + hi) / 2
+            if length(mid) <= d:
+                lo = mid
+            else:
+                hi = mid
+        peak = lo if lo > 0 else hi
+    cruise = max(d - length(peak), 0.0) / peak
+    return (
+        _ramp(s * peak, acc, jerk)
+        + [(cruise, 0.0, 0.0)]
+        + _ramp(-s * peak, dec, jerk)
+    )
+
+
+def _segments(t, p, v, phases):
+    """Integrates phases from ``(t, p, v)``, returning the segments
+    ``(start, p, v, a, j)`` and the final time, position and velocity."""
+    segments = []
+    for duration, a, j in phases:
+        if duration <= 0:
+            continue
+        segments.append((t, p, v, a, j))
+        p += v * duration + a * duration**2 / 2 + j * duration**3 / 6
+        v += a * duration + j * duration**2 / 2
+        t += duration
+    return segments, t, p, v
+
+
+class _Axes(object):
+    """Motion of all axes as tables of constant-jerk segments.
+
+    ``end`` is the time the motion of each axis ends, infinite while it
+    jogs, and ``target`` its last commanded position. Segments before
+    ``keep_from`` are dropped as new motion is added.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.segments = [[(0.0, 0.0, 0.0, 0.0, 0.0)] for i in range(n)]
+        self.end = np.zeros(n)
+        self.target = np.zeros(n)
+        self.enabled = np.zeros(n, dtype=bool)
+        self.params = {k: np.full(n, v) for k, v in PARAMETERS.items()}
+        self.mflags = np.zeros(n, dtype=np.int32)
+        self.merr = np.zeros(n, dtype=np.int32)
+        self.pending = {}  # Motion waiting for GO by axis
+        self.keep_from = 0.0
+        self._table = None
+        self._dirty = set(range(n))
+
+    def check(self, axis):
+        if not 0 <= axis < self.n:
+            raise SimulatorError(INVALID_AXIS, axis)
+        return int(axis)
+
+    def _check_enabled(self, axis):
+        if not self.enabled[self.check(axis)]:
+            raise SimulatorError(MOTOR_DISABLED, axis)
+
+    def table(self):
+        """Returns the ``(n, k, 5)`` array of segments, padded with
+        segments starting at infinity."""
+        width = max(len(s) for s in self.segments)
+        if self._table is None or width > self._table.shape[1]:
+            self._table = np.empty((self.n, width, 5))
+            self._dirty = set(range(self.n))
+        for i in self._dirty:
+            segments = self.segments[i]
+            self._table[i, : len(segments)] = segments
+            self._table[i, len(segments) :] = (np.inf, 0, 0, 0, 0)
+        self._dirty.clear()
+        return self._table
+
+    def state(self, t):
+        """Returns the positions, velocities and accelerations at ``t``."""
+        table = self.table()
+        idx = np.maximum((table[:, :, 0] <= t).sum(axis=1) - 1, 0)
+        start, p, v, a, j = table[np.arange(self.n), idx].T
+        dt = t - start
+        return (
+            p + v * dt + a * dt**2 / 2 + j * dt**3 / 6,
+            v + a * dt + j * dt**2 / 2,
+            a + j * dt,
+        )
+
+    def at(self, axis, t):
+        """Returns the position, velocity, acceleration and jerk of one axis
+        at ``t``."""
+        for start, p, v, a, j in reversed(self.segments[axis]):
+            if start <= t:
+                break
+        dt = t - start
+        return (
+            p + v * dt + a * dt**2 / 2 + j * dt**3 / 6,
+            v + a * dt + j * dt**2 / 2,
+            a + j * dt,
+            j,
+        )
+
+    def sample(self, axis, times, velocity=False):
+        """Returns the positions or velocities of one axis at ``times``."""
+        segments = np.array(self.segments[axis])
+        idx = np.searchsorted(segments[:, 0], times, side="right") - 1
+        start, p, v, a, j = segments[np.maximum(idx, 0)].T
+        dt = times - start
+        if velocity:
+            return v + a * dt + j * dt**2 / 2
+        return p + v * dt + a * dt**2 / 2 + j * dt**3 / 6
+
+    def status(self, t):
+        """Returns the ``MST`` and ``AST`` words at ``t``."""
+        pos, vel, acc = self.state(t)
+        moving = t < self.end
+        accelerating = moving & (acc != 0)
+        ast = np.where(moving, acsc.AST_MOVE, 0) | np.where(
+            accelerating, acsc.AST_ACC, 0
+        )
+        mst = (
+            np.where(self.enabled, acsc.MST_ENABLE, 0)
+            | np.where(self.enabled & ~moving, acsc.MST_INPOS, 0)
+            | ast
+        )
+        return mst.astype(np.int32), ast.astype(np.int32)
+
+    def _set(self, axis, t, segments, end):
+        """Replaces the motion of an axis from ``t`` on."""
+        history = [s for s in self.segments[axis] if s[0] < t]
+        keep = min(t, self.keep_from)
+        while len(history) > 1 and history[1][0] <= keep:
+            del history[0]
+        self.segments[axis] = history + segments
+        self.end[axis] = end
+        self._dirty.add(axis)
+
+    def _start(self, axis, t):
+        """Returns the time a new motion of an axis starts, after its
+        current one, braking it first if it jogs."""
+        if self.end[axis] == np.inf:
+            return self.halt(axis, t)
+        return max(t, self.end[axis])
+
+    def ptp(self, axis, t, target, relative=False, vel=None, wait=False):
+        self._check_enabled(axis)
+        if wait:
+            self.pending[axis] = lambda t: self.ptp(axis, t, target, relative)
+            return
+        if relative:
+            target += self.target[axis]
+        start = self._start(axis, t)
+        p0 = self.segments[axis][-1][1]
+        params = self.params
+        phases = _ptp_phases(
+            target - p0,
+            params["VEL"][axis] if vel is None else vel,
+            params["ACC"][axis],
+            params["DEC"][axis],
+            params["JERK"][axis],
+        )
+        segments, end, p, v = _segments(start, p0, 0.0, phases)
+        # The final position is exact
+        segments.append((end, target, 0.0, 0.0, 0.0))
+        self._set(axis, start, segments, end)
+        self.target[axis] = target
+
+    def jog(self, axis, t, vel, wait=False):
+        self._check_enabled(axis)
+        if wait:
+            self.pending[axis] = lambda t: self.jog(axis, t, vel)
+            return
+        p, v, a, j = self.at(axis, t)
+        rate = self.params["ACC" if abs(vel) > abs(v) else "DEC"][axis]
+        if rate <= 0:
+            raise SimulatorError(INVALID_PARAMETER, "ACC and DEC must be > 0")
+        phases = _ramp(vel - v, rate, self.params["JERK"][axis])
+        segments, end, p, v = _segments(t, p, v, phases)
+        segments.append((end, p, vel, 0.0, 0.0))
+        self._set(axis, t, segments, np.inf if vel else end)
+        self.target[axis] = p
+
+    def halt(self, axis, t, kill=False):
+        """Brakes an axis with ``DEC``, or ``KDEC`` without jerk limit if
+        ``kill``, and returns the time it stops."""
+        self.check(axis)
+        self.pending.pop(axis, None)
+        if t >= self.end[axis]:
+            return t
+        p, v, a, j = self.at(axis, t)
+        if kill:
+            phases = _ramp(-v, self.params["KDEC"][axis], 0.0)
+        else:
+            phases = _ramp(
+                -v, self.params["DEC"][axis], self.params["JERK"][axis]
+            )
+        segments, end, p, v = _segments(t, p, v, phases)
+        segments.append((end, p, 0.0, 0.0, 0.0))
+        self._set(axis, t, segments, end)
+        self.target[axis] = p
+        return end
+
+    def go(self, axis, t):
+        start = self.pending.pop(self.check(axis), None)
+        if start is not None:
+            start(t)
+
+    def enable(self, axis):
+        self.enabled[self.check(axis)] = True
+
+    def disable(self, axis, t):
+        """Disables an axis, stopping it at once."""
+        self.check(axis)
+        self.pending.pop(axis, None)
+        self.enabled[axis] = False
+        p = self.at(axis, t)[0]
+        self._set(axis, t, [(t, p, 0.0, 0.0, 0.0)], t)
+        self.target[axis] = p
+
+    def set_position(self, axis, t, value):
+        """Shifts the position of an axis to ``value`` at ``t``."""
+        p, v, a, j = self.at(axis, t)
+        offset = value - p
+        future = [
+            (s[0], s[1] + offset) + s[2:]
+            for s in self.segments[axis]
+            if s[0] > t
+        ]
+        self._set(axis, t, [(t, value, v, a, j)] + future, self.end[axis])
+        self.target[axis] += offset
+
+
+# Variables
+
+
+class _Variable(object):
+    """A variable declared in a program or with ``acsc_DeclareVariable``."""
+
+    def __init__(self, is_int, shape):
+        self.is_int = is_int
+        self.shape = shape
+        self.data = np.zeros(shape, dtype=np.int32 if is_int else np.float64)
+
+    def get(self, t):
+        return self.data
+
+    def set(self, index, values, t):
+        self.data[index] = values
+
+
+class _Standard(object):
+    """A standard variable computed by ``get(t)``, and written by
+    ``set(values, t)`` with its full new value unless read-only."""
+
+    def __init__(self, is_int, shape, get, set=None):
+        self.is_int = is_int
+        self.shape = shape
+        self.get = get
+        self._set = set
+
+    def set(self, index, values, t):
+        if self._set is None:
+            raise SimulatorError(READ_ONLY)
+        full = np.array(self.get(t), dtype=np.int32 if self.is_int else float)
+        full[index] = values
+        self._set(full, t)
+
+
+def _check_index(var, index):
+    if len(index) != len(var.shape):
+        raise SimulatorError(
+            INDEX_OUT_OF_RANGE,
+            "{} index(es) given for {} dimension(s)".format(
+                len(index), len(var.shape)
+            ),
+        )
+    for i, n in zip(index, var.shape):
+        if not 0 <= i < n:
+            raise SimulatorError(INDEX_OUT_OF_RANGE, i)
+
+
+def _range_index(var, prefix, from1, to1, from2, to2):
+    """Returns the index and shape of an ``acsc`` index range."""
+    ranges = [(from1, to1), (from2, to2)]
+    given = [r for r in ranges if r[0] not in (None, acsc.NONE)]
+    dims = var.shape[len(prefix) :]
+    if len(given) != len(dims):
+        raise SimulatorError(
+            INDEX_OUT_OF_RANGE,
+            "{} range(s) given for {} dimension(s)".format(
+                len(given), len(dims)
+            ),
+        )
+    index = list(prefix)
+    for (start, stop), n in zip(given, dims):
+        if not 0 <= start <= stop < n:
+            raise SimulatorError(
+                INDEX_OUT_OF_RANGE, "{}..{}".format(start, stop)
+            )
+        index.append(slice(start, stop + 1))
+    return tuple(index), tuple(stop - start + 1 for start, stop in given)
+
+
+_CArgObject = type(ctypes.byref(ctypes.c_int()))
+
+
+def _target(arg):
+    """Returns the ctypes object passed by reference by ``arg``."""
+    return arg._obj if isinstance(arg, _CArgObject) else arg
+
+
+def _load(arg, n):
+    """Returns ``n`` values passed by a ``byref``, array or pointer."""
+    obj = _target(arg)
+    if isinstance(obj, ctypes.Array):
+        return np.ctypeslib.as_array(obj).ravel()[:n].copy()
+    if isinstance(obj, ctypes._Pointer):
+        return np.ctypeslib.as_array(obj, shape=(n,)).copy()
+    return np.array([obj.value])
+
+
+def _store(arg, values):
+    """Writes values to a ``byref``, array or pointer output."""
+    values = np.asarray(values).ravel()
+    obj = _target(arg)
+    if isinstance(obj, ctypes.Array):
+        np.ctypeslib.as_array(obj).ravel()[: values.size] = values
+    elif isinstance(obj, ctypes._Pointer):
+        np.ctypeslib.as_array(obj, shape=(values.size,))[:] = values
+    elif isinstance(obj, ctypes.c_double):
+        obj.value = float(values[0])
+    else:
+        obj.value = int(values[0])
+
+
+def _axis_list(arg):
+    """Returns the axes of a ``-1``-terminated ctypes array."""
+    axes = []
+    for axis in arg:
+        if axis == -1:
+            break
+        axes.append(axis)
+    return axes
+
+
+def _text(arg, count=None):
+    """Returns the text of a string buffer argument."""
+    obj = _target(arg)
+    data = obj.raw if isinstance(obj, ctypes.Array) else bytes(obj)
+    if count is not None:
+        data = data[:count]
+    return data.split(b"\0", 1)[0].decode()
+
+
+# ACSPL+ expressions
+
+
+_SPACE = re.compile(r"\s*")
+_TOKEN = re.compile(
+    r"(?P<num>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r'|(?P<str>"[^"]*")'
+    r"|(?P<op><>|<=|>=|[-+*/()=<>&|~^,:])"
+)
+_BIT = re.compile(r"\.(#?[A-Za-z_]\w*|\d+)")
+_COMMENT = re.compile(r'("[^"]*")|!.*')
+_AXIS_ELEMENT = re.compile(r"([A-Z_]+)(\d+)$")
+
+_BIT_NAMES = {
+    "MST": {"ENABLED": 0, "INPOS": 4, "MOVE": 5, "ACC": 6},
+    "AST": {flag.name: flag.value.bit_length() - 1 for flag in acsc.AxisState},
+    "MFLAGS": acsc.ax_mflags,
+}
+
+_FUNCTIONS = {
+    "ABS": abs,
+    "SQRT": math.sqrt,
+    "SIN": math.sin,
+    "COS": math.cos,
+    "TAN": math.tan,
+    "ASIN": math.asin,
+    "ACOS": math.acos,
+    "ATAN": math.atan,
+    "ATAN2": math.atan2,
+    "EXP": math.exp,
+    "LN": math.log,
+    "FLOOR": math.floor,
+    "CEIL": math.ceil,
+    "MIN": min,
+    "MAX": max,
+    "POW": math.pow,
+}
+
+_BINARY = {
+    "|": (1, lambda a, b: int(a) | int(b)),
+    "~": (2, lambda a, b: int(a) ^ int(b)),
+    "&": (3, lambda a, b: int(a) & int(b)),
+    "=": (4, lambda a, b: int(a == b)),
+    "<>": (4, lambda a, b: int(a != b)),
+    "<": (4, lambda a, b: int(a < b)),
+    ">": (4, lambda a, b: int(a > b)),
+    "<=": (4, lambda a, b: int(a <= b)),
+    ">=": (4, lambda a, b: int(a >= b)),
+    "+": (5, operator.add),
+    "-": (5, operator.sub),
+    "*": (6, operator.mul),
+    "/": (6, operator.truediv),
+}
+
+_UNARY = {
+    "-": operator.neg,
+    "+": operator.pos,
+    "~": lambda a: ~int(a),
+    "^": lambda a: int(not a),
+}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = _SPACE.match(text).end()
+    while pos < len(text):
+        prev = tokens[-1] if tokens else None
+        if text[pos] == "." and (
+            prev == ("op", ")") or (prev is not None and prev[0] == "name")
+        ):
+            match = _BIT.match(text, pos)
+            kind = "bit"
+        else:
+            match = _TOKEN.match(text, pos)
+            kind = match and match.lastgroup
+        if match is None:
+            raise SimulatorError(SYNTAX_ERROR, "unexpected " + text[pos:])
+        value = match.group(1) if kind == "bit" else match.group(kind)
+        tokens.append((kind, value.upper() if kind == "name" else value))
+        pos = _SPACE.match(text, match.end()).end()
+    return tokens
+
+
+class _Num(object):
+    def __init__(self, value):
+        self.value = value
+
+    def eval(self, ctx):
+        return self.value
+
+
+class _Name(object):
+    def __init__(self, name, args=()):
+        self.name = name
+        self.args = args
+
+    def eval(self, ctx):
+        return ctx.read(self.name, [int(arg.eval(ctx)) for arg in self.args])
+
+
+class _Call(object):
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def eval(self, ctx):
+        try:
+            return self.func(*[arg.eval(ctx) for arg in self.args])
+        except (ValueError, TypeError) as e:
+            raise SimulatorError(RUNTIME_ERROR, e)
+
+
+class _Unary(object):
+    def __init__(self, func, operand):
+        self.func = func
+        self.operand = operand
+
+    def eval(self, ctx):
+        return self.func(self.operand.eval(ctx))
+
+
+class _Binary(object):
+    def __init__(self, func, left, right):
+        self.func = func
+        self.left = left
+        self.right = right
+
+    def eval(self, ctx):
+        try:
+            return self.func(self.left.eval(ctx), self.right.eval(ctx))
+        except ZeroDivisionError:
+            raise SimulatorError(RUNTIME_ERROR, "division by zero")
+
+
+class _Bit(object):
+    def __init__(self, operand, bit):
+        self.operand = operand
+        self.bit = bit
+
+    def eval(self, ctx):
+        return (int(self.operand.eval(ctx)) >> self.bit) & 1
+
+
+class _Parser(object):
+    """Recursive-descent parser of one ACSPL+ line."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise SimulatorError(SYNTAX_ERROR, "unexpected end of line")
+        self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            raise SimulatorError(
+                SYNTAX_ERROR,
+                "expected {}, got {}".format(
+                    value or kind, self.peek()[1] or "end of line"
+                ),
+            )
+        return token[1]
+
+    def at_end(self):
+        return self.pos == len(self.tokens)
+
+    def end(self):
+        if not self.at_end():
+            raise SimulatorError(SYNTAX_ERROR, "unexpected " + self.peek()[1])
+
+    def expression(self, min_prec=1):
+        left = self.unary()
+        while True:
+            kind, value = self.peek()
+            if kind != "op" or value not in _BINARY:
+                return left
+            prec, func = _BINARY[value]
+            if prec < min_prec:
+                return left
+            self.pos += 1
+            left = _Binary(func, left, self.expression(prec + 1))
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == "op" and value in _UNARY:
+            self.pos += 1
+            return _Unary(_UNARY[value], self.unary())
+        return self.postfix(self.primary())
+
+    def primary(self):
+        kind, value = self.next()
+        if kind == "num":
+            if value[:2].lower() == "0x":
+                return _Num(int(value, 16))
+            if re.search(r"[.eE]", value):
+                return _Num(float(value))
+            return _Num(int(value))
+        if kind == "name":
+            args = self.indices()
+            if value in _FUNCTIONS and args:
+                return _Call(_FUNCTIONS[value], args)
+            return _Name(value, args)
+        if (kind, value) == ("op", "("):
+            node = self.expression()
+            self.expect("op", ")")
+            return node
+        raise SimulatorError(SYNTAX_ERROR, "unexpected {}".format(value))
+
+    def indices(self):
+        """Parses ``(i)(j)`` or ``(i, j)`` after a name."""
+        args = []
+        while self.accept("op", "("):
+            args.append(self.expression())
+            while self.accept("op", ","):
+                args.append(self.expression())
+            self.expect("op", ")")
+        return args
+
+    def postfix(self, node):
+        while self.peek()[0] == "bit":
+            bit = self.next()[1]
+            if bit.startswith("#"):
+                name = getattr(node, "name", None)
+                tables = [_BIT_NAMES[name]] if name in _BIT_NAMES else []
+                tables += list(_BIT_NAMES.values())
+                for table in tables:
+                    if bit[1:].upper() in table:
+                        bit = table[bit[1:].upper()]
+                        break
+                else:
+                    raise SimulatorError(SYNTAX_ERROR, "unknown bit " + bit)
+            node = _Bit(node, int(bit))
+        return node
+
+    def expressions(self):
+        nodes = [self.expression()]
+        while self.accept("op", ","):
+            nodes.append(self.expression())
+        return nodes
+
+    def switches(self):
+        if self.accept("op", "/"):
+            return self.expect("name").lower()
+        return ""
+
+    def axes(self):
+        """Parses ``ALL``, an axis or a parenthesized list of axes."""
+        if self.accept("name", "ALL"):
+            return None
+        if self.peek() == ("op", "("):
+            self.pos += 1
+            axes = self.expressions()
+            self.expect("op", ")")
+            return axes
+        return [self.expression()]
+
+
+# ACSPL+ programs
+
+_BLOCK_KEYWORDS = ("IF", "ELSEIF", "ELSE", "WHILE", "LOOP", "END")
+
+
+def _parse_declaration(parser):
+    """Parses ``name[(n)[(m)]]``, returning the name and shape."""
+    name = parser.expect("name")
+    shape = []
+    while parser.accept("op", "("):
+        shape.append(int(parser.expect("num")))
+        parser.expect("op", ")")
+    if len(shape) > 2 or any(n <= 0 for n in shape):
+        raise SimulatorError(SYNTAX_ERROR, "invalid dimensions of " + name)
+    return name, tuple(shape)
+
+
+class _Code(object):
+    """A compiled program: instructions ``[op, line, *args]``, labels and
+    declarations ``(is_global, is_int, name, shape)``."""
+
+    def __init__(self):
+        self.instructions = []
+        self.labels = {}
+        self.declarations = []
+
+    def emit(self, op, line, *args):
+        self.instructions.append([op, line] + list(args))
+        return len(self.instructions) - 1
+
+
+def _compile(text):
+    """Compiles ACSPL+ text, raising ``SimulatorError`` with the line of the
+    first error."""
+    code = _Code()
+    blocks = []
+    jumps = []  # Instructions jumping to labels
+    number = 0
+    for number, line in enumerate(text.splitlines(), 1):
+        line = _COMMENT.sub(lambda m: m.group(1) or "", line)
+        try:
+            tokens = _tokenize(line)
+            if tokens:
+                _compile_statement(code, blocks, jumps, number, tokens)
+        except SimulatorError as e:
+            detail = "line {}: {}".format(number, e.detail)
+            raise SimulatorError(e.code, detail, number)
+    if blocks:
+        raise SimulatorError(
+            SYNTAX_ERROR, "missing END of {}".format(blocks[-1][0]), number
+        )
+    for index in jumps:
+        instruction = code.instructions[index]
+        if instruction[2] not in code.labels:
+            raise SimulatorError(
+                SYNTAX_ERROR,
+                "undefined label {}".format(instruction[2]),
+                instruction[1],
+            )
+    return code
+
+
+def _compile_statement(code, blocks, jumps, line, tokens):
+    p = _Parser(tokens)
+    kind, keyword = tokens[0]
+    if kind == "name" and len(tokens) == 2 and tokens[1] == ("op", ":"):
+        code.labels[keyword] = len(code.instructions)
+        return
+    if kind != "name":
+        raise SimulatorError(SYNTAX_ERROR, "unexpected " + keyword)
+    p.pos = 1
+    if keyword in ("GLOBAL", "LOCAL", "REAL", "INT"):
+        is_global = keyword == "GLOBAL"
+        if keyword in ("GLOBAL", "LOCAL"):
+            keyword = p.expect("name")
+            if keyword not in ("REAL", "INT"):
+                raise SimulatorError(SYNTAX_ERROR, "expected REAL or INT")
+        while True:
+            name, shape = _parse_declaration(p)
+            code.declarations.append(
+                (is_global, keyword == "INT", name, shape)
+            )
+            if not p.accept("op", ","):
+                break
+    elif keyword in _BLOCK_KEYWORDS:
+        _compile_block(code, blocks, line, keyword, p)
+    elif keyword == "PTP":
+        switches = p.switches()
+        axes = p.axes()
+        if axes is None:
+            raise SimulatorError(SYNTAX_ERROR, "PTP ALL")
+        p.expect("op", ",")
+        values = p.expressions()
+        vel = values.pop() if "v" in switches else None
+        if len(values) != len(axes):
+            raise SimulatorError(SYNTAX_ERROR, "number of PTP targets")
+        code.emit("ptp", line, switches, axes, values, vel)
+    elif keyword == "JOG":
+        switches = p.switches()
+        axes = p.axes()
+        if axes is None:
+            raise SimulatorError(SYNTAX_ERROR, "JOG ALL")
+        values = None
+        if p.accept("op", ","):
+            if "v" in switches:
+                values = p.expressions()
+            else:
+                sign = p.expect("op")
+                values = [_Num(-1.0 if sign == "-" else 1.0)] * len(axes)
+        code.emit("jog", line, switches, axes, values)
+    elif keyword in ("ENABLE", "DISABLE", "HALT", "KILL", "GO"):
+        code.emit(keyword.lower(), line, p.axes())
+    elif keyword == "SET":
+        code.emit("assign", line, *_assignment(p))
+    elif keyword == "WAIT":
+        code.emit("wait", line, p.expression())
+    elif keyword == "TILL":
+        condition = p.expression()
+        timeout = p.expression() if p.accept("op", ",") else None
+        code.emit("till", line, condition, timeout)
+    elif keyword == "DC":
+        switches = p.switches()
+        if switches not in ("", "c"):
+            raise SimulatorError(SYNTAX_ERROR, "DC/" + switches)
+        array = p.expect("name")
+        p.expect("op", ",")
+        n = p.expression()
+        p.expect("op", ",")
+        period = p.expression()
+        p.expect("op", ",")
+        code.emit("dc", line, switches, array, n, period, p.expressions())
+    elif keyword == "STOPDC":
+        code.emit("stopdc", line)
+    elif keyword in ("STOP", "RET"):
+        code.emit(keyword.lower(), line)
+    elif keyword in ("GOTO", "CALL"):
+        jumps.append(code.emit(keyword.lower(), line, p.expect("name")))
+    elif keyword == "DISP":
+        p.pos = len(tokens)
+    else:
+        p.pos = 0
+        code.emit("assign", line, *_assignment(p))
+    p.end()
+
+
+def _assignment(p):
+    target = p.postfix(p.primary())
+    if not isinstance(target, (_Name, _Bit)):
+        raise SimulatorError(SYNTAX_ERROR, "invalid assignment")
+    p.expect("op", "=")
+    return target, p.expression()
+
+
+def _compile_block(code, blocks, line, keyword, p):
+    """Compiles control flow, patching jump targets when blocks end."""
+    if keyword == "IF":
+        blocks.append(["IF", code.emit("jif", line, p.expression(), None), []])
+    elif keyword in ("ELSEIF", "ELSE"):
+        if not blocks or blocks[-1][0] != "IF" or blocks[-1][1] is None:
+            raise SimulatorError(SYNTAX_ERROR, keyword + " without IF")
+        block = blocks[-1]
+        block[2].append(code.emit("jmp", line, None))
+        code.instructions[block[1]][-1] = len(code.instructions)
+        block[1] = None
+        if keyword == "ELSEIF":
+            block[1] = code.emit("jif", line, p.expression(), None)
+    elif keyword == "WHILE":
+        start = len(code.instructions)
+        blocks.append(
+            ["WHILE", code.emit("jif", line, p.expression(), None), start]
+        )
+    elif keyword == "LOOP":
+        blocks.append(["LOOP", code.emit("loop", line, p.expression(), None)])
+    else:
+        if not blocks:
+            raise SimulatorError(SYNTAX_ERROR, "END without block")
+        block = blocks.pop()
+        if block[0] == "WHILE":
+            code.emit("jmp", line, block[2])
+        elif block[0] == "LOOP":
+            code.emit("next", line, block[1])
+        end = len(code.instructions)
+        if block[1] is not None:
+            code.instructions[block[1]][-1] = end
+        for index in block[2] if block[0] == "IF" else ():
+            code.instructions[index][-1] = end
+
+
+class _Program(object):
+    """State of a program buffer."""
+
+    def __init__(self):
+        self.text = ""
+        self.code = None
+        self.running = False
+        self.pc = 0
+        self.tp = 0.0  # Time up to which the program has run
+        self.block = None
+        self.locals = {}
+        self.stack = []
+        self.counters = {}
+
+
+class _Context(object):
+    """Evaluation of expressions in a program at time ``t``."""
+
+    def __init__(self, simulator, program, t):
+        self.simulator = simulator
+        self.program = program
+        self.t = t
+
+    def read(self, name, indices):
+        var, prefix = self.simulator._lookup(name, self.program)
+        index = prefix + tuple(indices)
+        _check_index(var, index)
+        return var.get(self.t)[index].item()
+
+
+class _DataCollection(object):
+    def __init__(self, var, n, period, samplers, cyclic, t0):
+        self.var = var
+        self.n = n
+        self.period = period
+        self.samplers = samplers
+        self.cyclic = cyclic
+        self.t0 = t0
+        self.stop = np.inf
+        self.count = 0
+
+
+def _api(lock=True, handle=True):
+    """Wraps an ``acsc_*`` implementation: converts ctypes scalars to
+    values, checks the handle, brings the simulation up to date under the
+    lock, and returns 0 with the error kept for ``acsc_GetLastError`` if it
+    raises ``SimulatorError``."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def call(self, *args):
+            args = [
+                a.value if isinstance(a, ctypes._SimpleCData) else a
+                for a in args
+            ]
+            try:
+                if not lock:
+                    rv = func(self, *args)
+                else:
+                    with self._lock:
+                        if handle:
+                            self._check_handle(args[0])
+                        self._advance()
+                        rv = func(self, *args)
+            except SimulatorError as e:
+                self._local.error = e
+                return 0
+            return 1 if rv is None else rv
+
+        return call
+
+    return decorate
+
+
+class Simulator(object):
+    """Simulated controller implementing the ``acsc_*`` library functions.
+
+    ``clock`` returns the time in seconds, by default ``time.monotonic``;
+    a custom clock can run the simulation faster than real time.
+    """
+
+    def __init__(self, n_axes=8, clock=time.monotonic):
+        self.n_axes = n_axes
+        self._clock = clock
+        self._t0 = clock()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._handles = set()
+        self._next_handle = 1
+        self.axes = _Axes(n_axes)
+        self.inputs = np.zeros(N_PORTS, dtype=np.int32)
+        self.outputs = np.zeros(N_PORTS, dtype=np.int32)
+        self.globals = {}
+        self.programs = [_Program() for n in range(N_BUFFERS)]
+        self._perr = np.zeros(N_BUFFERS, dtype=np.int32)
+        self._perl = np.zeros(N_BUFFERS, dtype=np.int32)
+        self._dcn = np.zeros((), dtype=np.int32)
+        self._dc = None
+        self._standard = self._standard_variables()
+
+    def _now(self):
+        return self._clock() - self._t0
+
+    def _standard_variables(self):
+        axes = self.axes
+        shape = (self.n_axes,)
+
+        def positions(full, t):
+            current = axes.state(t)[0]
+            for axis in np.flatnonzero(full != current):
+                axes.set_position(axis, t, full[axis])
+
+        def parameter(values):
+            def set(full, t):
+                values[:] = full
+
+            return set
+
+        def program_states(t):
+            return np.array(
+                [self._program_state(p) for p in self.programs],
+                dtype=np.int32,
+            )
+
+        variables = {
+            "RPOS": _Standard(
+                False, shape, lambda t: axes.state(t)[0], positions
+            ),
+            "RVEL": _Standard(False, shape, lambda t: axes.state(t)[1]),
+            "RACC": _Standard(False, shape, lambda t: axes.state(t)[2]),
+            "PE": _Standard(False, shape, lambda t: np.zeros(shape)),
+            "MST": _Standard(True, shape, lambda t: axes.status(t)[0]),
+            "AST": _Standard(True, shape, lambda t: axes.status(t)[1]),
+            "TIME": _Standard(False, (), lambda t: np.array(t * 1000.0)),
+            "S_DCN": _Standard(True, (), lambda t: self._dcn),
+            "PERR": _Standard(True, (N_BUFFERS,), lambda t: self._perr),
+            "PERL": _Standard(True, (N_BUFFERS,), lambda t: self._perl),
+            "PST": _Standard(True, (N_BUFFERS,), program_states),
+        }
+        variables["FPOS"] = variables["RPOS"]
+        variables["FVEL"] = variables["RVEL"]
+        variables["FACC"] = variables["RACC"]
+        for name, values in axes.params.items():
+            variables[name] = _Standard(
+                False, shape, lambda t, v=values: v, parameter(values)
+            )
+        for name, values, n in (
+            ("MFLAGS", axes.mflags, self.n_axes),
+            ("MERR", axes.merr, self.n_axes),
+            ("IN", self.inputs, N_PORTS),
+            ("OUT", self.outputs, N_PORTS),
+        ):
+            variables[name] = _Standard(
+                True, (n,), lambda t, v=values: v, parameter(values)
+            )
+        return variables
+
+    def _lookup(self, name, program=None):
+        """Returns a variable and the index prefix addressing it, e.g.,
+        ``(1,)`` for the axis variable element ``SLLIMIT1``."""
+        name = name.upper()
+        if program is not None and name in program.locals:
+            return program.locals[name], ()
+        var = self.globals.get(name) or self._standard.get(name)
+        if var is not None:
+            return var, ()
+        match = _AXIS_ELEMENT.match(name)
+        if match:
+            var = self._standard.get(match.group(1))
+            if var is not None and var.shape == (self.n_axes,):
+                axis = self.axes.check(int(match.group(2)))
+                return var, (axis,)
+        raise SimulatorError(UNDEFINED_VARIABLE, name)
+
+    def _declare(self, scope, is_int, name, shape):
+        name = name.upper()
+        if name in self._standard or name in _FUNCTIONS:
+            raise SimulatorError(SYNTAX_ERROR, "{} is reserved".format(name))
+        var = scope.get(name)
+        if var is None or (var.is_int, var.shape) != (is_int, shape):
+            scope[name] = _Variable(is_int, shape)
+
+    def _program(self, buffno):
+        if not 0 <= buffno < N_BUFFERS:
+            raise SimulatorError(INVALID_BUFFER, buffno)
+        return self.programs[buffno]
+
+    def _program_state(self, program):
+        state = 0
+        if program.code is not None:
+            state |= acsc.PST_COMPILED
+        if program.running:
+            state |= acsc.PST_RUN
+        return state
+
+    def _check_handle(self, hcomm):
+        if hcomm not in self._handles:
+            raise SimulatorError(INVALID_HANDLE, hcomm)
+
+    # Simulation
+
+    def _advance(self):
+        """Runs programs and data collection up to the current time."""
+        now = self._now()
+        running = [p for p in self.programs if p.running]
+        keep = min([now] + [p.tp for p in running])
+        if self._dc is not None:
+            keep = min(keep, self._dc.t0 + self._dc.count * self._dc.period)
+        self.axes.keep_from = keep
+        # Programs interact through variables, so run them in turns until
+        # none can proceed
+        progress = True
+        while progress:
+            progress = False
+            for program in running:
+                progress |= self._step(program, now)
+        self._collect(now)
+
+    def _step(self, program, now):
+        """Runs a program up to ``now``, returning whether it executed any
+        statement."""
+        executed = False
+        instructions = program.code.instructions
+        while program.running and program.tp <= now:
+            if program.block is not None:
+                resume = self._resume(program, now)
+                if resume is None:
+                    break
+                program.block = None
+                program.tp = max(program.tp, resume)
+                continue
+            if program.pc >= len(instructions):
+                program.running = False
+                break
+            instruction = instructions[program.pc]
+            program.pc += 1
+            executed = True
+            try:
+                getattr(self, "_op_" + instruction[0])(
+                    program, *instruction[2:]
+                )
+            except SimulatorError as e:
+                program.running = False
+                buffno = self.programs.index(program)
+                self._perr[buffno] = e.code
+                self._perl[buffno] = instruction[1]
+        return executed
+
+    def _resume(self, program, now):
+        """Returns the time a blocked program resumes, or ``None``."""
+        kind = program.block[0]
+        if kind == "motion":
+            end = max(self.axes.end[axis] for axis in program.block[1])
+            return end if end <= now else None
+        condition, deadline = program.block[1:]
+        if condition.eval(_Context(self, program, now)):
+            return now
+        if deadline is not None and deadline <= now:
+            return deadline
+        return None
+
+    def _collect(self, now):
+        """Fills the data collection array with the samples up to ``now``."""
+        dc = self._dc
+        if dc is None:
+            return
+        end = min(now, dc.stop)
+        total = int(math.floor((end - dc.t0) / dc.period + 1e-9)) + 1
+        if not dc.cyclic:
+            total = min(total, dc.n)
+        if total > dc.count:
+            k = np.arange(max(dc.count, total - dc.n), total)
+            times = dc.t0 + k * dc.period
+            for row, sampler in enumerate(dc.samplers):
+                values = sampler(times)
+                if len(dc.var.shape) == 1:
+                    dc.var.data[k % dc.n] = values
+                else:
+                    dc.var.data[row, k % dc.n] = values
+            dc.count = total
+            self._dcn[()] = total
+        if end >= dc.stop or (not dc.cyclic and total >= dc.n):
+            self._dc = None
+
+    def _sampler(self, node, program):
+        """Returns a function of sample times returning the values of a
+        collected variable: profiles and ``TIME`` vectorised over the times,
+        other variables at the latest time."""
+        if isinstance(node, _Name) and not node.args and node.name == "TIME":
+            return lambda times: times * 1000.0
+        if (
+            isinstance(node, _Name)
+            and node.name in ("RPOS", "FPOS", "RVEL", "FVEL")
+            and len(node.args) == 1
+            and isinstance(node.args[0], _Num)
+        ):
+            axis = self.axes.check(node.args[0].value)
+            velocity = node.name.endswith("VEL")
+            return lambda times: self.axes.sample(axis, times, velocity)
+        node.eval(_Context(self, program, self._now()))  # Check it now
+
+        def sample(times):
+            return node.eval(_Context(self, program, times[-1]))
+
+        return sample
+
+    def _axes(self, ctx, nodes):
+        if nodes is None:
+            return list(range(self.n_axes))
+        return [self.axes.check(int(node.eval(ctx))) for node in nodes]
+
+    def _assign(self, ctx, target, value):
+        if isinstance(target, _Bit):
+            word = int(target.operand.eval(ctx))
+            if value:
+                value = word | 1 << target.bit
+            else:
+                value = word & ~(1 << target.bit)
+            target = target.operand
+        var, prefix = self._lookup(target.name, ctx.program)
+        index = prefix + tuple(int(arg.eval(ctx)) for arg in target.args)
+        _check_index(var, index)
+        if var.is_int:
+            value = acsc._to_int32(int(value))
+        var.set(index, value, ctx.t)
+
+    def _run(self, program, label=None):
+        if program.code is None:
+            self._compile(program)
+        program.pc = 0
+        if label is not None:
+            label = label.upper()
+            if label not in program.code.labels:
+                raise SimulatorError(SYNTAX_ERROR, "no label " + label)
+            program.pc = program.code.labels[label]
+        program.locals = {}
+        for is_global, is_int, name, shape in program.code.declarations:
+            if not is_global:
+                self._declare(program.locals, is_int, name, shape)
+        program.tp = self._now()
+        program.block = None
+        program.stack = []
+        program.counters = {}
+        program.running = True
+
+    def _compile(self, program):
+        buffno = self.programs.index(program)
+        self._perr[buffno] = self._perl[buffno] = 0
+        program.code = None
+        try:
+            code = _compile(program.text)
+            for is_global, is_int, name, shape in code.declarations:
+                if is_global:
+                    self._declare(self.globals, is_int, name, shape)
+        except SimulatorError as e:
+            self._perr[buffno] = e.code
+            self._perl[buffno] = e.line
+            raise
+        program.code = code
+
+    # Program statements, executed at the program time
+
+    def _op_assign(self, program, target, expression):
+        ctx = _Context(self, program, program.tp)
+        self._assign(ctx, target, expression.eval(ctx))
+
+    def _op_enable(self, program, axes):
+        for axis in self._axes(_Context(self, program, program.tp), axes):
+            self.axes.enable(axis)
+
+    def _op_disable(self, program, axes):
+        for axis in self._axes(_Context(self, program, program.tp), axes):
+            self.axes.disable(axis, program.tp)
+
+    def _op_halt(self, program, axes):
+        for axis in self._axes(_Context(self, program, program.tp), axes):
+            self.axes.halt(axis, program.tp)
+
+    def _op_kill(self, program, axes):
+        for axis in self._axes(_Context(self, program, program.tp), axes):
+            self.axes.halt(axis, program.tp, kill=True)
+
+    def _op_go(self, program, axes):
+        for axis in self._axes(_Context(self, program, program.tp), axes):
+            self.axes.go(axis, program.tp)
+
+    def _op_ptp(self, program, switches, axes, values, vel):
+        ctx = _Context(self, program, program.tp)
+        axes = self._axes(ctx, axes)
+        vel = vel.eval(ctx) if vel is not None else None
+        for axis, value in zip(axes, values):
+            self.axes.ptp(
+                axis,
+                program.tp,
+                value.eval(ctx),
+                relative="r" in switches,
+                vel=vel,
+                wait="w" in switches,
+            )
+        if "e" in switches:
+            program.block = ("motion", axes)
+
+    def _op_jog(self, program, switches, axes, values):
+        ctx = _Context(self, program, program.tp)
+        axes = self._axes(ctx, axes)
+        for n, axis in enumerate(axes):
+            value = 1.0 if values is None else values[n].eval(ctx)
+            if "v" not in switches:
+                value = math.copysign(self.axes.params["VEL"][axis], value)
+            self.axes.jog(axis, program.tp, value, wait="w" in switches)
+
+    def _op_wait(self, program, expression):
+        ms = expression.eval(_Context(self, program, program.tp))
+        program.tp += max(ms, 0) / 1000
+
+    def _op_till(self, program, condition, timeout):
+        deadline = None
+        if timeout is not None:
+            ms = timeout.eval(_Context(self, program, program.tp))
+            deadline = program.tp + ms / 1000
+        program.block = ("till", condition, deadline)
+
+    def _op_dc(self, program, switches, array, n, period, nodes):
+        ctx = _Context(self, program, program.tp)
+        var, prefix = self._lookup(array, program)
+        n = int(n.eval(ctx))
+        period = period.eval(ctx) / 1000
+        if not isinstance(var, _Variable) or prefix:
+            raise SimulatorError(RUNTIME_ERROR, "DC needs a user array")
+        rows = var.shape[0] if len(var.shape) == 2 else 1
+        if len(nodes) != rows or n > var.shape[-1] or n <= 0 or period <= 0:
+            raise SimulatorError(
+                RUNTIME_ERROR, "DC array does not match its variables"
+            )
+        samplers = [self._sampler(node, program) for node in nodes]
+        self._dc = _DataCollection(
+            var, n, period, samplers, "c" in switches, program.tp
+        )
+        self._dcn[()] = 0
+
+    def _op_stopdc(self, program):
+        if self._dc is not None:
+            self._dc.stop = program.tp
+            self._collect(program.tp)
+
+    def _op_stop(self, program):
+        program.running = False
+
+    def _op_ret(self, program):
+        if program.stack:
+            program.pc = program.stack.pop()
+        else:
+            program.running = False
+
+    def _jump(self, program, target):
+        # Backward jumps take a controller cycle
+        if target < program.pc:
+            program.tp += CYCLE
+        program.pc = target
+
+    def _op_goto(self, program, label):
+        self._jump(program, program.code.labels[label])
+
+    def _op_call(self, program, label):
+        program.stack.append(program.pc)
+        self._jump(program, program.code.labels[label])
+
+    def _op_jmp(self, program, target):
+        self._jump(program, target)
+
+    def _op_jif(self, program, condition, target):
+        if not condition.eval(_Context(self, program, program.tp)):
+            program.pc = target
+
+    def _op_loop(self, program, count, target):
+        n = int(count.eval(_Context(self, program, program.tp)))
+        program.counters[program.pc - 1] = n
+        if n <= 0:
+            program.pc = target
+
+    def _op_next(self, program, start):
+        program.counters[start] -= 1
+        if program.counters[start] > 0:
+            self._jump(program, start + 1)
+
+    # Blocking waits, polling with the lock released
+
+    def _wait(self, hcomm, timeout, done):
+        deadline = None
+        if timeout is not None and timeout >= 0:
+            deadline = self._now() + timeout / 1000
+        while True:
+            with self._lock:
+                self._check_handle(hcomm)
+                self._advance()
+                if done():
+                    return
+                if deadline is not None and self._now() >= deadline:
+                    raise SimulatorError(TIMEOUT)
+            time.sleep(POLL_INTERVAL)
+
+    @_api(lock=False)
+    def acsc_WaitMotionEnd(self, hcomm, axis, timeout):
+        self.axes.check(axis)
+        self._wait(hcomm, timeout, lambda: self._now() >= self.axes.end[axis])
+
+    acsc_WaitLogicalMotionEnd = acsc_WaitMotionEnd
+
+    @_api(lock=False)
+    def acsc_WaitMotorEnabled(self, hcomm, axis, state, timeout):
+        self.axes.check(axis)
+        self._wait(
+            hcomm, timeout, lambda: self.axes.enabled[axis] == bool(state)
+        )
+
+    @_api(lock=False)
+    def acsc_WaitMotorCommutated(self, hcomm, axis, state, timeout):
+        # Simulated motors are always commutated
+        self.axes.check(axis)
+
+    @_api(lock=False)
+    def acsc_WaitProgramEnd(self, hcomm, buffno, timeout):
+        program = self._program(buffno)
+        self._wait(hcomm, timeout, lambda: not program.running)
+
+    @_api(lock=False)
+    def acsc_WaitInput(self, hcomm, port, bit, state, timeout):
+        self._check_io(port, bit)
+        self._wait(
+            hcomm,
+            timeout,
+            lambda: (self.inputs[port] >> bit) & 1 == bool(state),
+        )
+
+    # Library functions
+
+    def __getattr__(self, name):
+        if not name.startswith("acsc_"):
+            raise AttributeError(name)
+
+        def unsupported(*args):
+            self._local.error = SimulatorError(NOT_SUPPORTED, name)
+            return 0
+
+        unsupported.__name__ = name
+        return unsupported
+
+    def _open(self):
+        with self._lock:
+            hcomm = self._next_handle
+            self._next_handle += 1
+            self._handles.add(hcomm)
+            return hcomm
+
+    def acsc_OpenCommSimulator(self):
+        return self._open()
+
+    def acsc_OpenCommDirect(self):
+        return self._open()
+
+    def acsc_OpenCommEthernetTCP(self, address, port):
+        return self._open()
+
+    @_api()
+    def acsc_CloseComm(self, hcomm):
+        self._handles.discard(hcomm)
+
+    @_api(lock=False, handle=False)
+    def acsc_GetLastError(self):
+        error = getattr(self._local, "error", None)
+        return error.code if error is not None else 0
+
+    @_api(lock=False, handle=False)
+    def acsc_GetErrorString(self, hcomm, code, buf, size, length):
+        error = getattr(self._local, "error", None)
+        if error is not None and error.code == code:
+            message = error.message
+        else:
+            message = ERRORS.get(code, "Unknown error")
+        data = message.encode()[: size - 1]
+        _target(buf).value = data
+        _store(length, len(data))
+
+    @_api(lock=False, handle=False)
+    def acsc_GetLibraryVersion(self):
+        return VERSION
+
+    @_api()
+    def acsc_GetSerialNumber(self, hcomm, buf, size, length, wait):
+        data = SERIAL_NUMBER.encode()[: size - 1]
+        _target(buf).value = data
+        _store(length, len(data))
+
+    @_api(lock=False, handle=False)
+    def acsc_RegisterEmergencyStop(self):
+        pass
+
+    acsc_UnregisterEmergencyStop = acsc_RegisterEmergencyStop
+
+    @_api(lock=False)
+    def acsc_WaitForAsyncCall(self, hcomm, buf, received, wait_block, timeout):
+        # Calls complete before they return
+        _store(received, 0)
+
+    @_api()
+    def acsc_CancelOperation(self, hcomm, wait):
+        pass
+
+    @_api()
+    def acsc_Command(self, hcomm, buf, length, wait):
+        """Executes ACSPL+ statements immediately."""
+        program = _Program()
+        program.text = _text(buf, length).replace("\r", "\n")
+        program.code = _compile(program.text)
+        for is_global, is_int, name, shape in program.code.declarations:
+            self._declare(self.globals, is_int, name, shape)
+        program.tp = self._now()
+        program.running = True
+        instructions = program.code.instructions
+        while program.running and program.pc < len(instructions):
+            instruction = instructions[program.pc]
+            program.pc += 1
+            getattr(self, "_op_" + instruction[0])(program, *instruction[2:])
+            if program.block is not None:
+                break
+
+    @_api()
+    def acsc_Enable(self, hcomm, axis, wait):
+        self.axes.enable(axis)
+
+    @_api()
+    def acsc_EnableM(self, hcomm, axes, wait):
+        for axis in _axis_list(axes):
+            self.axes.enable(axis)
+
+    @_api()
+    def acsc_Disable(self, hcomm, axis, wait):
+        self.axes.disable(axis, self._now())
+
+    @_api()
+    def acsc_DisableM(self, hcomm, axes, wait):
+        for axis in _axis_list(axes):
+            self.axes.disable(axis, self._now())
+
+    @_api()
+    def acsc_DisableAll(self, hcomm, wait):
+        for axis in range(self.n_axes):
+            self.axes.disable(axis, self._now())
+
+    @_api()
+    def acsc_CommutExt(self, hcomm, axis, current, settle, slope, wait):
+        self.axes.check(axis)
+
+    @_api()
+    def acsc_ToPoint(self, hcomm, flags, axis, target, wait):
+        flags = flags or 0
+        self.axes.ptp(
+            axis,
+            self._now(),
+            target,
+            relative=bool(flags & acsc.AMF_RELATIVE),
+            wait=bool(flags & acsc.AMF_WAIT),
+        )
+
+    @_api()
+    def acsc_ToPointM(self, hcomm, flags, axes, targets, wait):
+        flags = flags or 0
+        axes = _axis_list(axes)
+        for axis, target in zip(axes, _load(targets, len(axes))):
+            self.axes.ptp(
+                axis,
+                self._now(),
+                float(target),
+                relative=bool(flags & acsc.AMF_RELATIVE),
+                wait=bool(flags & acsc.AMF_WAIT),
+            )
+
+    @_api()
+    def acsc_Jog(self, hcomm, flags, axis, vel, wait):
+        flags = flags or 0
+        self.axes.check(axis)
+        if not flags & acsc.AMF_VELOCITY:
+            vel = math.copysign(self.axes.params["VEL"][axis], vel)
+        self.axes.jog(axis, self._now(), vel, wait=bool(flags & acsc.AMF_WAIT))
+
+    @_api()
+    def acsc_Go(self, hcomm, axis, wait):
+        self.axes.go(axis, self._now())
+
+    @_api()
+    def acsc_Halt(self, hcomm, axis, wait):
+        self.axes.halt(axis, self._now())
+
+    @_api()
+    def acsc_Kill(self, hcomm, axis, wait):
+        self.axes.halt(axis, self._now(), kill=True)
+
+    @_api()
+    def acsc_KillAll(self, hcomm, wait):
+        for axis in range(self.n_axes):
+            self.axes.halt(axis, self._now(), kill=True)
+
+    def _check_io(self, port, bit):
+        if not 0 <= port < N_PORTS or not 0 <= bit < 32:
+            raise SimulatorError(INDEX_OUT_OF_RANGE, (port, bit))
+
+    @_api()
+    def acsc_GetOutput(self, hcomm, port, bit, value, wait):
+        self._check_io(port, bit)
+        _store(value, (self.outputs[port] >> bit) & 1)
+
+    @_api()
+    def acsc_SetOutput(self, hcomm, port, bit, value, wait):
+        self._check_io(port, bit)
+        word = int(self.outputs[port]) & ~(1 << bit) | bool(value) << bit
+        self.outputs[port] = acsc._to_int32(word)
+
+    @_api()
+    def acsc_GetInput(self, hcomm, port, bit, value, wait):
+        self._check_io(port, bit)
+        _store(value, (self.inputs[port] >> bit) & 1)
+
+    def _read(self, buffno, name, from1, to1, from2, to2, out):
+        program = None if buffno in (None, acsc.NONE) else buffno
+        if program is not None:
+            program = self._program(program)
+        var, prefix = self._lookup(_text(name), program)
+        index, shape = _range_index(var, prefix, from1, to1, from2, to2)
+        _store(out, var.get(self._now())[index])
+
+    def _write(self, buffno, name, from1, to1, from2, to2, values):
+        program = None if buffno in (None, acsc.NONE) else buffno
+        if program is not None:
+            program = self._program(program)
+        var, prefix = self._lookup(_text(name), program)
+        index, shape = _range_index(var, prefix, from1, to1, from2, to2)
+        values = _load(values, int(np.prod(shape)))
+        if var.is_int:
+            values = values.astype(np.int64).astype(np.int32)
+        var.set(index, values.reshape(shape), self._now())
+
+    @_api()
+    def acsc_ReadReal(self, hcomm, buffno, name, f1, t1, f2, t2, out, wait):
+        self._read(buffno, name, f1, t1, f2, t2, out)
+
+    @_api()
+    def acsc_ReadInteger(self, hcomm, buffno, name, f1, t1, f2, t2, out, wait):
+        self._read(buffno, name, f1, t1, f2, t2, out)
+
+    @_api()
+    def acsc_WriteReal(
+        self, hcomm, buffno, name, f1, t1, f2, t2, values, wait
+    ):
+        self._write(buffno, name, f1, t1, f2, t2, values)
+
+    @_api()
+    def acsc_WriteInteger(
+        self, hcomm, buffno, name, f1, t1, f2, t2, values, wait
+    ):
+        self._write(buffno, name, f1, t1, f2, t2, values)
+
+    @_api()
+    def acsc_DeclareVariable(self, hcomm, vartype, name, wait):
+        if vartype not in (acsc.INT_TYPE, acsc.REAL_TYPE):
+            raise SimulatorError(SYNTAX_ERROR, "variable type")
+        p = _Parser(_tokenize(_text(name)))
+        name, shape = _parse_declaration(p)
+        p.end()
+        self._declare(self.globals, vartype == acsc.INT_TYPE, name, shape)
+
+    def _load_text(self, buffno, text, append):
+        program = self._program(buffno)
+        if program.running:
+            raise SimulatorError(PROGRAM_RUNNING, buffno)
+        program.text = program.text + text if append else text
+        program.code = None
+
+    @_api()
+    def acsc_LoadBuffer(self, hcomm, buffno, text, count, wait):
+        self._load_text(buffno, _text(text, count), append=False)
+
+    @_api()
+    def acsc_AppendBuffer(self, hcomm, buffno, text, count, wait):
+        self._load_text(buffno, _text(text, count), append=True)
+
+    @_api()
+    def acsc_ClearBuffer(self, hcomm, buffno, from_line, to_line, wait):
+        self._load_text(buffno, "", append=False)
+
+    @_api()
+    def acsc_CompileBuffer(self, hcomm, buffno, wait):
+        program = self._program(buffno)
+        if program.running:
+            raise SimulatorError(PROGRAM_RUNNING, buffno)
+        self._compile(program)
+
+    @_api()
+    def acsc_RunBuffer(self, hcomm, buffno, label, wait):
+        program = self._program(buffno)
+        if program.running:
+            raise SimulatorError(PROGRAM_RUNNING, buffno)
+        self._run(program, None if label is None else _text(label))
+
+    @_api()
+    def acsc_StopBuffer(self, hcomm, buffno, wait):
+        programs = self.programs
+        if buffno not in (None, acsc.NONE):
+            programs = [self._program(buffno)]
+        for program in programs:
+            program.running = False
+
+    @_api()
+    def acsc_GetProgramState(self, hcomm, buffno, state, wait):
+        _store(state, self._program_state(self._program(buffno)))
+
+
+def _getter(var):
+    def get(self, hcomm, axis, value, wait):
+        self.axes.check(axis)
+        now = self._now()
+        if var in ("RPOS", "FPOS"):
+            _store(value, self.axes.at(axis, now)[0])
+        elif var in ("RVEL", "FVEL"):
+            _store(value, self.axes.at(axis, now)[1])
+        else:
+            _store(value, self._standard[var].get(now)[axis])
+
+    return get
+
+
+def _setter(var):
+    def set(self, hcomm, axis, value, wait):
+        self.axes.check(axis)
+        self._standard[var].set((axis,), value, self._now())
+
+    return set
+
+
+for _name, _var in (
+    ("RPosition", "RPOS"),
+    ("FPosition", "FPOS"),
+    ("RVelocity", "RVEL"),
+    ("FVelocity", "FVEL"),
+    ("Velocity", "VEL"),
+    ("Acceleration", "ACC"),
+    ("Deceleration", "DEC"),
+    ("KillDeceleration", "KDEC"),
+    ("Jerk", "JERK"),
+    ("MotorState", "MST"),
+    ("AxisState", "AST"),
+    ("MotorError", "MERR"),
+):
+    _func = _getter(_var)
+    _func.__name__ = "acsc_Get" + _name
+    setattr(Simulator, _func.__name__, _api()(_func))
+    if _var not in ("RVEL", "FVEL", "MST", "AST", "MERR"):
+        _func = _setter(_var)
+        _func.__name__ = "acsc_Set" + _name
+        setattr(Simulator, _func.__name__, _api()(_func))
+
+
+def simulate(n_axes=8, clock=time.monotonic):
+    """Binds a new ``Simulator`` as the ``acsc`` backend and returns it."""
+    simulator = Simulator(n_axes, clock)
+    acsc.set_backend(simulator)
+    return simulator
@@ -0,0 +1,87 @@
+"""Runs the tests against the Python simulator where the ACS library is not
+available, and provides fixtures binding stand-in backends for a test."""
+
+import contextlib
+import ctypes
+
+import pytest
+
+from acspy import acsc, backend, simulator
+
+try:
+    acsc.set_backend(backend.load_native())
+except OSError:
+    acsc.set_backend(simulator.Simulator())
+
+
+class RecordingStub(object):
+    """Records calls into the library, with ctypes arguments as values."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def func(*args):
+            values = []
+            for arg in args:
+                if isinstance(arg, ctypes.Array):
+                    values.append(list(arg))
+                elif isinstance(arg, ctypes._SimpleCData):
+                    values.append(arg.value)
+                else:
+                    values.append(arg)
+            self.calls.append((name, values))
+            return 1
+
+        func.__name__ = name
+        return func
+
+
+class FailingCompileStub(RecordingStub):
+    """Fails compilation with an error reported at line 3."""
+
+    def acsc_CompileBuffer(self, *args):
+        return 0
+
+    def acsc_ReadInteger(self, *args):
+        args[7][0] = 3
+        return 1
+
+
+@contextlib.contextmanager
+def _bound(lib):
+    previous = acsc.get_backend()
+    acsc.set_backend(lib)
+    try:
+        yield lib
+    finally:
+        acsc.set_backend(previous)
+
+
+@pytest.fixture
+def stub():
+    """A ``RecordingStub`` bound as the backend."""
+    with _bound(RecordingStub()) as lib:
+        yield lib
+
+
+@pytest.fixture
+def failing_compile():
+    """A ``FailingCompileStub`` bound as the backend."""
+    with _bound(FailingCompileStub()) as lib:
+        yield lib
+
+
+@pytest.fixture
+def clock():
+    """A fresh 4-axis simulator bound as the backend, whose time in seconds
+    the test sets in ``clock[0]``."""
+    clock = [0.0]
+    with _bound(simulator.Simulator(n_axes=4, clock=lambda: clock[0])):
+        yield clock
+
+
+@pytest.fixture
+def hc(clock):
+    """A handle to the simulator of ``clock``."""
+    return acsc.open_comm_simulator()
@@ -1,5 +1,12 @@
 """Tests for ``acspy.acsc``."""
 
+import ctypes
+import os
+import tempfile
+import threading
+
+import numpy as np
+
 from acspy import acsc
 
 
@@ -11,3 +18,160 @@ def test_open_comm_simulator():
 def test_open_comm_direct():
     hc = acsc.open_comm_direct()
     assert hc != -1
+
+
+def test_decode_motor_states():
+    states = [
+        acsc.MST_ENABLE | acsc.MST_MOVE | acsc.MST_ACC,
+        acsc.MST_ENABLE | acsc.MST_INPOS,
+        0,
+    ]
+    decoded = acsc.decodeMotorStates(states)
+    assert decoded["enabled"].tolist() == [True, True, False]
+    assert decoded["in position"].tolist() == [False, True, False]
+    assert decoded["moving"].tolist() == [True, False, False]
+    assert decoded["accelerating"].tolist() == [True, False, False]
+
+
+def test_decode_axis_states():
+    state = acsc.AxisState.DC | acsc.AxisState.MOVE | acsc.AxisState.POSLOCK
+    decoded = acsc.decodeAxisStates([int(state)])
+    assert [k for k, v in decoded.items() if v[0]] == [
+        "DC",
+        "moving",
+        "pos lock",
+    ]
+
+
+def test_set_backend():
+    class Stub(object):
+        def acsc_GetLastError(self):
+            return 17
+
+    previous = acsc.get_backend()
+    acsc.set_backend(Stub())
+    try:
+        assert acsc.getLastError() == 17
+    finally:
+        acsc.set_backend(previous)
+
+
+def test_add_pv_points(stub):
+    acsc.add_pv_points(1, 5, [1.0, 2.0], [0.5, 0.0])
+    assert stub.calls == [
+        ("acsc_AddPVPointM", [1, [5, -1], [1.0], [0.5], None]),
+        ("acsc_AddPVPointM", [1, [5, -1], [2.0], [0.0], None]),
+    ]
+    del stub.calls[:]
+    positions = np.arange(4.0).reshape(2, 2)
+    acsc.add_pv_points(1, (0, 1), positions, positions, times=[0.1, 0.2])
+    assert stub.calls[1] == (
+        "acsc_AddPVTPointM",
+        [1, [0, 1, -1], [2.0, 3.0], [2.0, 3.0], 0.2, None],
+    )
+    try:
+        acsc.add_pv_points(1, (0, 1), [1.0, 2.0], [1.0, 2.0])
+    except acsc.AcscError:
+        pass
+    else:
+        raise AssertionError("Mismatched point shape was accepted")
+
+
+def test_multipoint_path(stub):
+    points = np.array([[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]])
+    acsc.multipoint_path(1, None, (0, 1), points, rates=[1.0, 2.0, 3.0])
+    names = [name for name, args in stub.calls]
+    assert names == ["acsc_MultiPointM"] + ["acsc_ExtAddPointM"] * 3 + [
+        "acsc_EndSequenceM"
+    ]
+    assert stub.calls[0][1][1] == acsc.AMF_VELOCITY
+    assert stub.calls[3][1][1:4] == [[0, 1, -1], [4.0, 5.0], 3.0]
+    del stub.calls[:]
+    try:
+        acsc.multipoint_path(1, None, (0, 1), points, rates=[1.0])
+    except acsc.AcscError:
+        pass
+    else:
+        raise AssertionError("Mismatched rates were accepted")
+    assert stub.calls == []
+
+
+def test_write_array(stub):
+    table = np.linspace(0.0, 1.0, 20).reshape(2, 10)
+    acsc.writeReal(1, "TABLE", table, acsc.NONE, 0, 1, 0, 9)
+    name, args = stub.calls[0]
+    assert name == "acsc_WriteReal"
+    assert args[3:7] == [0, 1, 0, 9]
+    # C-contiguous float64 arrays are passed without copying
+    assert ctypes.addressof(args[7].contents) == table.ctypes.data
+    acsc.writeInteger(1, "MASK", [1, 2, 3], acsc.NONE, 4, 6)
+    pointer = stub.calls[1][1][7]
+    assert [pointer[i] for i in range(3)] == [1, 2, 3]
+    del stub.calls[:]
+    for values, indices in (
+        (table[0], (0, 9)),
+        ([1.5, 2.5, 3.5], (0, 2)),
+        (1.5, ()),
+    ):
+        try:
+            acsc.writeInteger(1, "MASK", values, acsc.NONE, *indices)
+        except acsc.AcscError:
+            pass
+        else:
+            raise AssertionError("Invalid values were accepted")
+    assert stub.calls == []
+
+
+def test_upload_buffer(stub):
+    lines = ["PTP 0, {}\n".format(i) for i in range(100)]
+    assert acsc.uploadBuffer(1, 2, iter(lines), chunk_size=200) == 100
+    names = [name for name, args in stub.calls]
+    assert names[0] == "acsc_LoadBuffer"
+    assert names[-1] == "acsc_CompileBuffer"
+    texts = [args[2]._obj.value.decode() for name, args in stub.calls[:-1]]
+    assert set(names[1:-1]) == {"acsc_AppendBuffer"}
+    assert max(len(t) for t in texts) <= 200
+    assert "".join(texts) == "".join(lines)
+    # Items split lines anywhere and may exceed the chunk size
+    chunks = list(acsc._program_chunks(["PTP 0,", " 1\nA", "B"], 100))
+    assert chunks == [("PTP 0, 1\nAB\n", 2)]
+    chunks = list(acsc._program_chunks(["".join(lines)], 200))
+    assert max(len(text) for text, n in chunks) <= 200
+    assert sum(n for text, n in chunks) == 100
+
+
+def test_upload_buffer_errors(failing_compile):
+    try:
+        acsc.uploadBuffer(1, 2, "A\nB\nC\n", first_line=10)
+    except acsc.ProgramError as e:
+        assert (e.buffno, e.line, e.code) == (2, 12, 3)
+    else:
+        raise AssertionError("Compile error was not raised")
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "program.prg")
+        with open(filename, "w") as f:
+            f.write("#BUF 0\nA\n#BUF 1\nB\nC\nD\n")
+        acsc.loadBuffersFromFile(1, filename)
+        try:
+            acsc.loadBuffersFromFile(1, filename, compile=True)
+        except acsc.ProgramError as e:
+            # Line 3 of buffer 0, which starts at line 2 of the file
+            assert (e.buffno, e.line) == (0, 4)
+        else:
+            raise AssertionError("Compile error was not raised")
+
+
+def test_handle_lock(stub):
+    lock = acsc.handle_lock(5)
+    assert acsc.handle_lock(5) is lock
+    with lock:
+        thread = threading.Thread(target=acsc.setVelocity, args=(5, 0, 1.0))
+        thread.start()
+        thread.join(0.05)
+        # Calls on the handle from other threads wait for the lock
+        assert thread.is_alive()
+        acsc.setVelocity(5, 1, 1.0)
+    thread.join()
+    assert len(stub.calls) == 2
+    acsc.closeComm(5)
+    assert 5 not in acsc._handle_locks
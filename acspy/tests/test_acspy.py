@@ -2,11 +2,13 @@
 
 from __future__ import division, print_function
 
+import shutil
+import tempfile
 import time
 
 import numpy as np
 
-from acspy import acsc, control, prgs
+from acspy import acsc, control, dc, prgs
 
 
 def test_write_real():
@@ -23,6 +25,40 @@ def test_write_real():
     print("PASS")
 
 
+def test_write_array():
+    """Test writing an array over an index range in one call."""
+    hc = acsc.openCommDirect()
+    vel = np.arange(1.0, 9.0)
+    acsc.writeReal(hc, "VEL", vel, acsc.NONE, 0, 7)
+    assert (acsc.readReal(hc, acsc.NONE, "VEL", 0, 7) == vel).all()
+    acsc.writeReal(hc, "VEL", 10.0, acsc.NONE, 0, 7)
+    assert (acsc.readReal(hc, acsc.NONE, "VEL", 0, 7) == 10.0).all()
+    acsc.closeComm(hc)
+
+
+def test_read_into_out():
+    """Test reading arrays into preallocated buffers."""
+    hc = acsc.openCommDirect()
+    acsc.setRPosition(hc, 1, 2.5)
+    buf = np.zeros((4, 8))
+    rpos = acsc.readReal(hc, acsc.NONE, "RPOS", 0, 7, out=buf[1])
+    assert rpos.base is buf
+    assert buf[1, 1] == 2.5
+    assert not buf[0].any()
+    mst = np.zeros(8, dtype=np.int32)
+    assert acsc.readInteger(hc, acsc.NONE, "MST", 0, 7, out=mst) is mst
+    # Index ranges are read as arrays, even of a single element
+    assert acsc.readInteger(hc, acsc.NONE, "MST", 1, 1).tolist() == [mst[1]]
+    assert acsc.readReal(hc, acsc.NONE, "RPOS", 1, 1).tolist() == [2.5]
+    try:
+        acsc.readReal(hc, acsc.NONE, "RPOS", 0, 7, out=buf[:, 0])
+    except acsc.AcscError:
+        pass
+    else:
+        raise AssertionError("Non-contiguous out was accepted")
+    acsc.closeComm(hc)
+
+
 def test_controller():
     """Test the Controller object."""
     print("Testing the Controller object")
@@ -35,7 +71,8 @@ def test_controller():
     x.acc = 100000
     x.dec = 100000
     x.ptp(1000)
-    time.sleep(1)
+    x.wait_done(timeout=5000)
+    assert not x.moving
     assert x.rpos == 1000
     assert x.acc == 100000
     assert x.dec == 100000
@@ -43,6 +80,154 @@ def test_controller():
     print("PASS")
 
 
+def test_snapshot():
+    """Test reading the state of all axes at once."""
+    controller = control.Controller("simulator", n_axes=4)
+    controller.connect()
+    controller.axes[2].enable()
+    acsc.setRPosition(controller.hc, 2, 12.5)
+    snap = controller.snapshot()
+    assert set(snap) == {"RPOS", "FPOS", "RVEL", "FVEL", "MST", "AST", "MERR"}
+    assert snap["RPOS"].shape == (4,)
+    assert snap["RPOS"][2] == 12.5
+    assert snap["MST"][2] & acsc.MST_ENABLE
+    rpos = snap["RPOS"]
+    assert controller.snapshot(out=snap)["RPOS"] is rpos
+    controller.axes[2].disable()
+    controller.disconnect()
+
+
+def test_batch():
+    """Test issuing several calls as one batch."""
+    controller = control.Controller("simulator")
+    controller.connect()
+    with controller.batch() as batch:
+        batch.setVelocity(0, 2000.0)
+        batch.setAcceleration(0, 30000.0)
+        batch.setDeceleration(0, 40000.0)
+        batch.enable(0)
+    x = controller.axes[0]
+    assert (x.vel, x.acc, x.dec) == (2000.0, 30000.0, 40000.0)
+    assert x.enabled
+    batch = controller.batch()
+    batch.setVelocity(0, 1000.0)
+    batch.enable(1000)
+    batch.halt(0, 1)  # TypeError
+    batch.setAcceleration(0, 20000.0)
+    try:
+        batch.run()
+    except control.BatchError as e:
+        assert [op.func for op in e.failed] == [acsc.enable, acsc.halt]
+        assert isinstance(e.failed[1].error, TypeError)
+    else:
+        raise AssertionError("Batch with an invalid axis did not fail")
+    assert (x.vel, x.acc) == (1000.0, 20000.0)
+    for name in ("setMflag", "uploadBuffer", "closeComm", "getRPosition"):
+        try:
+            getattr(batch, name)
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError("{} was batched".format(name))
+    x.disable()
+    controller.disconnect()
+
+
+def test_wait_all():
+    """Test waiting for the motion of several axes to end."""
+    controller = control.Controller("simulator", n_axes=2)
+    controller.connect()
+    for axis, target in zip(controller.axes, (100.0, 200.0)):
+        axis.enable()
+        axis.vel = 1000.0
+        axis.ptp(target)
+    controller.wait_all(timeout=5000)
+    assert [a.rpos for a in controller.axes] == [100.0, 200.0]
+    controller.axes[0].ptp(0.0)
+    try:
+        controller.wait_all(timeout=1)
+    except acsc.AcscError:
+        pass
+    else:
+        raise AssertionError("Wait did not time out")
+    controller.wait_all()
+    controller.disable_all()
+    controller.disconnect()
+
+
+def test_state_cache():
+    """Test caching of motor states behind the Axis properties."""
+    # By default every property reads the controller
+    controller = control.Controller("simulator", n_axes=2)
+    controller.connect()
+    x = controller.axes[0]
+    x.enable()
+    assert x.enabled
+    acsc.disable(controller.hc, 0)
+    assert not x.enabled
+    assert controller._state_words == {}
+    controller.disconnect()
+    controller = control.Controller("simulator", n_axes=2, state_ttl=60.0)
+    controller.connect()
+    x = controller.axes[0]
+    x.enable()
+    assert x.enabled and x.in_position and not x.moving
+    # Commands bypassing the Controller are not seen until a refresh
+    acsc.disable(controller.hc, 0)
+    assert x.enabled
+    x.refresh()
+    assert not x.enabled
+    # Commands through the Controller invalidate the cache
+    x.enable()
+    assert x.enabled
+    controller.disable_all()
+    assert not x.enabled
+    controller.disconnect()
+    # Only the axes used are read, so a controller may have fewer axes
+    controller = control.Controller("simulator", n_axes=1000)
+    controller.connect()
+    assert not controller.axes[0].moving
+    controller.disconnect()
+
+
+def test_var():
+    """Test reading and writing through variable handles."""
+    controller = control.Controller("simulator", n_axes=8)
+    controller.connect()
+    vel = controller.var("VEL", shape=8)
+    vel.write(np.arange(1.0, 9.0))
+    assert (vel.read() == np.arange(1.0, 9.0)).all()
+    vel[2:4] = [30.0, 40.0]
+    assert vel[3] == 40.0
+    assert (vel[1:4] == [2.0, 30.0, 40.0]).all()
+    out = vel.read_into(np.empty(8))
+    assert out[2] == 30.0
+    assert controller.var("VEL", shape=np.int64(8)).shape == (8,)
+    controller.disconnect()
+
+
+def test_mflags():
+    """Test setting MFLAGS of several axes in one transaction."""
+    controller = control.Controller("simulator", n_axes=4)
+    controller.connect()
+    hc = controller.hc
+    acsc.clearMflag(hc, 1, "OPEN")
+    acsc.setMflag(hc, 3, "USER1")
+    with controller.mflags() as mflags:
+        mflags.set(1, "OPEN", "USER2")
+        mflags.clear(3, "USER1")
+        assert mflags.get(1, "USER2")
+        assert mflags.changed() == [1, 3]
+    assert acsc.readMflag(hc, 1, "OPEN")
+    assert acsc.readMflag(hc, 1, "USER2")
+    assert not acsc.readMflag(hc, 3, "USER1")
+    assert not acsc.readMflag(hc, 2, "OPEN")
+    with controller.mflags([1]) as mflags:
+        mflags.clear(1, "OPEN", "USER2")
+    assert not acsc.readMflag(hc, 1, "OPEN")
+    controller.disconnect()
+
+
 def test_upload_prg():
     """Test that a program can be uploaded and run in the simulator."""
     hc = acsc.openCommDirect()
@@ -145,8 +330,112 @@ def test_data_collection():
     print(data)
 
 
+def test_dc_reader():
+    """Test incremental reading of a cyclic data collection array."""
+    hc = acsc.openCommDirect()
+    dblen = 50
+    prg = prgs.ACSPLplusPrg()
+    prg.declare_2darray("GLOBAL", "real", "dcdata", 2, dblen)
+    prg.add_dc("dcdata", dblen, 1000, "TIME, FPOS(0)", "/c")
+    prg.addline("WAIT 200")
+    prg.addline("STOPDC")
+    prg.addstopline()
+    acsc.loadBuffer(hc, 18, prg, 1024)
+    acsc.runBuffer(hc, 18)
+    reader = dc.DCReader(hc, "dcdata", 2, dblen, names=["time", "fpos"])
+    for n in range(20):
+        time.sleep(0.015)
+        reader.poll()
+    acsc.waitProgramEnd(hc, 18, 2000)
+    reader.poll()
+    acsc.closeComm(hc)
+    assert len(reader) == reader.count - reader.lost
+    assert len(reader) > dblen
+    # Samples are contiguous in time, without duplicates
+    dt = np.diff(reader["time"])
+    assert (dt > 0).all()
+
+
+def test_memmap_store():
+    """Test streaming samples to growable memory-mapped files."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = directory + "/capture"
+        with dc.MemmapStore(
+            path, 2, names=["time", "fpos"], capacity=4, flush_every=8
+        ) as store:
+            for n in range(5):
+                t = np.arange(3 * n, 3 * n + 3, dtype=float)
+                store.append(np.array([t, 2 * t]))
+            # Readable up to the last flush while still writing
+            assert len(dc.Capture(path)) == 9
+            assert (store.column(0) == np.arange(15)).all()
+        capture = dc.Capture(path)
+        assert capture.complete and len(capture) == 15
+        assert isinstance(capture["fpos"], np.memmap)
+        assert (capture["fpos"] == 2 * np.arange(15)).all()
+        assert (capture.index["start"] == [0, 3, 6, 9, 12]).all()
+        assert np.load(path + "/time.npy").shape == (15,)
+        # Still readable after closing
+        assert (store.column(1) == 2 * np.arange(15)).all()
+        assert store.data.shape == (2, 15)
+        with dc.MemmapStore(directory + "/empty", 1) as store:
+            pass
+        assert store.data.shape == (1, 0)
+        del capture, store
+    finally:
+        shutil.rmtree(directory)
+
+
 def test_acsplplusprg():
     prg = prgs.ACSPLplusPrg()
     prg.addline("test")
     prg.addstopline()
     print(prg)
+
+
+def test_acsplplusprg_bulk():
+    """Test generating blocks of lines from arrays."""
+    prg = prgs.ACSPLplusPrg()
+    prg.addptps((0, 1), np.array([[1.0, 2.0], [3.0, 4.0]]), switch="/e")
+    prg.add_array_init("TABLE", np.array([5, 6]))
+    assert str(prg) == (
+        "PTP/e (0,1), 1.0, 2.0\n"
+        "PTP/e (0,1), 3.0, 4.0\n"
+        "TABLE(0) = 5\n"
+        "TABLE(1) = 6\n"
+    )
+    chunks = list(prgs.iter_ptp(np.int64(0), np.arange(5.0), chunk_lines=2))
+    assert len(chunks) == 3
+    assert chunks[-1] == "PTP 0, 4.0\n"
+    prg += "A\n"
+    prg += "B\n"
+    assert prg.chunks[-2:] == ["A\n", "B\n"]
+    prg.addstopline()
+    assert prg.txt.endswith("TABLE(1) = 6\nA\nB\nSTOP")
+
+
+def test_controller_pool():
+    """Test running operations on several controllers at once."""
+    pool = control.ControllerPool(
+        [control.Controller("simulator", n_axes=2) for n in range(2)]
+    )
+    with pool:
+        assert all(r.ok for r in pool.connect().values())
+        pool.broadcast("setVelocity", 0, 12.5)
+        results = pool.map(lambda c: acsc.getVelocity(c.hc, 0))
+        assert [r.get() for r in results.values()] == [12.5, 12.5]
+        snapshots = pool.snapshot()
+        assert snapshots[1].get()["RPOS"].shape == (2,)
+        results = pool.broadcast("setVelocity", 99, 1.0)
+        assert not results[0].ok
+        assert isinstance(results[0].error, acsc.AcscError)
+        # Buffer numbers are not taken for the index names of controllers
+        programs = {0: "ENABLE 0\n", 1: "ENABLE 1\n"}
+        results = pool.deploy(programs)
+        assert [r.get().loaded for r in results.values()] == [[0, 1]] * 2
+        results = pool.deploy(per_controller={1: {2: "ENABLE 0\n"}})
+        assert isinstance(results[0].error, ValueError)
+        assert results[1].get().loaded == [2]
+        results = pool.deploy(programs, per_controller=lambda n: {n: ""})
+        assert [r.get().loaded for r in results.values()] == [[0], [1]]
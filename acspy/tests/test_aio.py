@@ -0,0 +1,63 @@
+"""Tests for ``acspy.aio``."""
+
+import asyncio
+import threading
+
+from acspy import acsc, aio
+
+
+def test_concurrent_calls():
+    hc = acsc.openCommDirect()
+
+    async def main():
+        await asyncio.gather(
+            aio.setVelocity(hc, 0, 1234.0), aio.setVelocity(hc, 1, 4321.0)
+        )
+        vels = await asyncio.gather(
+            aio.getVelocity(hc, 0), aio.getVelocity(hc, 1)
+        )
+        assert vels == [1234.0, 4321.0]
+        await aio.writeReal(hc, "SLLIMIT1", 2.5)
+        assert await aio.readReal(hc, acsc.NONE, "SLLIMIT1") == 2.5
+        rpos = await aio.readReal(hc, acsc.NONE, "RPOS", 0, 3)
+        assert rpos.shape == (4,)
+        await aio.closeComm(hc)
+
+    asyncio.run(main())
+
+
+class GatedStub(object):
+    """Completes asynchronous calls only once ``gate`` is set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def acsc_WaitForAsyncCall(self, *args):
+        self.gate.wait()
+        return 1
+
+    def __getattr__(self, name):
+        return lambda *args: 1
+
+
+def test_closed_loop():
+    """A completion for a closed event loop does not stop the completer."""
+    previous = acsc.get_backend()
+    stub = GatedStub()
+    acsc.set_backend(stub)
+    try:
+        try:
+            asyncio.run(asyncio.wait_for(aio.setVelocity(7, 0, 1.0), 0.01))
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("Gated call completed")
+        stub.gate.set()
+
+        async def main():
+            await asyncio.wait_for(aio.setVelocity(7, 0, 2.0), 5.0)
+            await aio.closeComm(7)
+
+        asyncio.run(main())
+    finally:
+        acsc.set_backend(previous)
@@ -0,0 +1,65 @@
+"""Tests for ``acspy.deploy``."""
+
+import os
+import tempfile
+
+from acspy import acsc, deploy
+
+PRG = """#HEADER
+ignored
+#BUF 0
+ENABLE 0
+STOP
+#BUF 1
+PTP 0, 10
+STOP
+"""
+
+
+def test_normalize():
+    assert deploy.buffer_hash("A\r\n\r\nB  \n") == deploy.buffer_hash("A\nB")
+
+
+def test_deploy(stub):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "program.prg")
+        manifest = os.path.join(tmp, "manifest.json")
+        with open(filename, "w") as f:
+            f.write(PRG)
+        assert acsc.readBuffersFile(filename) == {
+            0: "ENABLE 0\nSTOP\n",
+            1: "PTP 0, 10\nSTOP\n",
+        }
+        report = deploy.deploy(1, filename, manifest=manifest)
+        assert report.loaded == [0, 1]
+        names = [name for name, args in stub.calls]
+        assert names == ["acsc_LoadBuffer", "acsc_CompileBuffer"] * 2
+        del stub.calls[:]
+        report = deploy.deploy(1, filename, manifest=manifest)
+        assert report.skipped == [0, 1]
+        assert stub.calls == []
+        with open(filename, "w") as f:
+            f.write(PRG.replace("10", "20"))
+        report = deploy.deploy(1, filename, manifest=manifest, compile=False)
+        assert (report.loaded, report.skipped) == ([1], [0])
+        assert [name for name, args in stub.calls] == ["acsc_LoadBuffer"]
+        # Buffers loaded without compiling are not skipped when compiling
+        del stub.calls[:]
+        report = deploy.deploy(1, filename, manifest=manifest)
+        assert (report.loaded, report.skipped) == ([1], [0])
+        names = [name for name, args in stub.calls]
+        assert names == ["acsc_LoadBuffer", "acsc_CompileBuffer"]
+
+
+def test_deploy_errors(failing_compile):
+    """Compile errors are reported at their line in the file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "program.prg")
+        with open(filename, "w") as f:
+            f.write(PRG)
+        try:
+            deploy.deploy(1, filename, force=True)
+        except acsc.ProgramError as e:
+            assert (e.buffno, e.line) == (0, 6)
+        else:
+            raise AssertionError("Compile error was not raised")
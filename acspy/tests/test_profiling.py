@@ -0,0 +1,47 @@
+"""Tests for ``acspy.profiling``."""
+
+from acspy import acsc, profiling
+
+
+def test_profile(stub):
+    with profiling.profile() as profiler:
+        for n in range(3):
+            acsc.setVelocity(1, 0, 10.0)
+        acsc.getRPosition(2, 0)
+    acsc.setVelocity(1, 0, 10.0)  # Not recorded
+    assert acsc._profiler is None
+    stats = profiler.snapshot()
+    assert set(stats) == {(1, "acsc_SetVelocity"), (2, "acsc_GetRPosition")}
+    assert stats[(1, "acsc_SetVelocity")]["count"] == 3
+    assert stats[(2, "acsc_GetRPosition")]["count"] == 1
+    summary = stats[(1, "acsc_SetVelocity")]
+    assert 0 < summary["p50_us"] <= summary["p99_us"] <= summary["max_us"]
+    metric = (
+        "acspy_call_duration_seconds_count"
+        '{hcomm="1",function="acsc_SetVelocity"} 3'
+    )
+    assert metric in profiler.prometheus().splitlines()
+    assert "acsc_GetRPosition" in profiler.report()
+
+
+def test_profile_errors(failing_compile):
+    with profiling.profile() as profiler:
+        try:
+            acsc.compileBuffer(1, 0)
+        except acsc.AcscError:
+            pass
+    stats = profiler.snapshot()
+    assert stats[(1, "acsc_CompileBuffer")]["errors"] == 1
+
+
+def test_profile_backend():
+    """Calls into the bound library are keyed by their ACS function names."""
+    hc = acsc.openCommDirect()
+    with profiling.profile() as profiler:
+        acsc.getRPosition(hc, 0)
+        acsc.setVelocity(hc, 0, 100.0)
+    acsc.closeComm(hc)
+    assert set(profiler.snapshot()) == {
+        (hc, "acsc_GetRPosition"),
+        (hc, "acsc_SetVelocity"),
+    }
@@ -0,0 +1,73 @@
+"""Tests for ``acspy.replay``."""
+
+import os
+import tempfile
+
+import numpy as np
+
+from acspy import acsc, replay
+
+
+class FillingStub(object):
+    """Writes a distinct value into the outputs of each call."""
+
+    def __init__(self):
+        self.n = 0
+
+    def __getattr__(self, name):
+        def func(*args):
+            self.n += 1
+            if name == "acsc_GetRPosition":
+                args[2]._obj.value = 1.5 * self.n
+            elif name == "acsc_ReadInteger":
+                for i in range(len(args[7])):
+                    args[7][i] = i + self.n
+            return 1
+
+        return func
+
+
+def session(hcomm):
+    acsc.setVelocity(hcomm, 0, 100.0)
+    acsc.writeReal(hcomm, "VEL", [1.0, 2.0], acsc.NONE, 0, 1)
+    return (
+        acsc.getRPosition(hcomm, 0),
+        acsc.readInteger(hcomm, acsc.NONE, "MST", 0, 3).tolist(),
+    )
+
+
+def test_record_replay():
+    previous = acsc.get_backend()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "session.acsrec")
+            stub = FillingStub()
+            acsc.set_backend(stub)
+            with replay.record(filename, stub):
+                recorded = session(1)
+            assert recorded == (4.5, [4, 5, 6, 7])
+            # Closing binds the previous backend again
+            assert acsc.get_backend() is stub
+            calls = replay.read_recording(filename)
+            assert [c.name for c in calls] == [
+                "acsc_SetVelocity",
+                "acsc_WriteReal",
+                "acsc_GetRPosition",
+                "acsc_ReadInteger",
+            ]
+            assert calls[1].args[7] == (
+                replay.ARRAY,
+                np.array([1.0, 2.0]).tobytes(),
+            )
+            library = replay.replay(filename)
+            assert session(1) == recorded
+            assert library.position == 4
+            replay.replay(filename)
+            try:
+                acsc.getRPosition(1, 0)
+            except replay.ReplayError:
+                pass
+            else:
+                raise AssertionError("Mismatched call was replayed")
+    finally:
+        acsc.set_backend(previous)
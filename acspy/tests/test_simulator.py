@@ -0,0 +1,206 @@
+"""Tests for ``acspy.simulator``."""
+
+import numpy as np
+
+from acspy import acsc, simulator
+
+
+def test_ptp(hc, clock):
+    acsc.enable(hc, 0)
+    acsc.setVelocity(hc, 0, 100.0)
+    acsc.setAcceleration(hc, 0, 1000.0)
+    acsc.setDeceleration(hc, 0, 1000.0)
+    acsc.setJerk(hc, 0, 0.0)
+    acsc.toPoint(hc, None, 0, 50.0)
+    clock[0] = 0.05
+    assert np.isclose(acsc.getRVelocity(hc, 0), 50.0)
+    assert acsc.getMotorState(hc, 0)["accelerating"]
+    clock[0] = 0.3
+    assert np.isclose(acsc.getRPosition(hc, 0), 25.0)
+    clock[0] = 0.7
+    assert acsc.getRPosition(hc, 0) == 50.0
+    assert acsc.getMotorState(hc, 0)["in position"]
+    acsc.jog(hc, None, 0, -1)
+    clock[0] = 1.0
+    assert acsc.getRVelocity(hc, 0) == -100.0
+    try:
+        acsc.toPoint(hc, None, 1, 1.0)
+    except acsc.AcscError as e:
+        assert str(e).startswith(str(simulator.MOTOR_DISABLED))
+    else:
+        raise AssertionError("Motion of a disabled motor did not fail")
+
+
+def test_program(hc, clock):
+    prg = (
+        "GLOBAL INT n, go\n"
+        "LOCAL INT i\n"
+        "WHILE i < 4\n"
+        "  IF i = 2\n"
+        "    n = n + 10\n"
+        "  ELSE\n"
+        "    n = n + 1\n"
+        "  END\n"
+        "  i = i + 1\n"
+        "END\n"
+        "TILL go.1\n"
+        "OUT(0).3 = 1\n"
+        "STOP\n"
+    )
+    acsc.uploadBuffer(hc, 2, prg)
+    acsc.runBuffer(hc, 2)
+    clock[0] = 1.0
+    assert acsc.readInteger(hc, acsc.NONE, "n") == 13
+    assert acsc.getProgramState(hc, 2) & acsc.PST_RUN
+    acsc.writeInteger(hc, "go", 2)
+    assert acsc.getOutput(hc, 0, 3) == 1
+    assert not acsc.getProgramState(hc, 2) & acsc.PST_RUN
+    try:
+        acsc.uploadBuffer(hc, 3, "ENABLE 0\nPTP 0,\n")
+    except acsc.ProgramError as e:
+        assert (e.line, e.code) == (2, simulator.SYNTAX_ERROR)
+    else:
+        raise AssertionError("Syntax error was not raised")
+
+
+def test_data_collection(hc, clock):
+    acsc.declareVariable(hc, acsc.REAL_TYPE, "samples(2)(10)")
+    acsc.enable(hc, 1)
+    acsc.setVelocity(hc, 1, 1000.0)
+    acsc.jog(hc, acsc.AMF_VELOCITY, 1, 1000.0)
+    clock[0] = 1.0
+    acsc.command(hc, "DC/c samples, 10, 2, TIME, RPOS(1)")
+    clock[0] = 1.1
+    assert acsc.readInteger(hc, acsc.NONE, "S_DCN") == 51
+    samples = acsc.readReal(hc, acsc.NONE, "samples", 0, 1, 0, 9)
+    order = np.argsort(samples[0])
+    assert np.allclose(np.diff(samples[0, order]), 2.0)
+    assert np.isclose(samples[0].max(), 1100.0)
+    # Constant velocity of 1 unit per ms
+    assert np.allclose(np.diff(samples[1, order]), 2.0)
+
+
+def _profile(distance, vel, acc, dec, jerk):
+    phases = simulator._ptp_phases(distance, vel, acc, dec, jerk)
+    segments, t, p, v = simulator._segments(0.0, 0.0, 0.0, phases)
+    return phases, t, p, v
+
+
+def test_ptp_phases():
+    # Too short to reach VEL: triangular profile peaking at sqrt(d * acc)
+    phases, t, p, v = _profile(1.0, 100.0, 100.0, 100.0, 0.0)
+    assert [phase[0] for phase in phases] == [0.1, 0.0, 0.1]
+    assert np.isclose(t, 0.2) and np.isclose(p, 1.0) and np.isclose(v, 0)
+    # Trapezoidal profile with different ACC and DEC
+    phases, t, p, v = _profile(-10.0, 10.0, 100.0, 50.0, 0.0)
+    assert np.allclose([phase[0] for phase in phases], [0.1, 0.85, 0.2])
+    assert np.isclose(p, -10.0) and np.isclose(v, 0)
+    # Jerk limited profiles are symmetric with ACC = DEC
+    for distance in (10.0, 0.05):
+        phases, t, p, v = _profile(distance, 10.0, 100.0, 100.0, 1000.0)
+        ramp = [phase[0] for phase in phases if phase[2]]
+        assert np.allclose(ramp, ramp[::-1])
+        assert np.isclose(p, distance) and np.isclose(v, 0, atol=1e-9)
+    assert simulator._ptp_phases(0.0, 1.0, 1.0, 1.0, 0.0) == []
+    try:
+        simulator._ptp_phases(1.0, 0.0, 1.0, 1.0, 0.0)
+    except simulator.SimulatorError as e:
+        assert e.code == simulator.INVALID_PARAMETER
+    else:
+        raise AssertionError("Zero velocity was accepted")
+
+
+def test_halt_and_go(hc, clock):
+    acsc.enable(hc, 0)
+    acsc.setVelocity(hc, 0, 100.0)
+    acsc.setAcceleration(hc, 0, 1000.0)
+    acsc.setDeceleration(hc, 0, 1000.0)
+    acsc.setJerk(hc, 0, 0.0)
+    acsc.jog(hc, None, 0, 1)
+    clock[0] = 1.0
+    position = acsc.getRPosition(hc, 0)
+    acsc.halt(hc, 0)
+    clock[0] = 1.05
+    assert np.isclose(acsc.getRVelocity(hc, 0), 50.0)
+    clock[0] = 1.2
+    assert acsc.getRVelocity(hc, 0) == 0
+    assert np.isclose(acsc.getRPosition(hc, 0), position + 5.0)
+    # Motion waiting for GO does not start until it
+    acsc.toPoint(hc, acsc.AMF_WAIT, 0, 0.0)
+    clock[0] = 2.0
+    assert np.isclose(acsc.getRPosition(hc, 0), position + 5.0)
+    acsc.go(hc, 0)
+    clock[0] = 2.1
+    assert acsc.getMotorState(hc, 0)["moving"]
+    clock[0] = 4.0
+    assert acsc.getRPosition(hc, 0) == 0.0
+
+
+def test_control_flow(hc, clock):
+    prg = (
+        "GLOBAL INT a, b, c\n"
+        "LOOP 3\n"
+        "  a = a + 1\n"
+        "END\n"
+        "CALL sub\n"
+        "GOTO done\n"
+        "c = 99\n"
+        "sub:\n"
+        "  b = b + 5\n"
+        "  RET\n"
+        "done:\n"
+        "IF a = 1\n"
+        "  c = 1\n"
+        "ELSEIF a = 3\n"
+        "  c = 3\n"
+        "ELSE\n"
+        "  c = 4\n"
+        "END\n"
+        "STOP\n"
+        "c = 100\n"
+    )
+    acsc.uploadBuffer(hc, 1, prg)
+    acsc.runBuffer(hc, 1)
+    clock[0] = 1.0
+    values = [acsc.readInteger(hc, acsc.NONE, name) for name in "abc"]
+    assert values == [3, 5, 3]
+    state = acsc.getProgramState(hc, 1)
+    assert state & acsc.PST_COMPILED and not state & acsc.PST_RUN
+    # Running from a label
+    acsc.runBuffer(hc, 1, "sub")
+    clock[0] = 2.0
+    assert acsc.readInteger(hc, acsc.NONE, "b") == 10
+    assert acsc.readInteger(hc, acsc.NONE, "c") == 3
+
+
+def test_program_errors(hc, clock):
+    for text, line in (
+        ("ENABLE 0\nFOO 1\n", 2),  # Unsupported statement
+        ("INT a\na = (1\n", 2),
+        ("IF 1\nELSE\nELSE\nEND\n", 3),
+        ("END\n", 1),
+        ("WHILE 1\n  WAIT 1\n", 2),  # Missing END
+        ("ENABLE 0\nGOTO nowhere\n", 2),
+    ):
+        try:
+            acsc.uploadBuffer(hc, 0, text)
+        except acsc.ProgramError as e:
+            assert (e.line, e.code) == (line, simulator.SYNTAX_ERROR), text
+        else:
+            raise AssertionError("{!r} compiled".format(text))
+    # Runtime errors stop the program and report its line
+    acsc.uploadBuffer(hc, 0, "GLOBAL REAL x\nx = 1\nx = x / 0\nx = 2\n")
+    acsc.runBuffer(hc, 0)
+    clock[0] = 1.0
+    assert not acsc.getProgramState(hc, 0) & acsc.PST_RUN
+    perr = acsc.readInteger(hc, acsc.NONE, "PERR", 0, 0)
+    assert perr.tolist() == [simulator.RUNTIME_ERROR]
+    assert acsc.readInteger(hc, acsc.NONE, "PERL", 0, 0).tolist() == [3]
+    assert acsc.readReal(hc, acsc.NONE, "x") == 1.0
+    # Library functions the simulator lacks fail with NOT_SUPPORTED
+    try:
+        acsc.spline(hc, 0, 0, 1.0)
+    except acsc.AcscError as e:
+        assert str(e).startswith(str(simulator.NOT_SUPPORTED))
+    else:
+        raise AssertionError("Unsupported function did not fail")
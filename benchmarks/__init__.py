@@ -0,0 +1 @@
+"""Benchmarks for the host-side code of ACSpy."""
@@ -0,0 +1,142 @@
+"""Per-call Python overhead of the ``acsc`` wrappers.
+
+Compares the current wrappers, which use the lean ``call_acsc``, with the
+previous calling convention: every scalar wrapped in a ctypes type,
+``ctypes.pointer`` outputs, state words decoded from hex strings and a
+``*args, **kwargs`` error wrapper.
+
+Timings of a few hundred ns vary by tens of percent between runs on a loaded
+machine, so each version is timed ``--repeat`` times, alternating, and the
+minimum and median are reported, with the median ratio of after to before
+over pairs of adjacent runs. The ratio is the most reproducible figure, as
+load affects both runs of a pair alike.
+
+Run with ``python -m benchmarks.bench_call_overhead``.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import ctypes
+import statistics
+import timeit
+from ctypes import byref
+
+from acspy import acsc
+from benchmarks.stub import StubLibrary
+
+HCOMM = 1
+
+
+def _legacy_call_acsc(func, *args, **kwargs):
+    rv = func(*args, **kwargs)
+    if rv == 0:
+        raise acsc.AcscError(rv)
+    return rv
+
+
+def legacy_calls():
+    """Returns the previous implementations of the benchmarked wrappers."""
+    lib = StubLibrary()
+    double = ctypes.c_double
+
+    def setVelocity(hcomm, axis, vel, wait=None):
+        _legacy_call_acsc(lib.acsc_SetVelocity, hcomm, axis, double(vel), wait)
+
+    def getRPosition(hcomm, axis, wait=None):
+        pos = double()
+        _legacy_call_acsc(
+            lib.acsc_GetRPosition, hcomm, axis, ctypes.pointer(pos), wait
+        )
+        return pos.value
+
+    def getMotorState(hcomm, axis, wait=None):
+        state = ctypes.c_int()
+        _legacy_call_acsc(
+            lib.acsc_GetMotorState, hcomm, axis, byref(state), wait
+        )
+        state = state.value
+        return {
+            "enabled": hex(state)[-1] == "1",
+            "in position": hex(state)[-2] == "1",
+            "moving": hex(state)[-2] == "2",
+            "accelerating": hex(state)[-2] == "4",
+        }
+
+    return {
+        "setVelocity": lambda: setVelocity(HCOMM, 0, 100.0),
+        "getRPosition": lambda: getRPosition(HCOMM, 0),
+        "getMotorState": lambda: getMotorState(HCOMM, 0),
+    }
+
+
+def current_calls():
+    """Returns the current wrappers, bound to a stub library."""
+    acsc.set_backend(StubLibrary())
+    return {
+        "setVelocity": lambda: acsc.setVelocity(HCOMM, 0, 100.0),
+        "getRPosition": lambda: acsc.getRPosition(HCOMM, 0),
+        "getMotorState": lambda: acsc.getMotorState(HCOMM, 0),
+    }
+
+
+def time_call(func, number=100000):
+    """Returns the time per call in ns of one run of ``number`` calls."""
+    return timeit.timeit(func, number=number) / number * 1e9
+
+
+def run(number=20000, repeat=25):
+    """Returns ``{name: (before_ns, after_ns)}``, the lists of the times of
+    ``repeat`` runs of each version.
+
+    Runs of the two versions alternate, so that drift in machine load affects
+    both alike.
+    """
+    before = legacy_calls()
+    after = current_calls()
+    try:
+        results = {}
+        for name in before:
+            times = [
+                (
+                    time_call(before[name], number),
+                    time_call(after[name], number),
+                )
+                for n in range(repeat)
+            ]
+            results[name] = tuple(list(t) for t in zip(*times))
+        return results
+    finally:
+        acsc.set_backend(None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=25)
+    args = parser.parse_args(argv)
+    print(
+        "{:<16}{:>12}{:>12}{:>12}{:>12}{:>8}".format(
+            "call (ns)",
+            "before min",
+            "after min",
+            "before med",
+            "after med",
+            "ratio",
+        )
+    )
+    for name, (before, after) in run(args.number, args.repeat).items():
+        print(
+            "{:<16}{:>12.0f}{:>12.0f}{:>12.0f}{:>12.0f}{:>8.2f}".format(
+                name,
+                min(before),
+                min(after),
+                statistics.median(before),
+                statistics.median(after),
+                statistics.median(a / b for b, a in zip(before, after)),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Throughput of ``acsc`` calls from several threads.
+
+Each thread calls ``acsc.getRPosition`` against a stand-in library whose
+calls sleep with the GIL released, like a library call waiting for a
+controller reply. Threads on separate handles, or sharing one handle without
+a lock, scale with the thread count; sharing a handle with a
+``acsc.handle_lock`` serializes them.
+
+Run with ``python -m benchmarks.bench_threads``.
+"""
+
+from __future__ import division, print_function
+
+import threading
+import time
+
+from acspy import acsc
+from benchmarks.stub import LatencyStub
+
+THREADS = (1, 2, 4, 8)
+
+
+def throughput(n_threads, shared, locked, duration=0.5):
+    """Returns the calls per second made by ``n_threads`` threads."""
+    counts = [0] * n_threads
+    stop = threading.Event()
+
+    def worker(i):
+        hcomm = 1 if shared else i + 1
+        n = 0
+        while not stop.is_set():
+            acsc.getRPosition(hcomm, 0)
+            n += 1
+        counts[i] = n
+
+    if locked:
+        acsc.handle_lock(1)
+    threads = [
+        threading.Thread(target=worker, args=(i,)) for i in range(n_threads)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    acsc._handle_locks.clear()
+    return sum(counts) / elapsed
+
+
+def run(latency=200e-6, duration=0.5):
+    """Returns ``{mode: [calls_per_s for each of THREADS]}``."""
+    modes = {
+        "own handles": (False, False),
+        "shared handle": (True, False),
+        "shared, locked": (True, True),
+    }
+    acsc.set_backend(LatencyStub(latency))
+    try:
+        return {
+            mode: [throughput(n, shared, locked, duration) for n in THREADS]
+            for mode, (shared, locked) in modes.items()
+        }
+    finally:
+        acsc.set_backend(None)
+
+
+if __name__ == "__main__":
+    print(
+        "{:<16}".format("calls/s")
+        + "".join("{:>10}".format("{} thr".format(n)) for n in THREADS)
+    )
+    for mode, rates in run().items():
+        print(
+            "{:<16}".format(mode)
+            + "".join("{:>10.0f}".format(r) for r in rates)
+        )
@@ -0,0 +1,117 @@
+"""Stand-in for the ACS C library used by the benchmarks."""
+
+from __future__ import division, print_function
+
+import ctypes
+import sys
+import time
+
+
+def _libc():
+    if sys.platform == "win32":
+        return ctypes.cdll.msvcrt
+    return ctypes.CDLL(None)
+
+
+class StubLibrary(object):
+    """Provides every ``acsc_*`` function as a distinct ctypes foreign function
+    that returns immediately.
+
+    All functions point to the C library's ``abs``, which returns the (nonzero)
+    communication handle passed as first argument, so calls succeed while
+    still going through ctypes argument conversion. Outputs are not written.
+    """
+
+    def __init__(self):
+        self._address = ctypes.cast(_libc().abs, ctypes.c_void_p).value
+
+    def __getattr__(self, name):
+        if not name.startswith("acsc_"):
+            raise AttributeError(name)
+        func = ctypes.CFUNCTYPE(ctypes.c_int)(self._address)
+        func.__name__ = name
+        setattr(self, name, func)
+        return func
+
+
+def _address(out):
+    """Returns the address an output argument points to: ``byref``, a ctypes
+    array or a pointer."""
+    if hasattr(out, "_obj"):
+        return ctypes.addressof(out._obj)
+    return ctypes.cast(out, ctypes.c_void_p).value
+
+
+def _count(from1, to1, from2, to2):
+    """Returns the number of elements of an index range, in which ``-1``
+    (``NONE``) leaves an index out."""
+    n = 1
+    for first, last in ((from1, to1), (from2, to2)):
+        if first >= 0:
+            n *= last - first + 1
+    return n
+
+
+class LatencyStub(object):
+    """Provides every ``acsc_*`` function as a Python function that sleeps
+    for ``latency`` seconds, releasing the GIL like a library call waiting
+    for a controller reply, and then succeeds. With no latency, functions
+    return at once.
+
+    ``acsc_ReadReal`` and ``acsc_ReadInteger`` fill their output buffers,
+    so reads include the copy into the caller's memory.
+    """
+
+    def __init__(self, latency=200e-6):
+        self.latency = latency
+        self._source = ctypes.create_string_buffer(0)
+
+    def _fill(self, args, itemsize):
+        nbytes = _count(*args[3:7]) * itemsize
+        if len(self._source) < nbytes:
+            self._source = ctypes.create_string_buffer(nbytes)
+        ctypes.memmove(_address(args[7]), self._source, nbytes)
+
+    def acsc_ReadReal(self, *args):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self._fill(args, ctypes.sizeof(ctypes.c_double))
+        return 1
+
+    def acsc_ReadInteger(self, *args):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self._fill(args, ctypes.sizeof(ctypes.c_int))
+        return 1
+
+    def __getattr__(self, name):
+        if not name.startswith("acsc_"):
+            raise AttributeError(name)
+        latency = self.latency
+
+        def func(*args):
+            if latency > 0:
+                time.sleep(latency)
+            return 1
+
+        func.__name__ = name
+        setattr(self, name, func)
+        return func
+
+
+class CounterStub(LatencyStub):
+    """``LatencyStub`` whose ``acsc_ReadInteger`` returns a counter that
+    grows by ``step`` on each call, like the sample counter of a running
+    data collection."""
+
+    def __init__(self, latency=0.0, step=100):
+        super(CounterStub, self).__init__(latency)
+        self.step = step
+        self.count = 0
+
+    def acsc_ReadInteger(self, *args):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self.count += self.step
+        args[7]._obj.value = self.count
+        return 1
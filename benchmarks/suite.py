@@ -0,0 +1,277 @@
+"""Benchmark suite of the host-side hot paths, with regression thresholds.
+
+The benchmarks run against stand-in libraries, so they measure the cost of
+the Python code, plus ``--latency`` seconds per library call if given. Reads
+go to a stand-in that fills the output buffers, so they include the copy.
+Groups that make no library calls are skipped when a latency is given::
+
+    python -m benchmarks.suite -o baseline.json
+    python -m benchmarks.suite -o results.json --baseline baseline.json
+
+Results are written as JSON, with the time per operation of each benchmark in
+ns and a threshold ``max_ns``: the time plus ``--tolerance``. A run given an
+earlier results file as ``--baseline`` reports the benchmarks slower than
+their thresholds there and exits with status 1. Thresholds can be edited in a
+kept baseline to loosen or tighten individual checks. Baselines are only
+comparable on the same machine and latency.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+import timeit
+
+import numpy as np
+
+import acspy
+from acspy import acsc, dc, prgs
+from benchmarks.stub import CounterStub, LatencyStub, StubLibrary
+
+HCOMM = 1
+READ_SIZES = (1, 100, 10000)
+N_POINTS = 1000
+DC_VARS = 4
+DC_LENGTH = 1000
+DC_STEP = 250  # Samples per poll
+N_LINES = 1000
+
+
+def _library(latency):
+    """Returns a stand-in library: ctypes functions returning at once, or
+    Python functions taking ``latency`` seconds."""
+    return StubLibrary() if latency <= 0 else LatencyStub(latency)
+
+
+def _time(func, repeat):
+    """Returns the best time of ``func`` in ns."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def bench_call_acsc(latency, repeat):
+    """A library function called directly and through ``call_acsc``.
+
+    Both times are reported: their difference, the overhead of
+    ``call_acsc``, is too small next to their noise to threshold.
+    """
+    func = getattr(_library(latency), "acsc_Halt")
+    return {
+        "direct call": (_time(lambda: func(HCOMM, 0, None), repeat), "call"),
+        "call_acsc": (
+            _time(lambda: acsc.call_acsc(func, HCOMM, 0, None), repeat),
+            "call",
+        ),
+    }
+
+
+def bench_scalars(latency, repeat):
+    """Scalar getters and setters."""
+    acsc.set_backend(_library(latency))
+    return {
+        "getRPosition": (
+            _time(lambda: acsc.getRPosition(HCOMM, 0), repeat),
+            "call",
+        ),
+        "setVelocity": (
+            _time(lambda: acsc.setVelocity(HCOMM, 0, 100.0), repeat),
+            "call",
+        ),
+        "getMotorState": (
+            _time(lambda: acsc.getMotorState(HCOMM, 0), repeat),
+            "call",
+        ),
+    }
+
+
+def bench_read_real(latency, repeat):
+    """``readReal`` of index ranges of several sizes, including the copy of
+    the values into the result."""
+    acsc.set_backend(LatencyStub(latency))
+    results = {}
+    for n in READ_SIZES:
+        results["readReal[{}]".format(n)] = (
+            _time(
+                lambda: acsc.readReal(HCOMM, acsc.NONE, "X", 0, n - 1), repeat
+            ),
+            "call",
+        )
+    return results
+
+
+def bench_dc_stream(latency, repeat):
+    """Streaming a cyclic data collection array with ``DCReader``."""
+    acsc.set_backend(CounterStub(latency, DC_STEP))
+    reader = dc.DCReader(HCOMM, "DCDATA", DC_VARS, DC_LENGTH)
+
+    def poll():
+        # Keep the store from growing across repeats
+        reader.store = dc.ColumnStore(DC_VARS, DC_STEP)
+        reader.poll()
+
+    return {"DCReader.poll": (_time(poll, repeat) / DC_STEP, "sample")}
+
+
+def bench_uploads(latency, repeat):
+    """PV and multipoint uploads from arrays."""
+    acsc.set_backend(_library(latency))
+    points = np.random.default_rng(0).random((N_POINTS, 2))
+    return {
+        "add_pv_points": (
+            _time(
+                lambda: acsc.add_pv_points(HCOMM, (0, 1), points, points),
+                repeat,
+            )
+            / N_POINTS,
+            "point",
+        ),
+        "multipoint_path": (
+            _time(
+                lambda: acsc.multipoint_path(HCOMM, None, (0, 1), points),
+                repeat,
+            )
+            / N_POINTS,
+            "point",
+        ),
+    }
+
+
+def bench_prg(latency, repeat):
+    """Generating ``ACSPLplusPrg`` text."""
+    targets = np.random.default_rng(0).random((N_LINES, 2))
+
+    def generate():
+        prg = prgs.ACSPLplusPrg()
+        prg.addptps((0, 1), targets, switch="/e")
+        for n in range(N_LINES):
+            prg.addline("V{} = {}".format(n % 10, n))
+        return str(prg)
+
+    return {"ACSPLplusPrg": (_time(generate, repeat) / (2 * N_LINES), "line")}
+
+
+# Groups making no library calls, which --latency does not apply to
+NO_LIBRARY = [bench_prg]
+
+BENCHMARKS = [
+    bench_call_acsc,
+    bench_scalars,
+    bench_read_real,
+    bench_dc_stream,
+    bench_uploads,
+    bench_prg,
+]
+
+
+def run(latency=0.0, repeat=5, tolerance=0.25, select=None):
+    """Runs the benchmark groups whose names contain ``select``, e.g.,
+    ``"uploads"``, and returns the results as a dict ready for JSON.
+
+    With a ``latency``, the groups in ``NO_LIBRARY`` are skipped and listed
+    in ``meta["skipped"]``.
+    """
+    results = {}
+    skipped = []
+    previous = acsc.get_backend()
+    try:
+        for bench in BENCHMARKS:
+            if select is not None and select not in bench.__name__:
+                continue
+            if latency > 0 and bench in NO_LIBRARY:
+                skipped.append(bench.__name__)
+                continue
+            for name, (ns, unit) in bench(latency, repeat).items():
+                results[name] = {
+                    "ns": ns,
+                    "unit": unit,
+                    "max_ns": ns * (1 + tolerance),
+                }
+    finally:
+        acsc.set_backend(previous)
+    return {
+        "meta": {
+            "acspy": acspy.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "latency": latency,
+            "repeat": repeat,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+
+
+def regressions(results, baseline):
+    """Returns ``{name: (ns, max_ns)}`` of the results slower than the
+    thresholds of a baseline."""
+    slow = {}
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is not None and result["ns"] > reference["max_ns"]:
+            slow[name] = (result["ns"], reference["max_ns"])
+    return slow
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-o", "--output", help="JSON file to write")
+    parser.add_argument("--baseline", help="JSON results to check against")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds per library call (default 0)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="slowdown allowed by the written thresholds (default 0.25)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--select", help="run the benchmark groups containing this"
+    )
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["latency"] != args.latency:
+            parser.error("the baseline was run with another latency")
+    results = run(args.latency, args.repeat, args.tolerance, args.select)
+    if results["meta"]["skipped"] and not results["results"]:
+        parser.error("--latency does not apply to the selected benchmarks")
+    for name in results["meta"]["skipped"]:
+        print("{} skipped: it makes no library calls".format(name))
+    slow = regressions(results, baseline) if baseline else {}
+    print(
+        "{:<20}{:>12}  {:<8}{:>12}".format("benchmark", "ns", "per", "max ns")
+    )
+    for name, result in results["results"].items():
+        reference = baseline and baseline["results"].get(name)
+        print(
+            "{:<20}{:>12.1f}  {:<8}{:>12}{}".format(
+                name,
+                result["ns"],
+                result["unit"],
+                "{:.1f}".format(reference["max_ns"]) if reference else "-",
+                "  SLOWER" if name in slow else "",
+            )
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if slow:
+        print("{} benchmark(s) regressed".format(len(slow)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,8 +14,7 @@ sample rate sr.
 """
 
 from __future__ import division, print_function
-from acspy import acsc, prgs
-import numpy as np
+from acspy import acsc, dc, prgs
 import time
 import matplotlib.pyplot as plt
 
@@ -26,9 +25,6 @@ dblen = 100
 sr = 200.0
 sleeptime = dblen/sr/2*1.05
 
-t = np.array([])
-data = np.array([])
-
 # Connect to controller
 hc = acsc.openCommDirect()
 
@@ -47,22 +43,23 @@ prg.addline("STOPDC")
 prg.addstopline()
 
 acsc.setAcceleration(hc, 0, 10000)
-acsc.loadBuffer(hc, 0, prg, 1024)
+acsc.uploadBuffer(hc, 0, prg)
 acsc.runBuffer(hc, 0)
 
 astate = acsc.getAxisState(hc, 0)
 #print astate
 
-for n in range(3):
-    time.sleep(sleeptime)
-    newdata = acsc.readReal(hc, acsc.NONE, "data", 0, 1, 0, dblen/2-1)
-    print(acsc.readInteger(hc, acsc.NONE, "S_DCN"))
-    t = np.append(t, newdata[0])
-    data = np.append(data, newdata[1])
-    time.sleep(sleeptime)
-    newdata = acsc.readReal(hc, acsc.NONE, "data", 0, 1, dblen/2, dblen-1)
-    t = np.append(t, newdata[0])
-    data = np.append(data, newdata[1])
+# Read only the new samples on each poll, streaming them to files on disk so
+# memory use stays constant however long the capture runs
+with dc.MemmapStore("dcdata", 2, names=["time", "fvel"]) as store:
+    reader = dc.DCReader(hc, "data", 2, dblen, store=store)
+    for n in range(6):
+        time.sleep(sleeptime)
+        reader.poll()
+        print(acsc.readInteger(hc, acsc.NONE, "S_DCN"))
+capture = dc.Capture("dcdata")
+t = capture["time"]
+data = capture["fvel"]
 
 print(acsc.readReal(hc, acsc.NONE, "foo"))
 acsc.printLastError()
@@ -10,7 +10,7 @@ This file calls function from the ACS C library wrapper
 from __future__ import division, print_function
 import numpy as np
 import matplotlib.pyplot as plt
-import acsc
+from acspy import acsc
 import time
 
 
@@ -23,16 +23,16 @@ vel = 1
 target = 2
 dt = 0.01
 
-hc = acsc.OpenCommDirect()
+hc = acsc.openCommDirect()
 
 if hc == acsc.INVALID:
-    print("Cannot connect to controller, error", acsc.GetLastError())
+    print("Cannot connect to controller, error", acsc.getLastError())
 
 else:    
-    acsc.Enable(hc, axis)
-    acsc.SetVelocity(hc, axis, vel)
-    acsc.SetAcceleration(hc, axis, acc)
-    acsc.SetDeceleration(hc, axis, acc)
+    acsc.enable(hc, axis)
+    acsc.setVelocity(hc, axis, vel)
+    acsc.setAcceleration(hc, axis, acc)
+    acsc.setDeceleration(hc, axis, acc)
     
     pvec = []
     tvec = []
@@ -43,15 +43,12 @@ else:
     t = np.arange(0, 6*np.pi, dt)
     x = np.sin(2*t)
     
-    acsc.MultiPoint(hc, None, axis, 0)
-        
-    for n in range(len(x)):
-        acsc.AddPoint(hc, axis, x[n])
-    acsc.EndSequence(hc, axis)
+    # Upload the whole path as one sequence
+    acsc.multipoint_path(hc, None, axis, x)
     
-    while acsc.GetAxisState(hc, axis) != "stopped":
-        position = acsc.GetRPosition(hc, axis, acsc.SYNCHRONOUS)
-        vel = acsc.GetRVelocity(hc, axis, acsc.SYNCHRONOUS)
+    while acsc.getAxisState(hc, axis)["moving"]:
+        position = acsc.getRPosition(hc, axis, acsc.SYNCHRONOUS)
+        vel = acsc.getRVelocity(hc, axis, acsc.SYNCHRONOUS)
         pvec.append(position)
         tvec.append(time.time())
         vvec.append(vel)
@@ -65,8 +62,7 @@ else:
     print("Generating plot")
     plt.close('all')
     plt.plot(tvec, pvec)   
-    plt.hold(True)
     plt.plot(t, x, '--k')
 
     
-    acsc.CloseComm(hc)
+    acsc.closeComm(hc)
@@ -10,7 +10,7 @@ This file calls function from the ACS C library wrapper
 from __future__ import division, print_function
 import numpy as np
 import matplotlib.pyplot as plt
-import acsc
+from acspy import acsc
 import time
 
 
@@ -23,16 +23,16 @@ vel = 1
 target = 2
 dt = 0.5
 
-hc = acsc.OpenCommDirect()
+hc = acsc.openCommDirect()
 
 if hc == acsc.INVALID:
-    print("Cannot connect to controller, error", acsc.GetLastError())
+    print("Cannot connect to controller, error", acsc.getLastError())
 
 else:    
-    acsc.Enable(hc, axis)
-    acsc.SetVelocity(hc, axis, vel)
-    acsc.SetAcceleration(hc, axis, acc)
-    acsc.SetDeceleration(hc, axis, acc)
+    acsc.enable(hc, axis)
+    acsc.setVelocity(hc, axis, vel)
+    acsc.setAcceleration(hc, axis, acc)
+    acsc.setDeceleration(hc, axis, acc)
     
     pvec = []
     tvec = []
@@ -40,21 +40,17 @@ else:
     
     t = np.arange(0, 2*np.pi, dt)
     v = (np.sin(6*t) + t) * np.hanning(len(t))
-    x = np.zeros(len(v))
+    x = np.cumsum(v)*dt - v*dt
     
-    for n in range(len(x)):
-        x[n] = np.sum(v[:n])*dt
-    
-    acsc.Spline(hc, acsc.AMF_CUBIC, axis, dt)
-        
-    for n in range(len(x)):
-        acsc.AddPVPoint(hc, axis, x[n], v[n])
-    acsc.EndSequence(hc, axis)
+    acsc.spline(hc, acsc.AMF_CUBIC, axis, dt)
+    # Upload all points in one call
+    acsc.add_pv_points(hc, axis, x, v)
+    acsc.endSequence(hc, axis)
         
 
-    while acsc.GetAxisState(hc, axis) != "stopped":
-        position = acsc.GetFPosition(hc, axis, acsc.SYNCHRONOUS)
-        vel = acsc.GetRVelocity(hc, axis, acsc.SYNCHRONOUS)
+    while acsc.getAxisState(hc, axis)["moving"]:
+        position = acsc.getFPosition(hc, axis, acsc.SYNCHRONOUS)
+        vel = acsc.getRVelocity(hc, axis, acsc.SYNCHRONOUS)
         pvec.append(position)
         tvec.append(time.time())
         vvec.append(vel)
@@ -68,12 +64,10 @@ else:
     print("Generating plot")
     plt.close('all')
     plt.plot(tvec, pvec)   
-    plt.hold(True)
     plt.plot(t, x, '--k')
     
     plt.figure()
     plt.plot(tvec, vvec)
-    plt.hold(True)
     plt.plot(t, v, '--k')
     
-    acsc.CloseComm(hc)
+    acsc.closeComm(hc)
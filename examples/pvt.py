@@ -10,7 +10,7 @@ This file calls function from the ACS C library wrapper
 from __future__ import division, print_function
 import numpy as np
 import matplotlib.pyplot as plt
-import acsc
+from acspy import acsc
 import time
 
 
@@ -22,36 +22,33 @@ flags = 0
 vel = 1
 target = 2
 
-hc = acsc.OpenCommDirect()
+hc = acsc.openCommDirect()
 
 if hc == acsc.INVALID:
-    print("Cannot connect to controller, error", acsc.GetLastError())
+    print("Cannot connect to controller, error", acsc.getLastError())
 
 else:    
-    acsc.Enable(hc, axis)
+    acsc.enable(hc, axis)
+    acsc.waitMotorEnabled(hc, axis, 1, 1000)
     
-    time.sleep(0.1)
+    state = acsc.getMotorState(hc, axis, acsc.SYNCHRONOUS)
     
-    state = acsc.GetMotorState(hc, axis, acsc.SYNCHRONOUS)
+    acsc.setVelocity(hc, axis, vel)
+    acsc.setAcceleration(hc, axis, acc)
+    acsc.setDeceleration(hc, axis, acc)
     
-    acsc.SetVelocity(hc, axis, vel)
-    acsc.SetAcceleration(hc, axis, acc)
-    acsc.SetDeceleration(hc, axis, acc)
-    
-    position = acsc.GetRPosition(hc, axis)
+    position = acsc.getRPosition(hc, axis)
     pvec = [position]
     
     tvec = [time.time()]
     
-    acsc.ToPoint(hc, flags, axis, target, acsc.SYNCHRONOUS)
+    acsc.toPoint(hc, flags, axis, target, acsc.SYNCHRONOUS)
     
-    while position != target:
-        time.sleep(0.1)
-        position = acsc.GetRPosition(hc, axis, acsc.SYNCHRONOUS)
-        pvec.append(position)
-        tvec.append(time.time())
-        
-        print("Axis", axis, "is", acsc.GetAxisState(hc, axis))
+    # Block until the move is done instead of polling
+    acsc.waitMotionEnd(hc, axis)
+    pvec.append(acsc.getRPosition(hc, axis, acsc.SYNCHRONOUS))
+    tvec.append(time.time())
+    print("Axis", axis, "is", acsc.getAxisState(hc, axis))
 
     
     pvec = np.asarray(pvec)
@@ -61,4 +58,4 @@ else:
     plt.close('all')
     plt.plot(tvec, pvec)   
     
-    acsc.CloseComm(hc)
+    acsc.closeComm(hc)